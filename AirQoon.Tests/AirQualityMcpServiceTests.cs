@@ -0,0 +1,55 @@
+using System.Text.Json;
+using AirQoon.Web.Services;
+using FluentAssertions;
+
+namespace AirQoon.Tests;
+
+public class AirQualityMcpServiceTests
+{
+    [Fact]
+    public async Task GetTenantDevicesAsync_should_follow_cursor_until_last_page()
+    {
+        var mcp = new RecordingMcpClientService((tool, args) =>
+        {
+            var cursor = args.TryGetProperty("cursor", out var c) && c.ValueKind == JsonValueKind.String
+                ? c.GetString()
+                : null;
+
+            return cursor switch
+            {
+                null => """{"tenant_slug":"akcansa","devices":[{"device_id":"dev-1","name":"D1"},{"device_id":"dev-2","name":"D2"}],"next_cursor":"c1"}""",
+                "c1" => """{"tenant_slug":"akcansa","devices":[{"device_id":"dev-3","name":"D3","has_telemetry":true}],"next_cursor":null}""",
+                _ => throw new InvalidOperationException($"unexpected cursor {cursor}")
+            };
+        });
+        var sut = new AirQualityMcpService(mcp);
+
+        var devices = await sut.GetTenantDevicesAsync("akcansa");
+
+        devices.Select(d => d.DeviceId).Should().Equal("dev-1", "dev-2", "dev-3");
+        devices[2].HasTelemetry.Should().BeTrue();
+        mcp.Calls.Should().HaveCount(2);
+        mcp.Calls.Should().OnlyContain(c => c.Tool == "tenant_device_list");
+        mcp.Calls[0].Arguments.GetProperty("format").GetString().Should().Be("json");
+        mcp.Calls[1].Arguments.GetProperty("cursor").GetString().Should().Be("c1");
+    }
+
+    [Fact]
+    public async Task TenantTimeRangeAnalysisWithRelatedAsync_should_return_analysis_when_rag_search_times_out()
+    {
+        var mcp = new RecordingMcpClientService((tool, _) => "# time range analysis")
+        {
+            BatchStatus = tool => tool == "search_analysis_from_vector_db" ? "cancelled" : "ok"
+        };
+        var sut = new AirQualityMcpService(mcp);
+
+        var (analysis, related) = await sut.TenantTimeRangeAnalysisWithRelatedAsync(
+            "akcansa", new DateTime(2025, 1, 1), new DateTime(2025, 1, 8), null, relatedQuery: "pm10");
+
+        analysis.RawText.Should().Be("# time range analysis");
+        related.Should().BeEmpty();
+        mcp.Requests.Should().Be(1);
+        mcp.BatchedCalls.Single(c => c.Tool == "search_analysis_from_vector_db").TimeoutMs
+            .Should().Be(AirQualityMcpService.RelatedSearchTimeoutMs);
+    }
+}
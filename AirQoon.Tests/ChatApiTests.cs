@@ -1,16 +1,21 @@
 using System.Net;
 using System.Net.Http.Json;
 using AirQoon.Web.Models.Chat;
+using AirQoon.Web.Services;
 using FluentAssertions;
+using Microsoft.AspNetCore.TestHost;
+using Microsoft.Extensions.DependencyInjection;
 
 namespace AirQoon.Tests;
 
 public class ChatApiTests : IClassFixture<TestAppFactory>
 {
+    private readonly TestAppFactory _factory;
     private readonly HttpClient _client;
 
     public ChatApiTests(TestAppFactory factory)
     {
+        _factory = factory;
         _client = factory.CreateClient();
     }
 
@@ -52,4 +57,40 @@ public class ChatApiTests : IClassFixture<TestAppFactory>
         var body = await resp.Content.ReadFromJsonAsync<ChatResponse>();
         body!.Reply.Should().Contain("fake monthly comparison");
     }
+
+    [Fact]
+    public async Task Post_api_chat_should_batch_turn_tool_calls_into_one_mcp_request()
+    {
+        var mcp = new RecordingMcpClientService((tool, _) => tool switch
+        {
+            "tenant_time_range_analysis" => "# batched time range analysis",
+            "search_analysis_from_vector_db" => "batched rag result",
+            _ => throw new InvalidOperationException($"unexpected tool {tool}")
+        });
+        var client = _factory.WithWebHostBuilder(builder => builder.ConfigureTestServices(services =>
+        {
+            services.AddSingleton<IMcpClientService>(mcp);
+            services.AddScoped<IAirQualityMcpService, AirQualityMcpService>();
+        })).CreateClient();
+
+        var req = new ChatRequest
+        {
+            SessionId = Guid.NewGuid().ToString(),
+            Message = "akcansa icin 2025-01-01 ile 2025-01-08 arasi hava kalitesi",
+            Domain = "local",
+            TenantSlug = "akcansa"
+        };
+
+        var resp = await client.PostAsJsonAsync("/api/chat", req);
+        resp.StatusCode.Should().Be(HttpStatusCode.OK);
+
+        var body = await resp.Content.ReadFromJsonAsync<ChatResponse>();
+        body!.Intent.Should().Be(IntentType.StatisticalAnalysis);
+        body.Reply.Should().Contain("batched time range analysis");
+        body.Reply.Should().Contain("batched rag result");
+        mcp.Requests.Should().Be(1);
+        mcp.Calls.Select(c => c.Tool).Should().Equal("tenant_time_range_analysis", "search_analysis_from_vector_db");
+        mcp.BatchedCalls[0].TimeoutMs.Should().BeNull();
+        mcp.BatchedCalls[1].TimeoutMs.Should().Be(AirQualityMcpService.RelatedSearchTimeoutMs);
+    }
 }
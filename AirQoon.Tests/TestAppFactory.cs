@@ -1,3 +1,4 @@
+using System.Text.Json;
 using AirQoon.Web.Data;
 using AirQoon.Web.Models.Dtos;
 using AirQoon.Web.Services;
@@ -94,12 +95,29 @@ internal sealed class FakeAirQualityMcpService : IAirQualityMcpService
     public Task<MonthlyComparisonResult> TenantMonthlyComparisonAsync(string tenantSlug, string month1, string month2, int? year = null, CancellationToken cancellationToken = default)
         => Task.FromResult(new MonthlyComparisonResult { TenantSlug = tenantSlug, RawText = "# fake monthly comparison" });
 
+    public async Task<(TimeRangeAnalysisResult Analysis, IReadOnlyList<AnalysisSearchResult> Related)> TenantTimeRangeAnalysisWithRelatedAsync(string tenantSlug, DateTime startDate, DateTime endDate, List<string>? pollutants, string relatedQuery, int relatedLimit = 3, double relatedScoreThreshold = 0.5, CancellationToken cancellationToken = default)
+        => (await TenantTimeRangeAnalysisAsync(tenantSlug, startDate, endDate, pollutants, cancellationToken: cancellationToken),
+            await SearchAnalysisFromVectorDbAsync(tenantSlug, relatedQuery, relatedLimit, relatedScoreThreshold, cancellationToken: cancellationToken));
+
+    public async Task<(MonthlyComparisonResult Comparison, IReadOnlyList<AnalysisSearchResult> Related)> TenantMonthlyComparisonWithRelatedAsync(string tenantSlug, string month1, string month2, string relatedQuery, int relatedLimit = 3, double relatedScoreThreshold = 0.5, CancellationToken cancellationToken = default)
+        => (await TenantMonthlyComparisonAsync(tenantSlug, month1, month2, cancellationToken: cancellationToken),
+            await SearchAnalysisFromVectorDbAsync(tenantSlug, relatedQuery, relatedLimit, relatedScoreThreshold, cancellationToken: cancellationToken));
+
     public Task<IReadOnlyList<DeviceInfo>> GetTenantDevicesAsync(string tenantSlug, CancellationToken cancellationToken = default)
         => Task.FromResult<IReadOnlyList<DeviceInfo>>(new List<DeviceInfo>());
 
+    public Task<DeviceListPage> GetTenantDevicesPageAsync(string tenantSlug, string? cursor = null, int limit = 100, IReadOnlyList<string>? telemetryFields = null, CancellationToken cancellationToken = default)
+        => Task.FromResult(new DeviceListPage { TenantSlug = tenantSlug });
+
     public Task<TenantStatistics> GetTenantStatisticsAsync(string tenantSlug, CancellationToken cancellationToken = default)
         => Task.FromResult(new TenantStatistics { TenantSlug = tenantSlug, DeviceCount = 1, VectorPoints = 0, IsPublic = false, RawText = "# fake stats" });
 
+    public Task<IReadOnlyList<TenantStatistics>> GetAllTenantStatisticsAsync(bool refresh = false, CancellationToken cancellationToken = default)
+        => Task.FromResult<IReadOnlyList<TenantStatistics>>(new List<TenantStatistics>
+        {
+            new() { TenantSlug = "akcansa", TenantName = "Akçansa", DeviceCount = 1, VectorPoints = 0, IsPublic = false }
+        });
+
     public Task<string> SaveAnalysisToVectorDbAsync(string tenantSlug, string analysisText, string analysisType = "analysis", Dictionary<string, object>? metadata = null, CancellationToken cancellationToken = default)
         => Task.FromResult("vid-1");
 
@@ -112,3 +130,70 @@ internal sealed class FakeTenantMappingService : ITenantMappingService
     public Task<string?> GetTenantSlugForDomainAsync(string domain, CancellationToken cancellationToken = default)
         => Task.FromResult<string?>(null);
 }
+
+/// <summary>
+/// MCP HTTP katmanının yerine geçer: çağrıları kaydeder, yanıtları verilen fonksiyondan üretir.
+/// Requests, MCP sunucusuna gidecek HTTP isteği sayısıdır (/call_tools batch'i tek istek sayılır).
+/// </summary>
+internal sealed class RecordingMcpClientService : IMcpClientService
+{
+    private static readonly JsonSerializerOptions JsonOptions = new(JsonSerializerDefaults.Web)
+    {
+        PropertyNameCaseInsensitive = true
+    };
+
+    private readonly Func<string, JsonElement, string> _respond;
+
+    public RecordingMcpClientService(Func<string, JsonElement, string> respond)
+    {
+        _respond = respond;
+    }
+
+    public List<(string Tool, JsonElement Arguments)> Calls { get; } = new();
+
+    /// <summary>/call_tools ile gönderilen çağrılar (TimeoutMs dahil).</summary>
+    public List<McpToolCall> BatchedCalls { get; } = new();
+
+    /// <summary>Batch sonucunun status'u (tool adına göre); varsayılan "ok".</summary>
+    public Func<string, string> BatchStatus { get; init; } = _ => "ok";
+
+    public int Requests { get; private set; }
+
+    public async Task<T> CallToolAsync<T>(string toolName, object arguments, CancellationToken cancellationToken = default)
+    {
+        var text = await CallToolAsync(toolName, arguments, cancellationToken);
+        return JsonSerializer.Deserialize<T>(text, JsonOptions)!;
+    }
+
+    public Task<string> CallToolAsync(string toolName, object arguments, CancellationToken cancellationToken = default)
+    {
+        Requests++;
+        return Task.FromResult(Record(toolName, arguments));
+    }
+
+    public Task<IReadOnlyList<McpToolCallResult>> CallToolsAsync(IReadOnlyList<McpToolCall> calls, CancellationToken cancellationToken = default)
+    {
+        Requests++;
+        BatchedCalls.AddRange(calls);
+        var results = calls
+            .Select(c =>
+            {
+                var status = BatchStatus(c.Tool);
+                return status == "ok"
+                    ? new McpToolCallResult { Tool = c.Tool, Status = status, Text = Record(c.Tool, c.Arguments) }
+                    : new McpToolCallResult { Tool = c.Tool, Status = status, Error = "deadline" };
+            })
+            .ToList();
+        return Task.FromResult<IReadOnlyList<McpToolCallResult>>(results);
+    }
+
+    public Task<bool> IsHealthyAsync(CancellationToken cancellationToken = default)
+        => Task.FromResult(true);
+
+    private string Record(string toolName, object arguments)
+    {
+        var args = JsonSerializer.SerializeToElement(arguments, JsonOptions);
+        Calls.Add((toolName, args));
+        return _respond(toolName, args);
+    }
+}
@@ -1,10 +1,25 @@
+using System.Text.Json;
+using System.Text.Json.Serialization;
+
 namespace AirQoon.Web.Models.Dtos;
 
 public class DeviceInfo
 {
+    [JsonPropertyName("device_id")]
     public string? DeviceId { get; set; }
 
+    [JsonPropertyName("name")]
     public string? Name { get; set; }
 
+    [JsonPropertyName("label")]
     public string? Label { get; set; }
+
+    [JsonPropertyName("has_telemetry")]
+    public bool HasTelemetry { get; set; }
+
+    /// <summary>
+    /// Sadece istenen LatestTelemetry alanları (telemetry_fields verilmediyse null).
+    /// </summary>
+    [JsonPropertyName("telemetry")]
+    public Dictionary<string, JsonElement>? Telemetry { get; set; }
 }
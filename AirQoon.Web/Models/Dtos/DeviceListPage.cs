@@ -0,0 +1,18 @@
+using System.Text.Json.Serialization;
+
+namespace AirQoon.Web.Models.Dtos;
+
+public class DeviceListPage
+{
+    [JsonPropertyName("tenant_slug")]
+    public string? TenantSlug { get; set; }
+
+    [JsonPropertyName("devices")]
+    public List<DeviceInfo> Devices { get; set; } = new();
+
+    /// <summary>
+    /// Sonraki sayfa için cursor; son sayfada null.
+    /// </summary>
+    [JsonPropertyName("next_cursor")]
+    public string? NextCursor { get; set; }
+}
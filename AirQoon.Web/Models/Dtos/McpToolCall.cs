@@ -0,0 +1,32 @@
+using System.Text.Json.Serialization;
+
+namespace AirQoon.Web.Models.Dtos;
+
+public class McpToolCall
+{
+    public string Tool { get; set; } = string.Empty;
+
+    public object Arguments { get; set; } = new();
+
+    /// <summary>
+    /// Bu çağrıya batch deadline'ından ayrı, daha kısa sunucu tarafı süre (ms); dolunca çağrı status="cancelled" döner.
+    /// </summary>
+    [JsonPropertyName("timeout_ms")]
+    public int? TimeoutMs { get; set; }
+}
+
+public class McpToolCallResult
+{
+    public string? Tool { get; set; }
+
+    public string Status { get; set; } = "error";
+
+    public string? Text { get; set; }
+
+    public string? Error { get; set; }
+
+    [JsonPropertyName("elapsed_ms")]
+    public double ElapsedMs { get; set; }
+
+    public bool IsSuccess => string.Equals(Status, "ok", StringComparison.OrdinalIgnoreCase);
+}
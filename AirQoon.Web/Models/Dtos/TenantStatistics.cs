@@ -1,15 +1,22 @@
+using System.Text.Json.Serialization;
+
 namespace AirQoon.Web.Models.Dtos;
 
 public class TenantStatistics
 {
+    [JsonPropertyName("tenant_slug")]
     public string? TenantSlug { get; set; }
 
+    [JsonPropertyName("name")]
     public string? TenantName { get; set; }
 
+    [JsonPropertyName("device_count")]
     public int DeviceCount { get; set; }
 
+    [JsonPropertyName("vector_points")]
     public long VectorPoints { get; set; }
 
+    [JsonPropertyName("is_public")]
     public bool IsPublic { get; set; }
 
     public string? RawText { get; set; }
@@ -0,0 +1,23 @@
+using System.Text.Json.Serialization;
+
+namespace AirQoon.Web.Models.Dtos;
+
+/// <summary>
+/// tenant_statistics_all tool'unun json çıktısı (format="json").
+/// </summary>
+public class TenantStatisticsList
+{
+    [JsonPropertyName("count")]
+    public int Count { get; set; }
+
+    [JsonPropertyName("total_devices")]
+    public int TotalDevices { get; set; }
+
+    [JsonPropertyName("total_vector_points")]
+    public long TotalVectorPoints { get; set; }
+
+    [JsonPropertyName("tenants")]
+    public List<TenantStatistics> Tenants { get; set; } = new();
+
+    public string? RawText { get; set; }
+}
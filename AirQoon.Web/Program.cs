@@ -78,6 +78,14 @@ app.UseAntiforgery();
 
 app.MapGet("/healthz", () => Results.Ok(new { status = "ok" }));
 
+app.MapGet("/debug/mcp/tenant_statistics", async (
+    IAirQualityMcpService mcp,
+    CancellationToken cancellationToken) =>
+{
+    var stats = await mcp.GetAllTenantStatisticsAsync(cancellationToken: cancellationToken);
+    return Results.Ok(stats);
+});
+
 app.MapGet("/debug/mcp/tenant_statistics/{tenantSlug}", async (
     string tenantSlug,
     IAirQualityMcpService mcp,
@@ -5,6 +5,9 @@ namespace AirQoon.Web.Services;
 
 public class AirQualityMcpService : IAirQualityMcpService
 {
+    // RAG araması best-effort: asıl yanıtı yavaş bir embedding yüklemesi yüzünden bekletmesin
+    public const int RelatedSearchTimeoutMs = 4000;
+
     private readonly IMcpClientService _mcp;
 
     public AirQualityMcpService(IMcpClientService mcp)
@@ -23,15 +26,7 @@ public class AirQualityMcpService : IAirQualityMcpService
     {
         var raw = await _mcp.CallToolAsync(
             "tenant_time_range_analysis",
-            new
-            {
-                tenant_slug = tenantSlug,
-                start_date = startDate.ToString("yyyy-MM-dd"),
-                end_date = endDate.ToString("yyyy-MM-dd"),
-                comparison_start_date = comparisonStartDate?.ToString("yyyy-MM-dd"),
-                comparison_end_date = comparisonEndDate?.ToString("yyyy-MM-dd"),
-                pollutants = pollutants
-            },
+            TimeRangeArguments(tenantSlug, startDate, endDate, pollutants, comparisonStartDate, comparisonEndDate),
             cancellationToken);
 
         return new TimeRangeAnalysisResult
@@ -54,13 +49,7 @@ public class AirQualityMcpService : IAirQualityMcpService
     {
         var raw = await _mcp.CallToolAsync(
             "tenant_monthly_comparison",
-            new
-            {
-                tenant_slug = tenantSlug,
-                month1,
-                month2,
-                year
-            },
+            MonthlyComparisonArguments(tenantSlug, month1, month2, year),
             cancellationToken);
 
         return new MonthlyComparisonResult
@@ -72,22 +61,99 @@ public class AirQualityMcpService : IAirQualityMcpService
         };
     }
 
-    public async Task<IReadOnlyList<DeviceInfo>> GetTenantDevicesAsync(string tenantSlug, CancellationToken cancellationToken = default)
+    public async Task<(TimeRangeAnalysisResult Analysis, IReadOnlyList<AnalysisSearchResult> Related)> TenantTimeRangeAnalysisWithRelatedAsync(
+        string tenantSlug,
+        DateTime startDate,
+        DateTime endDate,
+        List<string>? pollutants,
+        string relatedQuery,
+        int relatedLimit = 3,
+        double relatedScoreThreshold = 0.5,
+        CancellationToken cancellationToken = default)
     {
-        var raw = await _mcp.CallToolAsync(
-            "tenant_device_list",
-            new { tenant_slug = tenantSlug },
+        var (primary, related) = await CallWithRelatedAsync(
+            new McpToolCall
+            {
+                Tool = "tenant_time_range_analysis",
+                Arguments = TimeRangeArguments(tenantSlug, startDate, endDate, pollutants, null, null)
+            },
+            SearchArguments(tenantSlug, relatedQuery, relatedLimit, relatedScoreThreshold, null),
             cancellationToken);
 
-        return new List<DeviceInfo>
+        var analysis = new TimeRangeAnalysisResult
         {
-            new()
+            TenantSlug = tenantSlug,
+            StartDate = startDate,
+            EndDate = endDate,
+            RawText = EnsureSuccess(primary).Text ?? string.Empty
+        };
+
+        return (analysis, related);
+    }
+
+    public async Task<(MonthlyComparisonResult Comparison, IReadOnlyList<AnalysisSearchResult> Related)> TenantMonthlyComparisonWithRelatedAsync(
+        string tenantSlug,
+        string month1,
+        string month2,
+        string relatedQuery,
+        int relatedLimit = 3,
+        double relatedScoreThreshold = 0.5,
+        CancellationToken cancellationToken = default)
+    {
+        var (primary, related) = await CallWithRelatedAsync(
+            new McpToolCall
             {
-                DeviceId = null,
-                Name = null,
-                Label = raw
-            }
+                Tool = "tenant_monthly_comparison",
+                Arguments = MonthlyComparisonArguments(tenantSlug, month1, month2, null)
+            },
+            SearchArguments(tenantSlug, relatedQuery, relatedLimit, relatedScoreThreshold, null),
+            cancellationToken);
+
+        var comparison = new MonthlyComparisonResult
+        {
+            TenantSlug = tenantSlug,
+            Month1 = month1,
+            Month2 = month2,
+            RawText = EnsureSuccess(primary).Text ?? string.Empty
         };
+
+        return (comparison, related);
+    }
+
+    public async Task<IReadOnlyList<DeviceInfo>> GetTenantDevicesAsync(string tenantSlug, CancellationToken cancellationToken = default)
+    {
+        var devices = new List<DeviceInfo>();
+        string? cursor = null;
+
+        do
+        {
+            var page = await GetTenantDevicesPageAsync(tenantSlug, cursor, cancellationToken: cancellationToken);
+            devices.AddRange(page.Devices);
+            cursor = page.NextCursor;
+        }
+        while (!string.IsNullOrEmpty(cursor));
+
+        return devices;
+    }
+
+    public Task<DeviceListPage> GetTenantDevicesPageAsync(
+        string tenantSlug,
+        string? cursor = null,
+        int limit = 100,
+        IReadOnlyList<string>? telemetryFields = null,
+        CancellationToken cancellationToken = default)
+    {
+        return _mcp.CallToolAsync<DeviceListPage>(
+            "tenant_device_list",
+            new
+            {
+                tenant_slug = tenantSlug,
+                cursor,
+                limit,
+                telemetry_fields = telemetryFields,
+                format = "json"
+            },
+            cancellationToken);
     }
 
     public async Task<TenantStatistics> GetTenantStatisticsAsync(string tenantSlug, CancellationToken cancellationToken = default)
@@ -138,6 +204,22 @@ public class AirQualityMcpService : IAirQualityMcpService
         return result;
     }
 
+    public async Task<IReadOnlyList<TenantStatistics>> GetAllTenantStatisticsAsync(bool refresh = false, CancellationToken cancellationToken = default)
+    {
+        var result = await _mcp.CallToolAsync<TenantStatisticsList>(
+            "tenant_statistics_all",
+            new { refresh, format = "json" },
+            cancellationToken);
+
+        if (result.Tenants.Count == 0 && !string.IsNullOrWhiteSpace(result.RawText))
+        {
+            // JSON değilse tool bir hata metni döndürmüştür
+            throw new InvalidOperationException(result.RawText);
+        }
+
+        return result.Tenants;
+    }
+
     public Task<string> SaveAnalysisToVectorDbAsync(
         string tenantSlug,
         string analysisText,
@@ -147,13 +229,7 @@ public class AirQualityMcpService : IAirQualityMcpService
     {
         return _mcp.CallToolAsync(
             "save_analysis_to_vector_db",
-            new
-            {
-                tenant_slug = tenantSlug,
-                analysis_text = analysisText,
-                analysis_type = analysisType,
-                metadata = metadata ?? new Dictionary<string, object>()
-            },
+            SaveAnalysisArguments(tenantSlug, analysisText, analysisType, metadata),
             cancellationToken);
     }
 
@@ -179,16 +255,129 @@ public class AirQualityMcpService : IAirQualityMcpService
     {
         var raw = await _mcp.CallToolAsync(
             "search_analysis_from_vector_db",
-            new
+            SearchArguments(tenantSlug, queryText, limit, scoreThreshold, filterType),
+            cancellationToken);
+
+        return ToSearchResults(raw, filterType);
+    }
+
+    /// <summary>
+    /// Asıl tool çağrısı ile RAG aramasını tek /call_tools isteğinde çalıştırır.
+    /// Arama kendi sunucu tarafı süresiyle (RelatedSearchTimeoutMs) sınırlıdır; dolarsa Related boş döner.
+    /// Aynı tenant'a yazan çağrılarla birlikte kullanılmamalı (arama yazmayla yarışır).
+    /// </summary>
+    private async Task<(McpToolCallResult Primary, IReadOnlyList<AnalysisSearchResult> Related)> CallWithRelatedAsync(
+        McpToolCall primary,
+        object searchArguments,
+        CancellationToken cancellationToken)
+    {
+        var results = await _mcp.CallToolsAsync(
+            new[]
             {
-                tenant_slug = tenantSlug,
-                query_text = queryText,
-                limit,
-                score_threshold = scoreThreshold,
-                filter_type = filterType
+                primary,
+                new McpToolCall
+                {
+                    Tool = "search_analysis_from_vector_db",
+                    Arguments = searchArguments,
+                    TimeoutMs = RelatedSearchTimeoutMs
+                }
             },
             cancellationToken);
 
+        var primaryResult = results.Count > 0
+            ? results[0]
+            : new McpToolCallResult { Tool = primary.Tool, Error = "sonuç dönmedi" };
+        var search = results.Count > 1 ? results[1] : null;
+
+        IReadOnlyList<AnalysisSearchResult> related = search is { IsSuccess: true }
+            ? ToSearchResults(search.Text, null)
+            : Array.Empty<AnalysisSearchResult>();
+
+        return (primaryResult, related);
+    }
+
+    /// <summary>
+    /// Batch içindeki başarısız sonucu tekil /call_tool çağrısının fırlatacağı exception'a çevirir.
+    /// </summary>
+    private static McpToolCallResult EnsureSuccess(McpToolCallResult result)
+    {
+        if (result.IsSuccess)
+        {
+            return result;
+        }
+
+        if (string.Equals(result.Status, "cancelled", StringComparison.OrdinalIgnoreCase))
+        {
+            throw new TimeoutException($"MCP servisi yanıt vermedi ({result.Tool}): {result.Error}");
+        }
+
+        if (string.Equals(result.Status, "rejected", StringComparison.OrdinalIgnoreCase))
+        {
+            throw new InvalidOperationException($"MCP servisi şu anda yoğun, birkaç saniye sonra tekrar deneyin. ({result.Error})");
+        }
+
+        throw new InvalidOperationException($"MCP servisi tool hatası ({result.Tool}): {result.Error}");
+    }
+
+    private static object TimeRangeArguments(
+        string tenantSlug,
+        DateTime startDate,
+        DateTime endDate,
+        List<string>? pollutants,
+        DateTime? comparisonStartDate,
+        DateTime? comparisonEndDate)
+    {
+        return new
+        {
+            tenant_slug = tenantSlug,
+            start_date = startDate.ToString("yyyy-MM-dd"),
+            end_date = endDate.ToString("yyyy-MM-dd"),
+            comparison_start_date = comparisonStartDate?.ToString("yyyy-MM-dd"),
+            comparison_end_date = comparisonEndDate?.ToString("yyyy-MM-dd"),
+            pollutants = pollutants
+        };
+    }
+
+    private static object MonthlyComparisonArguments(string tenantSlug, string month1, string month2, int? year)
+    {
+        return new
+        {
+            tenant_slug = tenantSlug,
+            month1,
+            month2,
+            year
+        };
+    }
+
+    private static object SaveAnalysisArguments(
+        string tenantSlug,
+        string analysisText,
+        string analysisType,
+        Dictionary<string, object>? metadata)
+    {
+        return new
+        {
+            tenant_slug = tenantSlug,
+            analysis_text = analysisText,
+            analysis_type = analysisType,
+            metadata = metadata ?? new Dictionary<string, object>()
+        };
+    }
+
+    private static object SearchArguments(string tenantSlug, string queryText, int limit, double scoreThreshold, string? filterType)
+    {
+        return new
+        {
+            tenant_slug = tenantSlug,
+            query_text = queryText,
+            limit,
+            score_threshold = scoreThreshold,
+            filter_type = filterType
+        };
+    }
+
+    private static IReadOnlyList<AnalysisSearchResult> ToSearchResults(string? raw, string? filterType)
+    {
         return new List<AnalysisSearchResult>
         {
             new()
@@ -4,6 +4,7 @@ using System.Text.RegularExpressions;
 using AirQoon.Web.Data;
 using AirQoon.Web.Data.Entities;
 using AirQoon.Web.Models.Chat;
+using AirQoon.Web.Models.Dtos;
 using AirQoon.Web.Services.MongoModels;
 using Microsoft.EntityFrameworkCore;
 using Microsoft.Extensions.Logging;
@@ -116,6 +117,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
         string? responseJson = null;
         string? errorMessage = null;
         Dictionary<string, object?>? parameters = null;
+        IReadOnlyList<AnalysisSearchResult>? related = null;
 
         try
         {
@@ -143,20 +145,23 @@ public class ChatOrchestrationService : IChatOrchestrationService
             if (intent == IntentType.AirQualityQuery)
             {
                 var result = await HandleAirQualityQueryAsync(session, context, userMessage, cancellationToken);
-                reply = result.reply;
-                parameters = result.parameters;
+                reply = result.Reply;
+                parameters = result.Parameters;
+                related = result.Related;
             }
             else if (intent == IntentType.StatisticalAnalysis)
             {
                 var result = await HandleStatisticalAnalysisAsync(session, context, userMessage, cancellationToken);
-                reply = result.reply;
-                parameters = result.parameters;
+                reply = result.Reply;
+                parameters = result.Parameters;
+                related = result.Related;
             }
             else if (intent == IntentType.ComparisonAnalysis)
             {
                 var result = await HandleMonthlyComparisonAsync(session, context, userMessage, cancellationToken);
-                reply = result.reply;
-                parameters = result.parameters;
+                reply = result.Reply;
+                parameters = result.Parameters;
+                related = result.Related;
             }
             else
             {
@@ -165,8 +170,10 @@ public class ChatOrchestrationService : IChatOrchestrationService
 
             if (!string.IsNullOrWhiteSpace(session.TenantSlug))
             {
-                // Add RAG enrichment (previous analyses)
-                var rag = await BuildRagEnrichmentAsync(session.TenantSlug, userMessage, cancellationToken);
+                // Add RAG enrichment (previous analyses); analysis intents fetch it in the same MCP batch
+                var rag = related is not null
+                    ? FormatRagEnrichment(related)
+                    : await BuildRagEnrichmentAsync(session.TenantSlug, userMessage, cancellationToken);
                 if (!string.IsNullOrWhiteSpace(rag))
                 {
                     reply += $"\n\n---\n\n## İlgili önceki analizler (RAG)\n\n{rag}";
@@ -303,32 +310,37 @@ public class ChatOrchestrationService : IChatOrchestrationService
                 filterType: null,
                 cancellationToken: cts.Token);
 
-            if (results.Count == 0)
-            {
-                return null;
-            }
-
-            // Our MCP client returns formatted markdown text in the first result.
-            // Keep it short to avoid flooding chat.
-            var text = results[0].Text ?? string.Empty;
+            return FormatRagEnrichment(results);
+        }
+        catch
+        {
+            return null;
+        }
+    }
 
-            // Some MCP responses include a formatted "0 results" message; treat it as empty.
-            if (Regex.IsMatch(text, @"(?is)(Bulunan\s+Sonuç\s*:\s*0|0\s+adet|bulunamadı)") )
-            {
-                return null;
-            }
+    private static string? FormatRagEnrichment(IReadOnlyList<AnalysisSearchResult> results)
+    {
+        if (results.Count == 0)
+        {
+            return null;
+        }
 
-            if (text.Length > 1200)
-            {
-                text = text[..1200] + "...";
-            }
+        // Our MCP client returns formatted markdown text in the first result.
+        // Keep it short to avoid flooding chat.
+        var text = results[0].Text ?? string.Empty;
 
-            return text;
-        }
-        catch
+        // Some MCP responses include a formatted "0 results" message; treat it as empty.
+        if (Regex.IsMatch(text, @"(?is)(Bulunan\s+Sonuç\s*:\s*0|0\s+adet|bulunamadı)") )
         {
             return null;
         }
+
+        if (text.Length > 1200)
+        {
+            text = text[..1200] + "...";
+        }
+
+        return text;
     }
 
     private async Task<string?> BuildAveragesContextAsync(string tenantSlug, CancellationToken cancellationToken)
@@ -546,7 +558,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
         return await _mongo.GetTenantBySlugAsync(slug, cancellationToken);
     }
 
-    private async Task<(string reply, Dictionary<string, object?> parameters)> HandleAirQualityQueryAsync(
+    private async Task<IntentResult> HandleAirQualityQueryAsync(
         ChatSession session,
         ConversationContextEntity context,
         string message,
@@ -555,7 +567,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
         var tenantSlug = session.TenantSlug ?? context.TenantSlug;
         if (string.IsNullOrWhiteSpace(tenantSlug))
         {
-            return ("Hangi tenant için sorgu yapmak istiyorsunuz? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
+            return new IntentResult("Hangi tenant için sorgu yapmak istiyorsunuz? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
         }
 
         var pollutant = ExtractPollutant(message) ?? "PM2.5";
@@ -565,7 +577,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
         var deviceIds = devices.Select(d => d.DeviceId).Where(x => !string.IsNullOrWhiteSpace(x)).ToList();
         if (deviceIds.Count == 0)
         {
-            return ($"{tenantSlug} için cihaz bulunamadı.", new Dictionary<string, object?> { ["tenantSlug"] = tenantSlug });
+            return new IntentResult($"{tenantSlug} için cihaz bulunamadı.", new Dictionary<string, object?> { ["tenantSlug"] = tenantSlug });
         }
 
         var aggregates = await _airQuality.GetAggregatesAsync(
@@ -579,7 +591,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
 
         if (aggregates.Count == 0)
         {
-            return ($"{tenantSlug} için {normalized} verisi bulunamadı ({start:yyyy-MM-dd} - {end:yyyy-MM-dd}).", new Dictionary<string, object?>
+            return new IntentResult($"{tenantSlug} için {normalized} verisi bulunamadı ({start:yyyy-MM-dd} - {end:yyyy-MM-dd}).", new Dictionary<string, object?>
             {
                 ["tenantSlug"] = tenantSlug,
                 ["pollutant"] = normalized,
@@ -606,7 +618,8 @@ public class ChatOrchestrationService : IChatOrchestrationService
             reply += "\n\nNot: Bu değerlerin tehlikeli olup olmadığını değerlendirmek için mevzuat limitleri ve ölçüm koşullarıyla birlikte yorumlanması gerekir.";
         }
 
-        // Save this query result to vector DB for later RAG (best-effort)
+        // Save this query result to vector DB for later RAG (best-effort).
+        // Not batched with the RAG search: that search covers the same tenant and would race this write.
         try
         {
             var meta = new Dictionary<string, object>
@@ -646,10 +659,10 @@ public class ChatOrchestrationService : IChatOrchestrationService
             ["deviceCount"] = deviceIds.Count
         };
 
-        return (reply, parameters);
+        return new IntentResult(reply, parameters);
     }
 
-    private async Task<(string reply, Dictionary<string, object?> parameters)> HandleStatisticalAnalysisAsync(
+    private async Task<IntentResult> HandleStatisticalAnalysisAsync(
         ChatSession session,
         ConversationContextEntity context,
         string message,
@@ -658,7 +671,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
         var tenantSlug = session.TenantSlug ?? context.TenantSlug;
         if (string.IsNullOrWhiteSpace(tenantSlug))
         {
-            return ("Hangi tenant için analiz yapalım? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
+            return new IntentResult("Hangi tenant için analiz yapalım? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
         }
 
         var (start, end) = ExtractDateRangeUtc(message);
@@ -669,14 +682,13 @@ public class ChatOrchestrationService : IChatOrchestrationService
             pollutants = new List<string> { "PM2.5", "PM10", "NO2" };
         }
 
-        var result = await _mcp.TenantTimeRangeAnalysisAsync(
+        var (result, related) = await _mcp.TenantTimeRangeAnalysisWithRelatedAsync(
             tenantSlug,
             start,
             end,
             pollutants,
-            null,
-            null,
-            cancellationToken);
+            relatedQuery: message,
+            cancellationToken: cancellationToken);
 
         context.StartDate = EnsureUtc(start);
         context.EndDate = EnsureUtc(end);
@@ -689,10 +701,10 @@ public class ChatOrchestrationService : IChatOrchestrationService
             ["pollutants"] = pollutants
         };
 
-        return (result.RawText ?? "Analiz tamamlandı.", parameters);
+        return new IntentResult(result.RawText ?? "Analiz tamamlandı.", parameters, related);
     }
 
-    private async Task<(string reply, Dictionary<string, object?> parameters)> HandleMonthlyComparisonAsync(
+    private async Task<IntentResult> HandleMonthlyComparisonAsync(
         ChatSession session,
         ConversationContextEntity context,
         string message,
@@ -701,13 +713,13 @@ public class ChatOrchestrationService : IChatOrchestrationService
         var tenantSlug = session.TenantSlug ?? context.TenantSlug;
         if (string.IsNullOrWhiteSpace(tenantSlug))
         {
-            return ("Hangi tenant için aylık karşılaştırma yapalım? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
+            return new IntentResult("Hangi tenant için aylık karşılaştırma yapalım? (örn: akcansa)", new Dictionary<string, object?> { ["missing"] = "tenantSlug" });
         }
 
         var (m1, m2) = ExtractMonths(message);
         if (string.IsNullOrWhiteSpace(m1) || string.IsNullOrWhiteSpace(m2))
         {
-            return ("Hangi iki ayı karşılaştıralım? (örn: 2025-01 ve 2025-02)", new Dictionary<string, object?> { ["missing"] = "month1/month2" });
+            return new IntentResult("Hangi iki ayı karşılaştıralım? (örn: 2025-01 ve 2025-02)", new Dictionary<string, object?> { ["missing"] = "month1/month2" });
         }
 
         context.Month1 = m1;
@@ -716,7 +728,12 @@ public class ChatOrchestrationService : IChatOrchestrationService
         using var cts = CancellationTokenSource.CreateLinkedTokenSource(cancellationToken);
         cts.CancelAfter(TimeSpan.FromSeconds(25));
 
-        var result = await _mcp.TenantMonthlyComparisonAsync(tenantSlug, m1, m2, null, cts.Token);
+        var (result, related) = await _mcp.TenantMonthlyComparisonWithRelatedAsync(
+            tenantSlug,
+            m1,
+            m2,
+            relatedQuery: message,
+            cancellationToken: cts.Token);
 
         var parameters = new Dictionary<string, object?>
         {
@@ -725,7 +742,7 @@ public class ChatOrchestrationService : IChatOrchestrationService
             ["month2"] = m2
         };
 
-        return (result.RawText ?? "Karşılaştırma tamamlandı.", parameters);
+        return new IntentResult(result.RawText ?? "Karşılaştırma tamamlandı.", parameters, related);
     }
 
     private static string? ExtractPollutant(string message)
@@ -882,4 +899,9 @@ public class ChatOrchestrationService : IChatOrchestrationService
     {
         return value.HasValue ? value.Value.ToString("0.##", CultureInfo.InvariantCulture) : "N/A";
     }
+
+    private sealed record IntentResult(
+        string Reply,
+        Dictionary<string, object?> Parameters,
+        IReadOnlyList<AnalysisSearchResult>? Related = null);
 }
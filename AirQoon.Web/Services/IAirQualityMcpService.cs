@@ -20,10 +20,45 @@ public interface IAirQualityMcpService
         int? year = null,
         CancellationToken cancellationToken = default);
 
+    /// <summary>
+    /// Zaman aralığı analizi ve ilgili önceki analizlerin RAG araması tek /call_tools isteğinde.
+    /// RAG araması best-effort'tur: hata verirse Related boş döner.
+    /// </summary>
+    Task<(TimeRangeAnalysisResult Analysis, IReadOnlyList<AnalysisSearchResult> Related)> TenantTimeRangeAnalysisWithRelatedAsync(
+        string tenantSlug,
+        DateTime startDate,
+        DateTime endDate,
+        List<string>? pollutants,
+        string relatedQuery,
+        int relatedLimit = 3,
+        double relatedScoreThreshold = 0.5,
+        CancellationToken cancellationToken = default);
+
+    /// <summary>
+    /// Aylık karşılaştırma ve ilgili önceki analizlerin RAG araması tek /call_tools isteğinde.
+    /// </summary>
+    Task<(MonthlyComparisonResult Comparison, IReadOnlyList<AnalysisSearchResult> Related)> TenantMonthlyComparisonWithRelatedAsync(
+        string tenantSlug,
+        string month1,
+        string month2,
+        string relatedQuery,
+        int relatedLimit = 3,
+        double relatedScoreThreshold = 0.5,
+        CancellationToken cancellationToken = default);
+
     Task<IReadOnlyList<DeviceInfo>> GetTenantDevicesAsync(string tenantSlug, CancellationToken cancellationToken = default);
 
+    Task<DeviceListPage> GetTenantDevicesPageAsync(
+        string tenantSlug,
+        string? cursor = null,
+        int limit = 100,
+        IReadOnlyList<string>? telemetryFields = null,
+        CancellationToken cancellationToken = default);
+
     Task<TenantStatistics> GetTenantStatisticsAsync(string tenantSlug, CancellationToken cancellationToken = default);
 
+    Task<IReadOnlyList<TenantStatistics>> GetAllTenantStatisticsAsync(bool refresh = false, CancellationToken cancellationToken = default);
+
     Task<string> SaveAnalysisToVectorDbAsync(
         string tenantSlug,
         string analysisText,
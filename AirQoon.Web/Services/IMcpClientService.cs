@@ -1,3 +1,5 @@
+using AirQoon.Web.Models.Dtos;
+
 namespace AirQoon.Web.Services;
 
 public interface IMcpClientService
@@ -5,6 +7,11 @@ public interface IMcpClientService
     Task<T> CallToolAsync<T>(string toolName, object arguments, CancellationToken cancellationToken = default);
 
     Task<string> CallToolAsync(string toolName, object arguments, CancellationToken cancellationToken = default);
+
+    /// <summary>
+    /// Birden fazla tool'u tek HTTP isteğiyle (/call_tools) çalıştırır; sonuçlar aynı sırayla döner.
+    /// </summary>
+    Task<IReadOnlyList<McpToolCallResult>> CallToolsAsync(IReadOnlyList<McpToolCall> calls, CancellationToken cancellationToken = default);
     
     Task<bool> IsHealthyAsync(CancellationToken cancellationToken = default);
 }
@@ -1,5 +1,7 @@
+using System.Net;
 using System.Net.Http.Json;
 using System.Text.Json;
+using AirQoon.Web.Models.Dtos;
 
 namespace AirQoon.Web.Services;
 
@@ -28,6 +30,10 @@ public class McpClientService : IMcpClientService
         }
 
         _http.Timeout = TimeSpan.FromSeconds(_timeoutSeconds);
+
+        // Let the MCP server stop work (SQL/Mongo/Qdrant) once we would have given up on the response anyway.
+        _http.DefaultRequestHeaders.Remove("X-Request-Timeout-Ms");
+        _http.DefaultRequestHeaders.Add("X-Request-Timeout-Ms", (_timeoutSeconds * 1000).ToString());
         
         _logger.LogInformation("MCP Client initialized with BaseUrl={BaseUrl}, Timeout={TimeoutSeconds}s", _baseUrl, _timeoutSeconds);
     }
@@ -126,6 +132,13 @@ public class McpClientService : IMcpClientService
             _logger.LogDebug("Calling MCP tool: {ToolName}", toolName);
             
             var resp = await _http.PostAsJsonAsync("/call_tool", body, cancellationToken);
+            if (resp.StatusCode == HttpStatusCode.TooManyRequests)
+            {
+                // Admission control shed the call; surface the server's retry hint instead of a generic HTTP error.
+                var retryAfter = (int)(resp.Headers.RetryAfter?.Delta?.TotalSeconds ?? 1);
+                _logger.LogWarning("MCP service overloaded for tool: {ToolName}, retry after {RetryAfter}s", toolName, retryAfter);
+                throw new InvalidOperationException($"MCP servisi şu anda yoğun, {retryAfter} saniye sonra tekrar deneyin.");
+            }
             resp.EnsureSuccessStatusCode();
 
             var json = await resp.Content.ReadFromJsonAsync<McpCallToolResponse>(cancellationToken: cancellationToken);
@@ -148,8 +161,63 @@ public class McpClientService : IMcpClientService
         }
     }
 
+    public async Task<IReadOnlyList<McpToolCallResult>> CallToolsAsync(IReadOnlyList<McpToolCall> calls, CancellationToken cancellationToken = default)
+    {
+        if (calls is null || calls.Count == 0)
+        {
+            return Array.Empty<McpToolCallResult>();
+        }
+
+        try
+        {
+            if (!await IsHealthyAsync(cancellationToken))
+            {
+                throw new InvalidOperationException($"MCP servisi şu anda kullanılamıyor: {_baseUrl}. MCP sunucusunun çalıştığından emin olun.");
+            }
+
+            var body = new
+            {
+                calls = calls.Select(c => new { tool = c.Tool, arguments = c.Arguments, timeout_ms = c.TimeoutMs }).ToList()
+            };
+
+            _logger.LogDebug("Calling MCP tools in batch: {ToolNames}", string.Join(",", calls.Select(c => c.Tool)));
+
+            var resp = await _http.PostAsJsonAsync("/call_tools", body, cancellationToken);
+            if (resp.StatusCode == HttpStatusCode.TooManyRequests)
+            {
+                var retryAfter = (int)(resp.Headers.RetryAfter?.Delta?.TotalSeconds ?? 1);
+                _logger.LogWarning("MCP service overloaded for batch of {Count} tools, retry after {RetryAfter}s", calls.Count, retryAfter);
+                throw new InvalidOperationException($"MCP servisi şu anda yoğun, {retryAfter} saniye sonra tekrar deneyin.");
+            }
+            resp.EnsureSuccessStatusCode();
+
+            var json = await resp.Content.ReadFromJsonAsync<McpCallToolsResponse>(JsonOptions, cancellationToken);
+            return json?.Results ?? new List<McpToolCallResult>();
+        }
+        catch (HttpRequestException ex) when (ex.Message.Contains("Connection refused") || ex.InnerException?.Message.Contains("Connection refused") == true)
+        {
+            _logger.LogError(ex, "MCP service connection refused: {BaseUrl}. Ensure MCP server is running.", _baseUrl);
+            throw new InvalidOperationException($"MCP servisi bağlantı hatası: {_baseUrl}. MCP sunucusunun çalıştığından emin olun.", ex);
+        }
+        catch (TaskCanceledException ex) when (ex.InnerException is TimeoutException || !cancellationToken.IsCancellationRequested)
+        {
+            _logger.LogError(ex, "MCP service timeout after {TimeoutSeconds}s for batch of {Count} tools", _timeoutSeconds, calls.Count);
+            throw new TimeoutException($"MCP servisi {_timeoutSeconds} saniye içinde yanıt vermedi.", ex);
+        }
+        catch (HttpRequestException ex)
+        {
+            _logger.LogError(ex, "MCP service HTTP error for batch of {Count} tools", calls.Count);
+            throw new InvalidOperationException($"MCP servisi HTTP hatası: {ex.Message}", ex);
+        }
+    }
+
     private sealed class McpCallToolResponse
     {
         public string? text { get; set; }
     }
+
+    private sealed class McpCallToolsResponse
+    {
+        public List<McpToolCallResult>? Results { get; set; }
+    }
 }
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Airqoon Aylık Değişim Özetleri - Tenant Bazlı Önceden Hesaplanmış Aylık Aggregate + Delta
+Her ay için tenant/parametre bazlı ortalama, min, max, ölçüm sayısı ve önceki aya göre değişim
+tenant_monthly_digest tablosuna yazılır (tenant_devices join'i, ay başına tek sorgu -> tek partition).
+Üretilen özet metinleri tenant'ların vector collection'larına batch halinde embed edilir;
+aylık karşılaştırmalar ve "ne değişti" RAG sorguları canlı aggregate yerine bu veriden servis edilir.
+
+Özetler şu durumlarda "kirli" işaretlenir ve sonraki çalıştırmada yeniden hesaplanır:
+  - aqi_ingest ile yeni satır yüklenen aylar (rollup hook'u)
+  - tenant_devices sync'inde eklenen/taşınan/silinen cihazların verisi olan aylar
+Retention ile ayrılan aylarınki silinir. air_quality_index'e ham yazmalar aqi_ingest üzerinden yapılmalıdır;
+doğrudan INSERT/UPDATE/DELETE kapanmış ayların özetlerini geçersiz kılmaz (gerekirse `run --month YYYY-MM`).
+
+Kullanım:
+    python3 aqi_digest.py run [--months-back 2] [--month 2025-04] [--no-embed]
+    python3 aqi_digest.py status
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+
+from dateutil.relativedelta import relativedelta
+
+from aqi_partitioning import TABLE_NAME, connect_pg, month_floor
+
+DIGEST_TABLE = "tenant_monthly_digest"
+RUNS_TABLE = "aqi_digest_runs"
+DIRTY_TABLE = "aqi_digest_dirty_months"
+
+# Varsayılan: bu ay + önceki ay (geç gelen veriler için)
+MONTHS_BACK = int(os.getenv("AQI_DIGEST_MONTHS_BACK", "1"))
+DRAMATIC_CHANGE_PCT = float(os.getenv("AQI_DIGEST_DRAMATIC_PCT", "20"))
+EMBED_BATCH = int(os.getenv("AQI_DIGEST_EMBED_BATCH", "16"))
+DIGEST_INTERVAL_SECONDS = float(os.getenv("AQI_DIGEST_INTERVAL_SECONDS", "0"))  # 0 = worker kapalı (örn. 86400)
+
+DIGEST_ANALYSIS_TYPE = "monthly_digest"
+
+# Aynı anda tek hesaplama (worker + CLI)
+ADVISORY_LOCK_KEY = 0x6471_6774  # "dqgt"
+
+
+def ensure_schema(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {DIGEST_TABLE} (
+                tenant_slug VARCHAR(255) NOT NULL,
+                month DATE NOT NULL,
+                parameter VARCHAR(50) NOT NULL,
+                avg_concentration DECIMAL(12, 4),
+                min_concentration DECIMAL(10, 2),
+                max_concentration DECIMAL(10, 2),
+                measurement_count BIGINT NOT NULL,
+                concentration_unit VARCHAR(20),
+                prev_avg_concentration DECIMAL(12, 4),
+                delta DECIMAL(12, 4),
+                delta_pct DECIMAL(10, 2),
+                dramatic BOOLEAN NOT NULL DEFAULT FALSE,
+                computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (tenant_slug, month, parameter)
+            );
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+                month DATE PRIMARY KEY,
+                completed_at TIMESTAMPTZ NOT NULL,
+                row_count BIGINT NOT NULL,
+                elapsed_ms DOUBLE PRECISION
+            );
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+                month DATE PRIMARY KEY,
+                marked_at TIMESTAMPTZ NOT NULL
+            );
+            """
+        )
+    conn.commit()
+
+
+def mark_dirty_months(cursor, touched: Dict):
+    """aqi_ingest rollup hook'u: yeni satır gelen ayların özetini yeniden hesaplanacak olarak işaretle"""
+    months = sorted(touched.get("months") or [])
+    if not months:
+        return
+    cursor.executemany(
+        f"""
+        INSERT INTO {DIRTY_TABLE} (month, marked_at) VALUES (%s, clock_timestamp())
+        ON CONFLICT (month) DO UPDATE SET marked_at = EXCLUDED.marked_at
+        """,
+        [(month,) for month in months]
+    )
+
+
+def mark_devices_dirty(cursor, device_ids) -> List[date]:
+    """
+    tenant_devices sync hook'u: tenant'ı değişen (eklenen/taşınan/silinen) cihazların verisi olan
+    hesaplanmış ayları kirli işaretle. Özet tabloları yoksa bir şey yapmaz.
+    """
+    device_ids = sorted(set(device_ids))
+    if not device_ids:
+        return []
+    cursor.execute("SELECT to_regclass(%s)", (RUNS_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return []
+    cursor.execute(
+        f"""
+        INSERT INTO {DIRTY_TABLE} (month, marked_at)
+        SELECT r.month, clock_timestamp()
+        FROM {RUNS_TABLE} r
+        WHERE EXISTS (
+            SELECT 1 FROM {TABLE_NAME} a
+            WHERE a.device_id = ANY(%s)
+              AND a.calculated_datetime >= r.month
+              AND a.calculated_datetime < r.month + INTERVAL '1 month'
+        )
+        ON CONFLICT (month) DO UPDATE SET marked_at = EXCLUDED.marked_at
+        RETURNING month
+        """,
+        (device_ids,)
+    )
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def forget_months(cursor, months: List[date]):
+    """Retention ile ayrılan/silinen ayların özetlerini kaldır (canlı aggregate ile tutarlı kalsın)"""
+    if not months:
+        return
+    cursor.execute("SELECT to_regclass(%s)", (RUNS_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return
+    for table in (DIGEST_TABLE, RUNS_TABLE, DIRTY_TABLE):
+        cursor.execute(f"DELETE FROM {table} WHERE month = ANY(%s)", (list(months),))
+
+
+def dirty_months(cursor) -> List[date]:
+    cursor.execute(f"SELECT month FROM {DIRTY_TABLE} ORDER BY month")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def compute_month(conn, month_start: date) -> Dict:
+    """
+    Tek ayın tüm tenant'lar için özetini yeniden hesapla (tek transaction) ve
+    bu ay ile sonraki ayın önceki-ay delta'larını güncelle.
+    """
+    started = time.perf_counter()
+    month_end = month_start + relativedelta(months=1)
+    next_month = month_end
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT clock_timestamp()")
+        computation_started = cursor.fetchone()[0]
+        cursor.execute(f"DELETE FROM {DIGEST_TABLE} WHERE month = %s", (month_start,))
+        cursor.execute(
+            f"""
+            INSERT INTO {DIGEST_TABLE} (
+                tenant_slug, month, parameter, avg_concentration, min_concentration,
+                max_concentration, measurement_count, concentration_unit, computed_at
+            )
+            SELECT
+                td.tenant_slug,
+                %s,
+                a.parameter,
+                AVG(a.concentration),
+                MIN(a.concentration),
+                MAX(a.concentration),
+                COUNT(*),
+                MAX(a.concentration_unit),
+                NOW()
+            FROM tenant_devices td
+            JOIN {TABLE_NAME} a ON a.device_id = td.device_id
+            WHERE a.calculated_datetime >= %s
+                AND a.calculated_datetime < %s
+            GROUP BY td.tenant_slug, a.parameter
+            """,
+            (month_start, month_start, month_end)
+        )
+        row_count = cursor.rowcount
+
+        # Önceki aya göre değişim (bu ay + bu ayı "önceki ay" olarak kullanan sonraki ay)
+        cursor.execute(
+            f"""
+            UPDATE {DIGEST_TABLE} d
+            SET prev_avg_concentration = (
+                SELECT p.avg_concentration FROM {DIGEST_TABLE} p
+                WHERE p.tenant_slug = d.tenant_slug
+                  AND p.parameter = d.parameter
+                  AND p.month = (d.month - INTERVAL '1 month')::date
+            )
+            WHERE d.month IN (%s, %s)
+            """,
+            (month_start, next_month)
+        )
+        cursor.execute(
+            f"""
+            UPDATE {DIGEST_TABLE}
+            SET delta = avg_concentration - prev_avg_concentration,
+                delta_pct = CASE WHEN prev_avg_concentration > 0
+                    THEN (avg_concentration - prev_avg_concentration) / prev_avg_concentration * 100 END,
+                dramatic = COALESCE(
+                    prev_avg_concentration > 0
+                    AND ABS((avg_concentration - prev_avg_concentration) / prev_avg_concentration * 100) > %s,
+                    FALSE
+                )
+            WHERE month IN (%s, %s)
+            """,
+            (DRAMATIC_CHANGE_PCT, month_start, next_month)
+        )
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        cursor.execute(
+            f"""
+            INSERT INTO {RUNS_TABLE} (month, completed_at, row_count, elapsed_ms) VALUES (%s, NOW(), %s, %s)
+            ON CONFLICT (month) DO UPDATE SET
+                completed_at = EXCLUDED.completed_at, row_count = EXCLUDED.row_count, elapsed_ms = EXCLUDED.elapsed_ms
+            """,
+            (month_start, row_count, elapsed_ms)
+        )
+        # Hesaplama sırasında yeniden kirlenen ay işaretli kalır
+        cursor.execute(
+            f"DELETE FROM {DIRTY_TABLE} WHERE month = %s AND marked_at <= %s",
+            (month_start, computation_started)
+        )
+    conn.commit()
+    return {"month": month_start.strftime("%Y-%m"), "rows": row_count, "elapsed_ms": elapsed_ms}
+
+
+def load_digest_rows(conn, months: List[date]) -> Dict[str, Dict[date, List[Dict]]]:
+    """{tenant_slug: {month: [satır, ...]}}"""
+    grouped: Dict[str, Dict[date, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+    columns = (
+        "tenant_slug", "month", "parameter", "avg_concentration", "min_concentration", "max_concentration",
+        "measurement_count", "concentration_unit", "prev_avg_concentration", "delta", "delta_pct", "dramatic"
+    )
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {", ".join(columns)} FROM {DIGEST_TABLE}
+            WHERE month = ANY(%s)
+            ORDER BY tenant_slug, month, parameter
+            """,
+            (list(months),)
+        )
+        for row in cursor.fetchall():
+            item = dict(zip(columns, row))
+            grouped[item["tenant_slug"]][item["month"]].append(item)
+    conn.rollback()
+    return grouped
+
+
+def render_digest(tenant_name: str, tenant_slug: str, month_start: date, rows: List[Dict], partial: bool) -> str:
+    """Özet metni (time range analizi ile aynı markdown düzeni; parametre başına bir bölüm)"""
+    previous = month_start - relativedelta(months=1)
+    text = f"# {tenant_name} - {month_start:%Y-%m} Aylık Değişim Özeti\n\n"
+    text += f"**Tenant:** {tenant_slug}\n"
+    text += f"**Dönem:** {month_start:%Y-%m}{' (devam eden ay, kısmi veri)' if partial else ''}\n"
+    text += f"**Karşılaştırılan Ay:** {previous:%Y-%m}\n"
+    dramatic = [row["parameter"] for row in rows if row["dramatic"]]
+    if dramatic:
+        text += f"**Dramatik Değişim:** {', '.join(dramatic)}\n"
+    text += "\n"
+
+    for row in rows:
+        unit = row["concentration_unit"] or "µg/m³"
+        text += f"## {row['parameter']}\n"
+        text += f"- Ortalama: {float(row['avg_concentration']):.2f} {unit}\n"
+        text += f"- Minimum: {float(row['min_concentration']):.2f} {unit}\n"
+        text += f"- Maksimum: {float(row['max_concentration']):.2f} {unit}\n"
+        text += f"- Ölçüm Sayısı: {row['measurement_count']}\n"
+        if row["prev_avg_concentration"] is not None:
+            delta = float(row["delta"])
+            pct = f" ({float(row['delta_pct']):+.1f}%)" if row["delta_pct"] is not None else ""
+            text += f"- **Değişim ({previous:%Y-%m} → {month_start:%Y-%m}):** {delta:+.2f}{pct}\n"
+            text += f"  - Önceki ({previous:%Y-%m}): {float(row['prev_avg_concentration']):.2f}\n"
+            if row["dramatic"]:
+                text += f"  - ⚠️ **DRAMATİK DEĞİŞİM TESPİT EDİLDİ!**\n"
+        text += "\n"
+    return text
+
+
+def tenant_names(tenant_slugs: List[str]) -> Dict[str, str]:
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    try:
+        tenants = client["airqoonBaseMapDB"]["Tenants"].find(
+            {"SlugName": {"$in": tenant_slugs}}, {"_id": 0, "SlugName": 1, "Name": 1}
+        )
+        return {tenant["SlugName"]: tenant.get("Name") or tenant["SlugName"] for tenant in tenants}
+    except Exception as e:
+        print(f"⚠️ Tenant adları alınamadı: {e}")
+        return {}
+    finally:
+        client.close()
+
+
+def embed_digests(conn, months: List[date], vector_api=None, batch_size: int = EMBED_BATCH) -> Dict:
+    """Hesaplanan ayların özetlerini tenant collection'larına batch halinde kaydet"""
+    if vector_api is None:
+        from vector_db_api import TenantIsolatedVectorAPI
+        vector_api = TenantIsolatedVectorAPI()
+
+    grouped = load_digest_rows(conn, months)
+    names = tenant_names(sorted(grouped))
+    current_month = month_floor(date.today())
+    report = {"tenants": 0, "documents": 0, "failed": {}}
+
+    for tenant_slug, by_month in grouped.items():
+        analyses = []
+        for month_start, rows in sorted(by_month.items()):
+            month_end = month_start + relativedelta(months=1)
+            analyses.append({
+                "text": render_digest(names.get(tenant_slug, tenant_slug), tenant_slug, month_start, rows,
+                                      partial=month_start >= current_month),
+                "metadata": {
+                    "analysis_type": DIGEST_ANALYSIS_TYPE,
+                    "start_date": month_start.isoformat(),
+                    "end_date": month_end.isoformat(),
+                    "month": month_start.strftime("%Y-%m"),
+                    "tenant_name": names.get(tenant_slug, tenant_slug),
+                    "pollutants": sorted(row["parameter"] for row in rows),
+                    "dramatic_parameters": [row["parameter"] for row in rows if row["dramatic"]],
+                },
+            })
+        try:
+            for start in range(0, len(analyses), batch_size):
+                vector_api.save_analyses(tenant_slug, analyses[start:start + batch_size])
+            report["tenants"] += 1
+            report["documents"] += len(analyses)
+        except Exception as e:
+            report["failed"][tenant_slug] = str(e)
+    return report
+
+
+def run_digest(
+    conn,
+    months_back: int = MONTHS_BACK,
+    months: Optional[List[date]] = None,
+    embed: bool = True,
+    vector_api=None
+) -> Dict:
+    """Bu ay + months_back önceki ay + kirli aylar (veya verilen aylar) için özetleri hesapla ve embed et"""
+    ensure_schema(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return {"skipped": True}
+        conn.commit()
+    try:
+        if months is None:
+            current = month_floor(date.today())
+            targets = {current - relativedelta(months=offset) for offset in range(months_back + 1)}
+            with conn.cursor() as cursor:
+                targets.update(dirty_months(cursor))
+            conn.rollback()
+            months = sorted(targets)
+
+        report = {"months": [compute_month(conn, month_start) for month_start in months]}
+        if embed:
+            report["embedding"] = embed_digests(conn, months, vector_api)
+        return report
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        conn.commit()
+
+
+class DigestWorker:
+    """Özetleri periyodik (örn. gecelik) hesaplayan arka plan thread'i"""
+
+    def __init__(self, interval_seconds: float = DIGEST_INTERVAL_SECONDS, vector_api=None, connect: Callable = connect_pg):
+        self.interval = interval_seconds
+        self.vector_api = vector_api
+        self.connect = connect
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="aqi-digest", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            conn = None
+            try:
+                conn = self.connect()
+                report = run_digest(conn, vector_api=self.vector_api)
+                if not report.get("skipped"):
+                    print(f"📊 Aylık özetler: {report}")
+            except Exception as e:
+                print(f"⚠️ Aylık özet hesaplaması başarısız: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def print_status(conn):
+    ensure_schema(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT month, completed_at, row_count, elapsed_ms FROM {RUNS_TABLE} ORDER BY month DESC LIMIT 24")
+        runs = cursor.fetchall()
+        pending = dirty_months(cursor)
+        cursor.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE dramatic) FROM {DIGEST_TABLE}")
+        total, dramatic = cursor.fetchone()
+    conn.rollback()
+    print(f"📊 {DIGEST_TABLE}: {total} satır ({dramatic} dramatik değişim)")
+    print(f"  - Yeniden hesaplanacak aylar: {', '.join(m.strftime('%Y-%m') for m in pending) or 'yok'}")
+    for month_start, completed_at, row_count, elapsed_ms in runs:
+        print(f"  - {month_start:%Y-%m}: {row_count} satır, {completed_at:%Y-%m-%d %H:%M} ({elapsed_ms} ms)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tenant bazlı aylık değişim özetleri")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Özetleri hesapla ve embed et")
+    run_parser.add_argument("--months-back", type=int, default=MONTHS_BACK, help="Bu aydan geriye kaç ay")
+    run_parser.add_argument("--month", action="append", help="Sadece bu ay(lar) (YYYY-MM, tekrarlanabilir)")
+    run_parser.add_argument("--no-embed", action="store_true", help="Vector DB'ye kaydetme")
+    sub.add_parser("status", help="Son hesaplamalar ve bekleyen aylar")
+
+    args = parser.parse_args(argv)
+    conn = connect_pg()
+    try:
+        if args.command == "status":
+            print_status(conn)
+            return 0
+        months = [datetime.strptime(value, "%Y-%m").date() for value in args.month] if args.month else None
+        report = run_digest(conn, args.months_back, months, embed=not args.no_embed)
+        if report.get("skipped"):
+            print("⚠ Başka bir özet hesaplaması çalışıyor, atlandı")
+            return 0
+        for item in report["months"]:
+            print(f"✓ {item['month']}: {item['rows']} satır ({item['elapsed_ms']} ms)")
+        embedding = report.get("embedding")
+        if embedding:
+            print(f"✓ Vector DB: {embedding['documents']} özet, {embedding['tenants']} tenant")
+            for slug, error in embedding["failed"].items():
+                print(f"❌ {slug}: {error}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
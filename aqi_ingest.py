@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Airqoon air_quality_index - Toplu Ölçüm Yükleme (COPY)
+CSV / NDJSON dosyalarından veya Mongo Devices.LatestTelemetry'den ölçümleri akış halinde okur,
+sınırlı batch'ler halinde geçici staging tabloya COPY ile yazar ve
+(device_id, parameter, calculated_datetime) üzerinden tekilleştirerek air_quality_index'e ekler.
+Bellek kullanımı batch boyutuyla sınırlıdır; dosya ne kadar büyük olursa olsun sabit kalır.
+
+Kullanım:
+    python3 aqi_ingest.py csv readings.csv[.gz] [--batch-size 50000]
+    python3 aqi_ingest.py ndjson readings.ndjson[.gz]    (- = stdin)
+    python3 aqi_ingest.py mongo [--tenant akcansa] [--default-time 2025-04-01T12:00:00]
+
+CSV/NDJSON alanları: device_id, parameter, concentration, concentration_unit, calculated_datetime
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import aqi_digest
+import aqi_sketch
+from aqi_partitioning import TABLE_NAME, connect_pg, ensure_month_partition, is_partitioned, month_floor, partition_name
+
+BATCH_SIZE = int(os.getenv("AQI_INGEST_BATCH", "50000"))
+PROGRESS_EVERY_SECONDS = 5.0
+MAX_REPORTED_ERRORS = 10
+
+COLUMNS = ("device_id", "parameter", "concentration", "concentration_unit", "calculated_datetime")
+STAGING_TABLE = "aqi_ingest_staging"
+
+# Aynı anda çalışan iki yükleme aynı satırı iki kez eklemesin (merge adımı sıralı)
+ADVISORY_LOCK_KEY = 0x6171_6969  # "aqii"
+
+# Batch commit'inden önce aynı transaction'da çağrılır: callback(cursor, touched)
+# touched = {"devices": {device_id, ...}, "months": {date(YYYY, MM, 1), ...}, "days": {date, ...}}
+ROLLUP_HOOKS: List[Callable] = []
+
+
+def register_rollup(callback: Callable):
+    """Özet tabloları/önbellekleri yeni satırlarla artımlı güncellemek için hook ekle"""
+    ROLLUP_HOOKS.append(callback)
+    return callback
+
+
+Reading = Tuple[str, str, Optional[float], Optional[str], datetime]
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def _parse_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        text = str(value or "").strip()
+        if not text:
+            raise RejectedRow("calculated_datetime boş")
+        try:
+            moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            raise RejectedRow(f"Geçersiz tarih: {text}")
+    # Kolon TIMESTAMP (timezone'suz): timezone'lu değerler UTC'ye çevrilir
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def normalize_reading(record: Dict) -> Reading:
+    device_id = str(record.get("device_id") or "").strip()
+    parameter = str(record.get("parameter") or "").strip()
+    if not device_id or len(device_id) > 255:
+        raise RejectedRow("device_id boş veya 255 karakterden uzun")
+    if not parameter or len(parameter) > 50:
+        raise RejectedRow("parameter boş veya 50 karakterden uzun")
+
+    raw_value = record.get("concentration")
+    if raw_value is None or raw_value == "":
+        concentration = None
+    else:
+        try:
+            concentration = round(float(raw_value), 2)
+        except (TypeError, ValueError):
+            raise RejectedRow(f"Geçersiz concentration: {raw_value}")
+
+    unit = record.get("concentration_unit")
+    unit = str(unit).strip()[:20] if unit not in (None, "") else None
+    return device_id, parameter, concentration, unit, _parse_datetime(record.get("calculated_datetime"))
+
+
+def _open_text(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    handle = _open_text(path)
+    try:
+        yield from csv.DictReader(handle)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def read_ndjson(path: str) -> Iterator[Dict]:
+    handle = _open_text(path)
+    try:
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                # normalize_reading'de reddedilsin diye boş kayıt
+                yield {"_error": f"{line_no}. satır JSON değil: {e}"}
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+TELEMETRY_TIME_KEYS = ("CalculatedDateTime", "calculated_datetime", "Timestamp", "timestamp", "Time", "time")
+TELEMETRY_VALUE_KEYS = ("Value", "value", "Concentration", "concentration")
+TELEMETRY_UNIT_KEYS = ("Unit", "unit", "ConcentrationUnit", "concentration_unit")
+
+
+def _first(mapping: Dict, keys: Iterable[str]):
+    for key in keys:
+        if mapping.get(key) not in (None, ""):
+            return mapping[key]
+    return None
+
+
+def read_mongo_latest_telemetry(tenant_slug: Optional[str] = None, default_time: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Devices.LatestTelemetry'yi satırlara aç. İki biçim desteklenir:
+      {"PM10-24h": 41.2, ..., "Timestamp": ...}
+      {"PM10-24h": {"Value": 41.2, "Unit": "µg/m³", "Timestamp": ...}, ...}
+    Zaman bilgisi olmayan değerler default_time verilmezse reddedilir.
+    """
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    try:
+        query = {"LatestTelemetry": {"$exists": True, "$ne": None}}
+        if tenant_slug:
+            query["TenantSlugName"] = tenant_slug
+        devices = client["airqoonBaseMapDB"]["Devices"].find(
+            query, {"_id": 0, "DeviceId": 1, "LatestTelemetry": 1}, batch_size=1000
+        )
+        for device in devices:
+            telemetry = device.get("LatestTelemetry")
+            if not isinstance(telemetry, dict):
+                continue
+            shared_time = _first(telemetry, TELEMETRY_TIME_KEYS) or default_time
+            for key, value in telemetry.items():
+                if key in TELEMETRY_TIME_KEYS:
+                    continue
+                if isinstance(value, dict):
+                    concentration = _first(value, TELEMETRY_VALUE_KEYS)
+                    unit = _first(value, TELEMETRY_UNIT_KEYS)
+                    moment = _first(value, TELEMETRY_TIME_KEYS) or shared_time
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    concentration, unit, moment = value, None, shared_time
+                else:
+                    continue
+                yield {
+                    "device_id": device.get("DeviceId"),
+                    "parameter": key,
+                    "concentration": concentration,
+                    "concentration_unit": unit,
+                    "calculated_datetime": moment,
+                }
+    finally:
+        client.close()
+
+
+def _copy_field(value) -> str:
+    """COPY text formatı: NULL = \\N, ayraç/satır sonu/ters bölü kaçışlanır"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class Ingestor:
+    """
+    Staging (temp) tabloya COPY + tekilleştirerek merge. Her batch ayrı transaction;
+    yükleme yarıda kesilirse tamamlanan batch'ler kalır, tekrar çalıştırmak güvenlidir.
+    """
+
+    def __init__(self, conn, batch_size: int = BATCH_SIZE, analyze: bool = True):
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.analyze = analyze
+        self._known_months: Set[date] = set()
+        self._partitioned: Optional[bool] = None
+        self.report = {"read": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "batches": 0, "errors": []}
+
+    def _prepare_session(self, cursor):
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                device_id VARCHAR(255) NOT NULL,
+                parameter VARCHAR(50) NOT NULL,
+                concentration DECIMAL(10, 2),
+                concentration_unit VARCHAR(20),
+                calculated_datetime TIMESTAMP NOT NULL
+            )
+            """
+        )
+        if self._partitioned is None:
+            self._partitioned = is_partitioned(cursor)
+        self.conn.commit()
+
+    def _ensure_partitions(self, cursor, months: Set[date]) -> Set[date]:
+        """
+        Batch'teki aylar için partition yoksa oluştur (default partition'a düşmesin).
+        Advisory lock altında çağrılmalı; kontrol edilen aylar commit sonrası _known_months'a eklenir.
+        """
+        if not self._partitioned:
+            return set()
+        checked = months - self._known_months
+        for month_start in sorted(checked):
+            ensure_month_partition(cursor, month_start)
+        return checked
+
+    def _flush(self, cursor, buffer: io.StringIO, rows: int, touched: Dict):
+        if not rows:
+            return
+        buffer.seek(0)
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        cursor.copy_from(buffer, STAGING_TABLE, columns=COLUMNS)
+
+        # Lock partition oluşturmadan önce alınır: eşzamanlı ingest'ler aynı ayı birlikte oluşturmaya çalışmasın
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,))
+        checked_months = self._ensure_partitions(cursor, touched["months"])
+        # Batch içi tekrarlar DISTINCT ON ile, tablodakiler covering index üzerinden NOT EXISTS ile elenir
+        cursor.execute(
+            f"""
+            INSERT INTO {TABLE_NAME} (device_id, parameter, concentration, concentration_unit, calculated_datetime)
+            SELECT DISTINCT ON (s.device_id, s.parameter, s.calculated_datetime)
+                s.device_id, s.parameter, s.concentration, s.concentration_unit, s.calculated_datetime
+            FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {TABLE_NAME} a
+                WHERE a.device_id = s.device_id
+                  AND a.parameter = s.parameter
+                  AND a.calculated_datetime = s.calculated_datetime
+            )
+            ORDER BY s.device_id, s.parameter, s.calculated_datetime
+            """
+        )
+        inserted = cursor.rowcount
+        if inserted and ROLLUP_HOOKS:
+            for hook in ROLLUP_HOOKS:
+                hook(cursor, touched)
+        self.conn.commit()
+        self._known_months |= checked_months
+
+        self.report["inserted"] += inserted
+        self.report["duplicates"] += rows - inserted
+        self.report["batches"] += 1
+
+    def _reject(self, message: str):
+        self.report["rejected"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append(message)
+
+    def run(self, records: Iterable[Dict], progress: bool = True) -> Dict:
+        started = time.perf_counter()
+        last_progress = started
+        all_months: Set[date] = set()
+
+        with self.conn.cursor() as cursor:
+            self._prepare_session(cursor)
+            buffer = io.StringIO()
+            pending = 0
+            touched = {"devices": set(), "months": set(), "days": set()}
+
+            for record in records:
+                self.report["read"] += 1
+                try:
+                    if "_error" in record:
+                        raise RejectedRow(record["_error"])
+                    reading = normalize_reading(record)
+                except RejectedRow as e:
+                    self._reject(str(e))
+                    continue
+
+                buffer.write("\t".join(_copy_field(value) for value in reading) + "\n")
+                pending += 1
+                touched["devices"].add(reading[0])
+                touched["months"].add(month_floor(reading[4].date()))
+                touched["days"].add(reading[4].date())
+
+                if pending >= self.batch_size:
+                    self._flush(cursor, buffer, pending, touched)
+                    all_months |= touched["months"]
+                    buffer = io.StringIO()
+                    pending = 0
+                    touched = {"devices": set(), "months": set(), "days": set()}
+
+                    now = time.perf_counter()
+                    if progress and now - last_progress >= PROGRESS_EVERY_SECONDS:
+                        rate = self.report["read"] / (now - started)
+                        print(f"  ↳ {self.report['read']} okundu, {self.report['inserted']} eklendi ({rate:,.0f} satır/sn)")
+                        last_progress = now
+
+            self._flush(cursor, buffer, pending, touched)
+            all_months |= touched["months"]
+
+            # Planner istatistiklerini sadece dokunulan aylar için tazele
+            if self.analyze and self.report["inserted"]:
+                targets = [partition_name(month) for month in sorted(all_months)] if self._partitioned else [TABLE_NAME]
+                for target in targets:
+                    cursor.execute("SELECT to_regclass(%s)", (f"public.{target}",))
+                    if cursor.fetchone()[0] is not None:
+                        cursor.execute(f"ANALYZE {target}")
+                self.conn.commit()
+
+        elapsed = time.perf_counter() - started
+        self.report["seconds"] = round(elapsed, 2)
+        self.report["rows_per_second"] = round(self.report["read"] / elapsed, 1) if elapsed else None
+        self.report["months"] = [month.strftime("%Y-%m") for month in sorted(all_months)]
+        return self.report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="air_quality_index toplu ölçüm yükleme (COPY)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="COPY batch boyutu (satır)")
+    parser.add_argument("--no-analyze", action="store_true", help="Yükleme sonrası ANALYZE çalıştırma")
+    sub = parser.add_subparsers(dest="source", required=True)
+
+    csv_parser = sub.add_parser("csv", help="CSV dosyasından (başlık satırı zorunlu)")
+    csv_parser.add_argument("path", help="Dosya yolu (.gz desteklenir, - = stdin)")
+    ndjson_parser = sub.add_parser("ndjson", help="Satır başına bir JSON kayıt")
+    ndjson_parser.add_argument("path", help="Dosya yolu (.gz desteklenir, - = stdin)")
+    mongo_parser = sub.add_parser("mongo", help="Mongo Devices.LatestTelemetry'den")
+    mongo_parser.add_argument("--tenant", help="Sadece bu tenant'ın cihazları")
+    mongo_parser.add_argument("--default-time", help="Zaman bilgisi olmayan telemetri için ISO tarih")
+
+    args = parser.parse_args(argv)
+    if args.source == "csv":
+        records = read_csv(args.path)
+    elif args.source == "ndjson":
+        records = read_ndjson(args.path)
+    else:
+        default_time = _parse_datetime(args.default_time) if args.default_time else None
+        records = read_mongo_latest_telemetry(args.tenant, default_time)
+
+    conn = connect_pg()
+    try:
+        # Yüklenen ayların aylık özetleri ve günlerin sketch'leri sonraki çalıştırmada yenilenir
+        aqi_digest.ensure_schema(conn)
+        aqi_sketch.ensure_schema(conn)
+        for hook in (aqi_digest.mark_dirty_months, aqi_sketch.mark_dirty_days):
+            if hook not in ROLLUP_HOOKS:
+                register_rollup(hook)
+        print(f"🔄 {TABLE_NAME} yüklemesi başlıyor ({args.source}, batch: {args.batch_size})...")
+        report = Ingestor(conn, args.batch_size, analyze=not args.no_analyze).run(records)
+    finally:
+        conn.close()
+
+    print(f"✅ {report['read']} okundu, {report['inserted']} eklendi, {report['duplicates']} tekrar, "
+          f"{report['rejected']} reddedildi — {report['seconds']} sn ({report['rows_per_second']} satır/sn)")
+    if report["months"]:
+        print(f"  - Etkilenen aylar: {', '.join(report['months'])}")
+    for error in report["errors"]:
+        print(f"  ⚠ {error}")
+    return 0 if not report["rejected"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Airqoon air_quality_index - Aylık Partition Yönetimi
+Tabloyu calculated_datetime üzerinde aylık RANGE partition'lara taşır,
+ileriye dönük partition'ları oluşturur, default partition'a düşmüş geçmiş
+ayları kendi partition'larına ayırır ve retention (detach/drop) uygular.
+
+Kullanım:
+    python3 aqi_partitioning.py status
+    python3 aqi_partitioning.py migrate [--drop-legacy]
+    python3 aqi_partitioning.py maintain [--months-ahead 3] [--retention-months 24] [--retention-action detach|drop]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import psycopg2
+from dateutil.relativedelta import relativedelta
+
+TABLE_NAME = "air_quality_index"
+LEGACY_TABLE_NAME = f"{TABLE_NAME}_legacy"
+DEFAULT_PARTITION = f"{TABLE_NAME}_default"
+COVERING_INDEX = "idx_aqi_device_param_time_covering"
+
+# Varsayılan politika (env ile override edilebilir)
+MONTHS_AHEAD = int(os.getenv("AQI_PARTITION_MONTHS_AHEAD", "3"))
+RETENTION_MONTHS = int(os.getenv("AQI_RETENTION_MONTHS", "0"))  # 0 = retention kapalı
+RETENTION_ACTION = os.getenv("AQI_RETENTION_ACTION", "detach")  # detach | drop
+
+
+def connect_pg():
+    """mcp_server ile aynı PG* environment değişkenleriyle bağlantı aç"""
+    return psycopg2.connect(
+        host=os.getenv("PGHOST", "localhost"),
+        database=os.getenv("PGDATABASE", "airqoon"),
+        user=os.getenv("PGUSER", os.getenv("USER", "bhan")),
+        password=os.getenv("PGPASSWORD"),
+        port=int(os.getenv("PGPORT", "5432"))
+    )
+
+
+def partition_name(month_start: date) -> str:
+    """Ay başlangıcından partition adını döndür (örn: air_quality_index_y2025m02)"""
+    return f"{TABLE_NAME}_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def month_floor(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def is_partitioned(cursor, table: str = TABLE_NAME) -> bool:
+    cursor.execute(
+        """
+        SELECT c.relkind = 'p'
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = %s
+        """,
+        (table,)
+    )
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions(cursor, table: str = TABLE_NAME) -> List[Dict]:
+    """Parent tabloya bağlı partition'ları sınırlarıyla birlikte listele"""
+    cursor.execute(
+        """
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = %s
+        ORDER BY child.relname
+        """,
+        (table,)
+    )
+    return [{"name": name, "bound": bound} for name, bound in cursor.fetchall()]
+
+
+def create_partitioned_parent(cursor, table: str, index_name: str):
+    """Partition'lı parent tabloyu, default partition'ı ve covering index'i oluştur"""
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id BIGINT NOT NULL DEFAULT nextval('{TABLE_NAME}_id_seq'),
+            device_id VARCHAR(255) NOT NULL,
+            parameter VARCHAR(50) NOT NULL,
+            concentration DECIMAL(10, 2),
+            concentration_unit VARCHAR(20),
+            calculated_datetime TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (id, calculated_datetime)
+        ) PARTITION BY RANGE (calculated_datetime);
+        """
+    )
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;")
+    # Analiz sorgusu (device_id, parameter, calculated_datetime) ile filtreler ve
+    # sadece concentration/concentration_unit okur -> index-only scan
+    cursor.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS {index_name}
+        ON {table} (device_id, parameter, calculated_datetime)
+        INCLUDE (concentration, concentration_unit);
+        """
+    )
+
+
+def ensure_month_partition(cursor, month_start: date, table: str = TABLE_NAME) -> bool:
+    """
+    Tek bir aylık partition oluştur (yoksa).
+    Default partition'da bu aya düşmüş satırlar varsa yeni partition'a taşınır,
+    aksi halde ATTACH default partition kontrolüne takılır.
+    """
+    name = partition_name(month_start).replace(TABLE_NAME, table, 1)
+    cursor.execute("SELECT to_regclass(%s)", (f"public.{name}",))
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    month_end = month_start + relativedelta(months=1)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {table}_default
+            WHERE calculated_datetime >= %s AND calculated_datetime < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved;
+        """,
+        (month_start, month_end)
+    )
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);",
+        (month_start.isoformat(), month_end.isoformat())
+    )
+    return True
+
+
+def ensure_future_partitions(conn, months_ahead: int = MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Bu ay ve sonraki `months_ahead` ay için partition'ları oluştur"""
+    current = month_floor(today or date.today())
+    created = []
+    with conn.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month_start = current + relativedelta(months=offset)
+            if ensure_month_partition(cursor, month_start):
+                created.append(partition_name(month_start))
+        conn.commit()
+    return created
+
+
+def split_default_partition(conn) -> List[str]:
+    """
+    Default partition'a düşmüş satırları aylık partition'lara ayır.
+    Partition'ı olmayan bir aya (örn. ilk kurulumda geçmiş veri) yazılan satırlar
+    default partition'da kalır; orada ne partition pruning ne de retention çalışır.
+    Migrate ile aynı create/move/attach mantığı kullanılır, her ay ayrı transaction.
+    """
+    created = []
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(calculated_datetime), MAX(calculated_datetime) FROM {DEFAULT_PARTITION}")
+        min_dt, max_dt = cursor.fetchone()
+        conn.commit()
+        if min_dt is None:
+            return created
+
+        month_start = month_floor(min_dt.date())
+        last_month = month_floor(max_dt.date())
+        while month_start <= last_month:
+            # Taşıma ile ATTACH arasında default'a bu aya satır yazılırsa ATTACH başarısız olur
+            cursor.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE;")
+            if ensure_month_partition(cursor, month_start):
+                created.append(partition_name(month_start))
+                print(f"  ↳ {month_start:%Y-%m}: default partition'dan ayrıldı")
+            conn.commit()
+            month_start += relativedelta(months=1)
+    return created
+
+
+def apply_retention(
+    conn,
+    retention_months: int = RETENTION_MONTHS,
+    action: str = RETENTION_ACTION,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    `retention_months` aydan eski partition'ları ayır (detach) veya sil (drop).
+    Detach edilen tablolar arşiv/dump için yerinde bırakılır; bu ayların aylık özetleri kaldırılır.
+    """
+    import aqi_digest
+
+    if retention_months <= 0:
+        return []
+    if action not in ("detach", "drop"):
+        raise ValueError(f"Geçersiz retention action: {action}")
+
+    cutoff = month_floor(today or date.today()) - relativedelta(months=retention_months)
+    affected = []
+    months = []
+    with conn.cursor() as cursor:
+        for part in list_partitions(cursor):
+            name = part["name"]
+            if name == DEFAULT_PARTITION:
+                continue
+            try:
+                month_start = datetime.strptime(name[len(TABLE_NAME) + 1:], "y%Ym%m").date()
+            except ValueError:
+                continue
+            if month_start + relativedelta(months=1) > cutoff:
+                continue
+
+            cursor.execute(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name};")
+            if action == "drop":
+                cursor.execute(f"DROP TABLE {name};")
+            affected.append(name)
+            months.append(month_start)
+        aqi_digest.forget_months(cursor, months)
+        conn.commit()
+    return affected
+
+
+def migrate_to_partitioned(conn, drop_legacy: bool = False, months_ahead: int = MONTHS_AHEAD) -> Dict:
+    """
+    Mevcut (partition'sız) air_quality_index tablosunu aylık partition'lı yapıya taşı.
+
+    Adımlar:
+      1. air_quality_index_new partition'lı parent + default partition + covering index
+      2. Verinin kapsadığı aylar + ileriye dönük aylar için partition'lar
+      3. Ay ay kopyalama (her ay ayrı transaction, tablo yazmaya açık kalır)
+      4. Kısa bir kilit altında delta kopyası (id > son kopyalanan id) ve isim değişimi
+      5. ANALYZE + VACUUM (visibility map -> index-only scan)
+    """
+    stats = {"months_copied": 0, "rows_copied": 0, "delta_rows": 0}
+    started = time.perf_counter()
+    new_table = f"{TABLE_NAME}_new"
+
+    with conn.cursor() as cursor:
+        if is_partitioned(cursor):
+            print(f"✓ {TABLE_NAME} zaten partition'lı, migration atlanıyor")
+            return stats
+
+        cursor.execute(f"SELECT MIN(calculated_datetime), MAX(calculated_datetime), MAX(id) FROM {TABLE_NAME}")
+        min_dt, max_dt, max_id = cursor.fetchone()
+        max_id = max_id or 0
+
+        create_partitioned_parent(cursor, new_table, index_name=f"{new_table}_covering")
+        conn.commit()
+
+        first_month = month_floor((min_dt or datetime.now()).date())
+        last_month = month_floor(date.today()) + relativedelta(months=months_ahead)
+        if max_dt and month_floor(max_dt.date()) > last_month:
+            last_month = month_floor(max_dt.date())
+
+        month_start = first_month
+        while month_start <= last_month:
+            ensure_month_partition(cursor, month_start, table=new_table)
+            month_end = month_start + relativedelta(months=1)
+            cursor.execute(
+                f"""
+                INSERT INTO {new_table}
+                    (id, device_id, parameter, concentration, concentration_unit, calculated_datetime, created_at)
+                SELECT id, device_id, parameter, concentration, concentration_unit, calculated_datetime, created_at
+                FROM {TABLE_NAME}
+                WHERE id <= %s AND calculated_datetime >= %s AND calculated_datetime < %s
+                """,
+                (max_id, month_start, month_end)
+            )
+            stats["rows_copied"] += cursor.rowcount
+            stats["months_copied"] += 1
+            conn.commit()
+            print(f"  ↳ {month_start:%Y-%m}: {cursor.rowcount} satır kopyalandı")
+            month_start = month_end
+
+        # Delta + swap: yazarlar bu kısa aralıkta bekler
+        cursor.execute(f"LOCK TABLE {TABLE_NAME} IN EXCLUSIVE MODE;")
+        cursor.execute(
+            f"""
+            INSERT INTO {new_table}
+                (id, device_id, parameter, concentration, concentration_unit, calculated_datetime, created_at)
+            SELECT id, device_id, parameter, concentration, concentration_unit, calculated_datetime, created_at
+            FROM {TABLE_NAME}
+            WHERE id > %s
+            """,
+            (max_id,)
+        )
+        stats["delta_rows"] = cursor.rowcount
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} RENAME TO {LEGACY_TABLE_NAME};")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {TABLE_NAME};")
+        cursor.execute(f"ALTER TABLE {new_table}_default RENAME TO {DEFAULT_PARTITION};")
+        cursor.execute(f"ALTER INDEX {new_table}_covering RENAME TO {COVERING_INDEX};")
+        for part in list_partitions(cursor):
+            if part["name"].startswith(new_table):
+                cursor.execute(
+                    f"ALTER TABLE {part['name']} RENAME TO {part['name'].replace(new_table, TABLE_NAME, 1)};"
+                )
+        # Sequence yeni tabloya ait olsun ki legacy drop edilince silinmesin
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE_NAME} ALTER COLUMN id DROP DEFAULT;")
+        cursor.execute(f"ALTER SEQUENCE {TABLE_NAME}_id_seq OWNED BY {TABLE_NAME}.id;")
+        if drop_legacy:
+            cursor.execute(f"DROP TABLE {LEGACY_TABLE_NAME};")
+        conn.commit()
+
+    # VACUUM transaction içinde çalışamaz
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"VACUUM (ANALYZE) {TABLE_NAME};")
+    finally:
+        conn.autocommit = previous_autocommit
+
+    stats["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def print_status(conn):
+    with conn.cursor() as cursor:
+        if not is_partitioned(cursor):
+            print(f"⚠ {TABLE_NAME} partition'lı değil. `migrate` komutunu çalıştırın.")
+            return
+        partitions = list_partitions(cursor)
+        print(f"📦 {TABLE_NAME}: {len(partitions)} partition")
+        for part in partitions:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", (part["name"],))
+            estimate = cursor.fetchone()[0]
+            print(f"  - {part['name']}: {part['bound']} (~{max(estimate, 0)} satır)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="air_quality_index partition yönetimi")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="Partition durumunu göster")
+
+    migrate_parser = sub.add_parser("migrate", help="Partition'sız tabloyu aylık partition'lara taşı")
+    migrate_parser.add_argument("--drop-legacy", action="store_true", help="Eski tabloyu migration sonunda sil")
+    migrate_parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+
+    maintain_parser = sub.add_parser("maintain", help="Default'u ayır, ileri partition'ları oluştur ve retention uygula")
+    maintain_parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    maintain_parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    maintain_parser.add_argument("--retention-action", choices=["detach", "drop"], default=RETENTION_ACTION)
+
+    args = parser.parse_args(argv)
+    conn = connect_pg()
+    try:
+        if args.command == "status":
+            print_status(conn)
+        elif args.command == "migrate":
+            print(f"🔄 {TABLE_NAME} partition migration başlıyor...")
+            stats = migrate_to_partitioned(conn, drop_legacy=args.drop_legacy, months_ahead=args.months_ahead)
+            print(f"✅ Migration tamamlandı: {stats}")
+        elif args.command == "maintain":
+            split = split_default_partition(conn)
+            print(f"✓ Default partition'dan ayrılan aylar: {split or 'yok'}")
+            created = ensure_future_partitions(conn, months_ahead=args.months_ahead)
+            print(f"✓ Yeni partition'lar: {created or 'yok'}")
+            affected = apply_retention(conn, args.retention_months, args.retention_action)
+            print(f"✓ Retention ({args.retention_action}): {affected or 'yok'}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Airqoon Dağılım Sketch'leri - Cihaz/Parametre/Gün Bazlı DDSketch
+Uzun aralıklarda medyan / P95 / histogram soruları ham satırları taramadan, günlük
+sketch'lerin birleştirilmesiyle (merge) cevaplanır. Her sketch serialize edilerek
+aqi_daily_sketch tablosunda BYTEA olarak tutulur.
+
+DDSketch: logaritmik bucket'lar; her quantile tahmini gerçek değere göre en fazla
+relative_accuracy (örn. %1) göreli hata içerir ve sketch'ler kayıpsız birleştirilebilir.
+
+aqi_ingest ile yüklenen günlerin sketch'leri "kirli" işaretlenir, sonraki çalıştırmada yeniden oluşturulur.
+
+Kullanım:
+    python3 aqi_sketch.py build [--days-back 1] [--start 2025-01-01 --end 2026-01-01]
+    python3 aqi_sketch.py bench --tenant akcansa --start 2025-01-01 --end 2026-01-01 [--parameter PM10-24h]
+    python3 aqi_sketch.py status
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aqi_partitioning import TABLE_NAME, connect_pg
+
+SKETCH_TABLE = "aqi_daily_sketch"
+DIRTY_TABLE = "aqi_sketch_dirty_days"
+
+RELATIVE_ACCURACY = float(os.getenv("AQI_SKETCH_RELATIVE_ACCURACY", "0.01"))  # %1 göreli hata
+# Varsayılan: bugün + dün (geç gelen veriler için)
+DAYS_BACK = int(os.getenv("AQI_SKETCH_DAYS_BACK", "1"))
+SKETCH_INTERVAL_SECONDS = float(os.getenv("AQI_SKETCH_INTERVAL_SECONDS", "0"))  # 0 = worker kapalı (örn. 3600)
+FETCH_SIZE = int(os.getenv("AQI_SKETCH_FETCH_SIZE", "20000"))
+
+# Aynı anda tek oluşturma (worker + CLI)
+ADVISORY_LOCK_KEY = 0x736B_7463  # "sktc"
+
+# Serialize formatı: versiyon, relative_accuracy, count, zero_count, min, max, sum, pozitif/negatif bucket sayıları
+_HEADER = struct.Struct("<BdQQdddII")
+_FORMAT_VERSION = 1
+# Bu değerin altı sıfır bucket'ına düşer
+_MIN_INDEXABLE = 1e-9
+
+
+class DDSketch:
+    """Birleştirilebilir, göreli hata garantili quantile sketch'i"""
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 0 ile 1 arasında olmalı")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+
+    def _key(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Bucket (gamma^(k-1), gamma^k] için göreli hatayı minimize eden temsilci değer
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        if value > _MIN_INDEXABLE:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + weight
+        elif value < -_MIN_INDEXABLE:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + weight
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "DDSketch"):
+        """other'ı bu sketch'e ekle; farklı hassasiyetteki bucket'lar temsilci değerleriyle yeniden eşlenir"""
+        if other.count == 0:
+            return
+        if other.gamma == self.gamma:
+            for key, weight in other.positive.items():
+                self.positive[key] = self.positive.get(key, 0) + weight
+            for key, weight in other.negative.items():
+                self.negative[key] = self.negative.get(key, 0) + weight
+        else:
+            for key, weight in other.positive.items():
+                target = self._key(other._value(key))
+                self.positive[target] = self.positive.get(target, 0) + weight
+            for key, weight in other.negative.items():
+                target = self._key(other._value(key))
+                self.negative[target] = self.negative.get(target, 0) + weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _buckets(self) -> Iterable[Tuple[float, int]]:
+        """(temsilci değer, adet) küçükten büyüğe"""
+        for key in sorted(self.negative, reverse=True):
+            yield -self._value(key), self.negative[key]
+        if self.zero_count:
+            yield 0.0, self.zero_count
+        for key in sorted(self.positive):
+            yield self._value(key), self.positive[key]
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Tek geçişte birden çok quantile (q: 0..1)"""
+        if self.count == 0:
+            return [None] * len(qs)
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        results: List[Optional[float]] = [None] * len(qs)
+        position = 0
+        cumulative = 0
+        buckets = list(self._buckets())
+        for index in order:
+            rank = min(max(qs[index], 0.0), 1.0) * (self.count - 1)
+            while position < len(buckets) - 1 and cumulative + buckets[position][1] <= rank:
+                cumulative += buckets[position][1]
+                position += 1
+            results[index] = min(max(buckets[position][0], self.min), self.max)
+        return results
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    def histogram(self, bins: int, lower: Optional[float] = None, upper: Optional[float] = None) -> List[Tuple[float, float, int]]:
+        """Eşit genişlikte [lower, upper] histogramı: [(alt, üst, adet), ...] (sınır dışı değerler hariç)"""
+        if self.count == 0 or bins <= 0:
+            return []
+        lower = self.min if lower is None else lower
+        upper = self.max if upper is None else upper
+        if upper <= lower:
+            inside = sum(weight for value, weight in self._buckets() if min(max(value, self.min), self.max) == lower)
+            return [(lower, upper, inside)]
+        width = (upper - lower) / bins
+        counts = [0] * bins
+        for value, weight in self._buckets():
+            value = min(max(value, self.min), self.max)
+            if value < lower or value > upper:
+                continue
+            counts[min(int((value - lower) / width), bins - 1)] += weight
+        return [(lower + i * width, lower + (i + 1) * width, counts[i]) for i in range(bins)]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        positive_keys = sorted(self.positive)
+        negative_keys = sorted(self.negative)
+        parts = [_HEADER.pack(
+            _FORMAT_VERSION, self.relative_accuracy, self.count, self.zero_count,
+            self.min, self.max, self.sum, len(positive_keys), len(negative_keys)
+        )]
+        for keys, store in ((positive_keys, self.positive), (negative_keys, self.negative)):
+            if keys:
+                parts.append(struct.pack(f"<{len(keys)}i", *keys))
+                parts.append(struct.pack(f"<{len(keys)}I", *(store[key] for key in keys)))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, payload) -> "DDSketch":
+        version, accuracy, count, zero_count, minimum, maximum, total, n_positive, n_negative = _HEADER.unpack_from(payload, 0)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Desteklenmeyen sketch versiyonu: {version}")
+        sketch = cls(accuracy)
+        sketch.count, sketch.zero_count = count, zero_count
+        sketch.min, sketch.max, sketch.sum = minimum, maximum, total
+        offset = _HEADER.size
+        for n, store in ((n_positive, sketch.positive), (n_negative, sketch.negative)):
+            if n:
+                keys = struct.unpack_from(f"<{n}i", payload, offset)
+                offset += 4 * n
+                weights = struct.unpack_from(f"<{n}I", payload, offset)
+                offset += 4 * n
+                store.update(zip(keys, weights))
+        return sketch
+
+
+def merge_blobs(blobs: Iterable) -> DDSketch:
+    """Serialize sketch'leri birleştir; hassasiyetler farklıysa en kaba olanı kullanılır"""
+    sketches = [DDSketch.from_bytes(blob) for blob in blobs]
+    merged = DDSketch(max((s.relative_accuracy for s in sketches), default=RELATIVE_ACCURACY))
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def ensure_schema(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+                device_id VARCHAR(255) NOT NULL,
+                parameter VARCHAR(50) NOT NULL,
+                day DATE NOT NULL,
+                relative_accuracy REAL NOT NULL,
+                value_count BIGINT NOT NULL,
+                concentration_unit VARCHAR(20),
+                sketch BYTEA NOT NULL,
+                computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (device_id, parameter, day)
+            );
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+                day DATE PRIMARY KEY,
+                marked_at TIMESTAMPTZ NOT NULL
+            );
+            """
+        )
+    conn.commit()
+
+
+def mark_dirty_days(cursor, touched: Dict):
+    """aqi_ingest rollup hook'u: yeni satır gelen günlerin sketch'lerini yeniden oluşturulacak olarak işaretle"""
+    days = sorted(touched.get("days") or [])
+    if not days:
+        return
+    cursor.executemany(
+        f"""
+        INSERT INTO {DIRTY_TABLE} (day, marked_at) VALUES (%s, clock_timestamp())
+        ON CONFLICT (day) DO UPDATE SET marked_at = EXCLUDED.marked_at
+        """,
+        [(day,) for day in days]
+    )
+
+
+def dirty_days(cursor) -> List[date]:
+    cursor.execute(f"SELECT day FROM {DIRTY_TABLE} ORDER BY day")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def build_day(conn, day: date, relative_accuracy: float = RELATIVE_ACCURACY) -> Dict:
+    """Bir günün tüm cihaz/parametre sketch'lerini tek taramada (tek partition) yeniden oluştur"""
+    from psycopg2.extras import execute_values
+
+    started = time.perf_counter()
+    sketches: Dict[Tuple[str, str], DDSketch] = {}
+    units: Dict[Tuple[str, str], str] = {}
+    readings = 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT clock_timestamp()")
+        build_started = cursor.fetchone()[0]
+
+    # Server-side cursor: gün boyunca satırlar bellekte tutulmaz, sadece sketch'ler
+    with conn.cursor(name=f"aqi_sketch_{day:%Y%m%d}") as reader:
+        reader.itersize = FETCH_SIZE
+        reader.execute(
+            f"""
+            SELECT device_id, parameter, concentration, concentration_unit
+            FROM {TABLE_NAME}
+            WHERE calculated_datetime >= %s
+                AND calculated_datetime < %s
+                AND concentration IS NOT NULL
+            """,
+            (day, day + timedelta(days=1))
+        )
+        for device_id, parameter, concentration, unit in reader:
+            key = (device_id, parameter)
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = DDSketch(relative_accuracy)
+            sketch.add(float(concentration))
+            if unit:
+                units[key] = unit
+            readings += 1
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SKETCH_TABLE} WHERE day = %s", (day,))
+        if sketches:
+            execute_values(
+                cursor,
+                f"""
+                INSERT INTO {SKETCH_TABLE}
+                    (device_id, parameter, day, relative_accuracy, value_count, concentration_unit, sketch)
+                VALUES %s
+                """,
+                [
+                    (device_id, parameter, day, relative_accuracy, sketch.count, units.get((device_id, parameter)),
+                     sketch.to_bytes())
+                    for (device_id, parameter), sketch in sketches.items()
+                ],
+                page_size=1000
+            )
+        # Oluşturma sırasında yeniden kirlenen gün işaretli kalır
+        cursor.execute(f"DELETE FROM {DIRTY_TABLE} WHERE day = %s AND marked_at <= %s", (day, build_started))
+    conn.commit()
+    return {
+        "day": day.isoformat(),
+        "sketches": len(sketches),
+        "readings": readings,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def run_sketches(
+    conn,
+    days_back: int = DAYS_BACK,
+    days: Optional[List[date]] = None,
+    relative_accuracy: float = RELATIVE_ACCURACY
+) -> Dict:
+    """Bugün + days_back önceki gün + kirli günler (veya verilen günler) için sketch'leri oluştur"""
+    ensure_schema(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return {"skipped": True}
+        conn.commit()
+    try:
+        if days is None:
+            today = date.today()
+            targets = {today - timedelta(days=offset) for offset in range(days_back + 1)}
+            with conn.cursor() as cursor:
+                targets.update(dirty_days(cursor))
+            conn.rollback()
+            days = sorted(targets)
+        return {"days": [build_day(conn, day, relative_accuracy) for day in days]}
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        conn.commit()
+
+
+class SketchWorker:
+    """Son günlerin ve kirli günlerin sketch'lerini periyodik oluşturan arka plan thread'i"""
+
+    def __init__(self, interval_seconds: float = SKETCH_INTERVAL_SECONDS, connect: Callable = connect_pg):
+        self.interval = interval_seconds
+        self.connect = connect
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="aqi-sketch", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            conn = None
+            try:
+                conn = self.connect()
+                report = run_sketches(conn)
+                if not report.get("skipped"):
+                    built = sum(item["sketches"] for item in report["days"])
+                    print(f"📈 Sketch'ler güncellendi: {len(report['days'])} gün, {built} sketch")
+            except Exception as e:
+                print(f"⚠️ Sketch oluşturma başarısız: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def benchmark(conn, tenant_slug: str, start: str, end: str, parameter: str, percentiles: Sequence[float]) -> Dict:
+    """Aynı tenant/aralık/parametre için exact SQL (percentile_disc) ile sketch merge sonucunu karşılaştır"""
+    qs = [p / 100 for p in percentiles]
+    with conn.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(
+            f"""
+            SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY a.concentration), COUNT(*)
+            FROM tenant_devices td
+            JOIN {TABLE_NAME} a ON a.device_id = td.device_id
+            WHERE td.tenant_slug = %s
+                AND a.calculated_datetime >= %s
+                AND a.calculated_datetime < %s
+                AND a.parameter = %s
+                AND a.concentration IS NOT NULL
+            """,
+            (qs, tenant_slug, start, end, parameter)
+        )
+        exact_values, exact_count = cursor.fetchone()
+        exact_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        cursor.execute(
+            f"""
+            SELECT s.sketch
+            FROM tenant_devices td
+            JOIN {SKETCH_TABLE} s ON s.device_id = td.device_id
+            WHERE td.tenant_slug = %s
+                AND s.day >= %s
+                AND s.day < %s
+                AND s.parameter = %s
+            """,
+            (tenant_slug, start, end, parameter)
+        )
+        blobs = [row[0] for row in cursor.fetchall()]
+        fetch_ms = (time.perf_counter() - started) * 1000
+        merged = merge_blobs(blobs)
+        approx_values = merged.quantiles(qs)
+        sketch_ms = (time.perf_counter() - started) * 1000
+    conn.rollback()
+
+    rows = []
+    for pct, exact, approx in zip(percentiles, exact_values or [None] * len(qs), approx_values):
+        exact = float(exact) if exact is not None else None
+        error = abs(approx - exact) / abs(exact) if exact and approx is not None else None
+        rows.append({"percentile": pct, "exact": exact, "approx": approx, "relative_error": error})
+    return {
+        "exact_count": exact_count,
+        "sketch_count": merged.count,
+        "sketches": len(blobs),
+        "relative_accuracy": merged.relative_accuracy,
+        "exact_ms": round(exact_ms, 1),
+        "sketch_ms": round(sketch_ms, 1),
+        "sketch_fetch_ms": round(fetch_ms, 1),
+        "percentiles": rows,
+    }
+
+
+def print_status(conn):
+    ensure_schema(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), MIN(day), MAX(day), COALESCE(SUM(value_count), 0),
+                   COALESCE(SUM(octet_length(sketch)), 0), array_agg(DISTINCT relative_accuracy)
+            FROM {SKETCH_TABLE}
+            """
+        )
+        total, first_day, last_day, readings, size, accuracies = cursor.fetchone()
+        pending = dirty_days(cursor)
+    conn.rollback()
+    print(f"📈 {SKETCH_TABLE}: {total} sketch, {readings} ölçüm, {size / 1024 / 1024:.1f} MB")
+    if total:
+        print(f"  - Aralık: {first_day} - {last_day}, göreli hata: {', '.join(f'{a:.3g}' for a in accuracies if a)}")
+    print(f"  - Yeniden oluşturulacak günler: {', '.join(d.isoformat() for d in pending) or 'yok'}")
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cihaz/parametre/gün bazlı DDSketch'ler")
+    parser.add_argument("--relative-accuracy", type=float, default=RELATIVE_ACCURACY, help="Göreli hata sınırı (örn. 0.01)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="Sketch'leri oluştur")
+    build_parser.add_argument("--days-back", type=int, default=DAYS_BACK, help="Bugünden geriye kaç gün")
+    build_parser.add_argument("--start", help="Backfill başlangıcı (YYYY-MM-DD)")
+    build_parser.add_argument("--end", help="Backfill bitişi (YYYY-MM-DD, hariç)")
+
+    bench_parser = sub.add_parser("bench", help="Exact SQL ile karşılaştır")
+    bench_parser.add_argument("--tenant", required=True)
+    bench_parser.add_argument("--start", required=True)
+    bench_parser.add_argument("--end", required=True)
+    bench_parser.add_argument("--parameter", default="PM10-24h")
+    bench_parser.add_argument("--percentiles", default="50,90,95,99", help="Virgülle ayrılmış yüzdelikler")
+
+    sub.add_parser("status", help="Sketch tablosu özeti")
+
+    args = parser.parse_args(argv)
+    conn = connect_pg()
+    try:
+        if args.command == "status":
+            print_status(conn)
+            return 0
+
+        if args.command == "bench":
+            percentiles = [float(p) for p in args.percentiles.split(",") if p.strip()]
+            report = benchmark(conn, args.tenant, args.start, args.end, args.parameter, percentiles)
+            speedup = report["exact_ms"] / report["sketch_ms"] if report["sketch_ms"] else None
+            print(f"📊 {args.tenant} {args.parameter} {args.start} - {args.end}")
+            print(f"  - Exact SQL: {report['exact_ms']} ms ({report['exact_count']} satır)")
+            print(f"  - Sketch merge: {report['sketch_ms']} ms ({report['sketches']} sketch, {report['sketch_count']} ölçüm)"
+                  + (f" — {speedup:.1f}x" if speedup else ""))
+            bound = report["relative_accuracy"]
+            violations = 0
+            for row in report["percentiles"]:
+                error = row["relative_error"]
+                flag = ""
+                if error is not None and error > bound + 1e-9:
+                    flag = " ⚠"
+                    violations += 1
+                exact = f"{row['exact']:.2f}" if row["exact"] is not None else "-"
+                approx = f"{row['approx']:.2f}" if row["approx"] is not None else "-"
+                error_text = f"{error * 100:.2f}%" if error is not None else "-"
+                print(f"  P{row['percentile']:g}: exact {exact}, sketch {approx}, hata {error_text} (sınır {bound * 100:.2f}%){flag}")
+            if report["exact_count"] != report["sketch_count"]:
+                print("⚠ Ölçüm sayıları farklı: sketch'ler güncel değil (python3 aqi_sketch.py build)")
+                return 1
+            return 1 if violations else 0
+
+        days = None
+        if args.start or args.end:
+            if not (args.start and args.end):
+                parser.error("--start ve --end birlikte verilmeli")
+            first, last = _parse_day(args.start), _parse_day(args.end)
+            days = [first + timedelta(days=i) for i in range((last - first).days)]
+        report = run_sketches(conn, args.days_back, days, args.relative_accuracy)
+        if report.get("skipped"):
+            print("⚠ Başka bir sketch oluşturma çalışıyor, atlandı")
+            return 0
+        for item in report["days"]:
+            print(f"✓ {item['day']}: {item['sketches']} sketch, {item['readings']} ölçüm ({item['elapsed_ms']} ms)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
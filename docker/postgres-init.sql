@@ -11,19 +11,107 @@ WHERE NOT EXISTS (SELECT 1 FROM pg_database WHERE datname = 'airqoon_chat')
 \connect airqoon
 
 CREATE TABLE IF NOT EXISTS public.air_quality_index (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     device_id VARCHAR(255) NOT NULL,
     parameter VARCHAR(50) NOT NULL,
     concentration DECIMAL(10, 2),
     concentration_unit VARCHAR(20),
     calculated_datetime TIMESTAMP NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (id, calculated_datetime)
+) PARTITION BY RANGE (calculated_datetime);
+
+CREATE TABLE IF NOT EXISTS public.air_quality_index_default PARTITION OF public.air_quality_index DEFAULT;
+
+-- Covering index: analiz sorgusu (device_id, parameter, calculated_datetime) filtreler,
+-- concentration/concentration_unit okur -> partition pruning + index-only scan
+CREATE INDEX IF NOT EXISTS idx_aqi_device_param_time_covering
+    ON public.air_quality_index (device_id, parameter, calculated_datetime)
+    INCLUDE (concentration, concentration_unit);
+
+-- Bu ay + 3 ay ileri için aylık partition'lar (sonrası: python3 aqi_partitioning.py maintain)
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR i IN 0..3 LOOP
+        month_start := (date_trunc('month', NOW()) + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.air_quality_index FOR VALUES FROM (%L) TO (%L)',
+            'air_quality_index_' || to_char(month_start, '"y"YYYY"m"MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END $$;
+
+-- Tenant -> cihaz eşlemesi (Mongo Devices'tan senkronlanır: python3 tenant_device_sync.py sync)
+-- Analiz sorguları cihaz listesini parametre olarak göndermek yerine tenant_slug ile join yapar
+CREATE TABLE IF NOT EXISTS public.tenant_devices (
+    tenant_slug VARCHAR(255) NOT NULL,
+    device_id VARCHAR(255) NOT NULL,
+    mongo_id CHAR(24),
+    synced_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_slug, device_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tenant_devices_device ON public.tenant_devices (device_id);
+
+CREATE TABLE IF NOT EXISTS public.tenant_devices_sync_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark CHAR(24),
+    last_sync_at TIMESTAMPTZ,
+    last_full_sync_at TIMESTAMPTZ,
+    row_count BIGINT
+);
+
+-- Tenant bazlı aylık aggregate + önceki aya göre değişim (python3 aqi_digest.py run)
+CREATE TABLE IF NOT EXISTS public.tenant_monthly_digest (
+    tenant_slug VARCHAR(255) NOT NULL,
+    month DATE NOT NULL,
+    parameter VARCHAR(50) NOT NULL,
+    avg_concentration DECIMAL(12, 4),
+    min_concentration DECIMAL(10, 2),
+    max_concentration DECIMAL(10, 2),
+    measurement_count BIGINT NOT NULL,
+    concentration_unit VARCHAR(20),
+    prev_avg_concentration DECIMAL(12, 4),
+    delta DECIMAL(12, 4),
+    delta_pct DECIMAL(10, 2),
+    dramatic BOOLEAN NOT NULL DEFAULT FALSE,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_slug, month, parameter)
+);
+
+CREATE TABLE IF NOT EXISTS public.aqi_digest_runs (
+    month DATE PRIMARY KEY,
+    completed_at TIMESTAMPTZ NOT NULL,
+    row_count BIGINT NOT NULL,
+    elapsed_ms DOUBLE PRECISION
 );
 
-CREATE INDEX IF NOT EXISTS idx_device_id ON public.air_quality_index (device_id);
-CREATE INDEX IF NOT EXISTS idx_parameter ON public.air_quality_index (parameter);
-CREATE INDEX IF NOT EXISTS idx_calculated_datetime ON public.air_quality_index (calculated_datetime);
-CREATE INDEX IF NOT EXISTS idx_device_datetime ON public.air_quality_index (device_id, calculated_datetime);
+CREATE TABLE IF NOT EXISTS public.aqi_digest_dirty_months (
+    month DATE PRIMARY KEY,
+    marked_at TIMESTAMPTZ NOT NULL
+);
+
+-- Cihaz/parametre/gün bazlı DDSketch'ler (python3 aqi_sketch.py build)
+CREATE TABLE IF NOT EXISTS public.aqi_daily_sketch (
+    device_id VARCHAR(255) NOT NULL,
+    parameter VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    relative_accuracy REAL NOT NULL,
+    value_count BIGINT NOT NULL,
+    concentration_unit VARCHAR(20),
+    sketch BYTEA NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, parameter, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.aqi_sketch_dirty_days (
+    day DATE PRIMARY KEY,
+    marked_at TIMESTAMPTZ NOT NULL
+);
 
 INSERT INTO public.air_quality_index (device_id, parameter, concentration, concentration_unit, calculated_datetime)
 SELECT 'demo-device-1', 'PM2.5-24h', 12.34, 'µg/m³', NOW() - INTERVAL '1 hour'
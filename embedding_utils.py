@@ -4,39 +4,316 @@ Embedding Utilities - Text to Vector Conversion
 Sentence-transformers kullanarak Türkçe metinler için embedding oluşturur
 """
 
+import ctypes
+import gc
 import os
-from typing import List, Optional
+import re
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 import hashlib
 import threading
 
+import mcp_metrics as metrics
+
 try:
     from sentence_transformers import SentenceTransformer
 except ImportError:
     SentenceTransformer = None
 
-# Global model instance (lazy loading)
-_embedding_model = None
-_embedding_model_name = "paraphrase-multilingual-MiniLM-L12-v2"  # Türkçe destekleyen model
-_embedding_model_lock = threading.Lock()
+# Model değişikliği mevcut collection'ların yeniden embed edilmesini gerektirir (bkz. vector_reembed.py)
+DEFAULT_EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"  # Türkçe destekleyen model
+_embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME", DEFAULT_EMBEDDING_MODEL_NAME)
 
+# Yüklü modellerin toplam bellek bütçesi (MB, 0 = sınırsız); aşılırsa boştaki en eski model kaldırılır
+EMBEDDING_MODEL_MEMORY_BUDGET_MB = float(os.getenv("EMBEDDING_MODEL_MEMORY_BUDGET_MB", "0"))
+# Bu kadar saniye kullanılmayan model bellekten kaldırılır, ilk istekte tekrar yüklenir (0 = hiç)
+EMBEDDING_MODEL_IDLE_SECONDS = float(os.getenv("EMBEDDING_MODEL_IDLE_SECONDS", "0"))
+# Modellerin yerel (safetensors) kopyası: yeniden yükleme hub'a gitmeden, ağırlıklar mmap ile okunur ("" = kapalı)
+EMBEDDING_MODEL_CACHE_DIR = os.getenv("EMBEDDING_MODEL_CACHE_DIR", "model_cache")
+EMBEDDING_MODEL_DEVICE = os.getenv("EMBEDDING_MODEL_DEVICE") or None
 
-def get_embedding_model():
-    """Embedding model'ini yükle (singleton)"""
-    global _embedding_model
-    
-    if SentenceTransformer is None:
-        raise ImportError(
-            "sentence-transformers yüklü değil. Yüklemek için: pip install sentence-transformers"
-        )
-    
-    if _embedding_model is None:
-        with _embedding_model_lock:
-            if _embedding_model is None:
-                print(f"🔄 Embedding model yükleniyor: {_embedding_model_name}")
-                _embedding_model = SentenceTransformer(_embedding_model_name)
-                print(f"✓ Model yüklendi (embedding size: {_embedding_model.get_sentence_embedding_dimension()})")
-    
-    return _embedding_model
+# Chunk boyutları (MiniLM ~128 token'dan sonrasını keser; ~600 karakter güvenli sınır)
+CHUNK_MAX_CHARS = int(os.getenv("EMBEDDING_CHUNK_MAX_CHARS", "600"))
+CHUNK_MIN_CHARS = int(os.getenv("EMBEDDING_CHUNK_MIN_CHARS", "80"))
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+
+MODEL_RESIDENT = metrics.registry.gauge("mcp_embedding_model_resident", "Model bellekte mi (1/0)")
+MODEL_LOADS = metrics.registry.counter(
+    "mcp_embedding_model_loads_total", "Embedding model yüklemeleri (source=local|remote|path)"
+)
+MODEL_UNLOADS = metrics.registry.counter(
+    "mcp_embedding_model_unloads_total", "Bellekten kaldırılan modeller (reason=idle|budget|manual)"
+)
+MODEL_LOAD_SECONDS = metrics.registry.histogram(
+    "mcp_embedding_model_load_seconds", "Embedding model yükleme süresi",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+
+
+def _model_bytes(model) -> int:
+    """Parametre + buffer belleği (RSS'in modelden gelen ana kısmı)"""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return int(sum(t.numel() * t.element_size() for t in tensors))
+    except Exception:
+        return 0
+
+
+def _release_memory():
+    """Kaldırılan modelin belleğini işletim sistemine geri ver"""
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+    if sys.platform.startswith("linux"):
+        try:
+            # glibc serbest bırakılan arena'ları kendiliğinden geri vermez
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except Exception:
+            pass
+
+
+class _ResidentModel:
+    def __init__(self, model, load_seconds: float, source: str):
+        self.model = model
+        self.bytes = _model_bytes(model)
+        self.load_seconds = load_seconds
+        self.source = source
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+
+class ModelManager:
+    """
+    Embedding modellerinin yaşam döngüsü: ilk kullanımda yükle, kullanımda olanları (encode sürerken)
+    koru, bütçe aşılınca veya idle süresi dolunca boştakileri kaldır. Yeniden yükleme yerel
+    safetensors kopyasından yapılır (hub çözümlemesi / indirme yok).
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = int(EMBEDDING_MODEL_MEMORY_BUDGET_MB * 1024 * 1024),
+        idle_seconds: float = EMBEDDING_MODEL_IDLE_SECONDS,
+        cache_dir: str = EMBEDDING_MODEL_CACHE_DIR
+    ):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.cache_dir = cache_dir
+        self._resident: Dict[str, _ResidentModel] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._history: Dict[str, Dict] = {}
+        self._dimensions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    # --- Yükleme ---
+
+    def _local_path(self, model_name: str) -> str:
+        return os.path.join(self.cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+    def _load(self, model_name: str):
+        """Sırasıyla: verilen yerel dizin, yerel kopya, hub (ve yerel kopyayı kaydet)"""
+        if SentenceTransformer is None:
+            raise ImportError(
+                "sentence-transformers yüklü değil. Yüklemek için: pip install sentence-transformers"
+            )
+        if os.path.isdir(model_name):
+            return SentenceTransformer(model_name, device=EMBEDDING_MODEL_DEVICE), "path"
+        local = self._local_path(model_name) if self.cache_dir else None
+        if local and os.path.isfile(os.path.join(local, "modules.json")):
+            try:
+                return SentenceTransformer(local, device=EMBEDDING_MODEL_DEVICE), "local"
+            except Exception as e:
+                print(f"⚠️ Yerel model kopyası okunamadı, hub'dan yükleniyor ({local}): {e}")
+        model = SentenceTransformer(model_name, device=EMBEDDING_MODEL_DEVICE)
+        if local:
+            tmp = f"{local}.tmp-{os.getpid()}"
+            try:
+                model.save(tmp)
+                os.replace(tmp, local)
+            except Exception as e:
+                print(f"⚠️ Model yerel olarak kaydedilemedi ({local}): {e}")
+        return model, "remote"
+
+    def _acquire(self, model_name: str) -> _ResidentModel:
+        with self._lock:
+            entry = self._resident.get(model_name)
+            if entry is not None:
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                return entry
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._resident.get(model_name)
+                if entry is not None:
+                    entry.in_use += 1
+                    entry.last_used = time.monotonic()
+                    return entry
+            # Daha önce yüklendiyse boyutu bilinir: yer açmak için önceden boştakileri kaldır
+            self._make_room(self._history.get(model_name, {}).get("bytes", 0))
+
+            print(f"🔄 Embedding model yükleniyor: {model_name}")
+            started = time.perf_counter()
+            model, source = self._load(model_name)
+            entry = _ResidentModel(model, time.perf_counter() - started, source)
+            entry.in_use = 1
+            with self._lock:
+                self._resident[model_name] = entry
+                self._dimensions[model_name] = model.get_sentence_embedding_dimension()
+                history = self._history.setdefault(model_name, {"loads": 0})
+                history.update(
+                    loads=history["loads"] + 1, bytes=entry.bytes, last_load_seconds=round(entry.load_seconds, 3),
+                    last_load_source=source, last_loaded_at=entry.loaded_at
+                )
+            print(
+                f"✓ Model yüklendi (embedding size: {self._dimensions[model_name]}, "
+                f"{entry.bytes / 1024 / 1024:.0f} MB, {entry.load_seconds:.2f}s, {source})"
+            )
+            MODEL_RESIDENT.set(1, model=model_name)
+            MODEL_LOADS.inc(model=model_name, source=source)
+            MODEL_LOAD_SECONDS.observe(entry.load_seconds, model=model_name, source=source)
+
+        self._make_room(0)
+        self._ensure_reaper()
+        return entry
+
+    def _release(self, entry: _ResidentModel):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, model_name: Optional[str] = None):
+        """Model'i kullanım süresince (encode) bellekte tut"""
+        entry = self._acquire(model_name or _embedding_model_name)
+        try:
+            yield entry.model
+        finally:
+            self._release(entry)
+
+    def dimension(self, model_name: Optional[str] = None) -> int:
+        """Embedding boyutu (model kaldırılmış olsa bile tekrar yüklemeden)"""
+        model_name = model_name or _embedding_model_name
+        with self._lock:
+            if model_name in self._dimensions:
+                return self._dimensions[model_name]
+        with self.use(model_name) as model:
+            return model.get_sentence_embedding_dimension()
+
+    # --- Kaldırma ---
+
+    def unload(self, model_name: str, reason: str = "manual") -> bool:
+        """Boştaysa modeli bellekten kaldır (encode sürüyorsa dokunulmaz)"""
+        with self._lock:
+            entry = self._resident.get(model_name)
+            if entry is None or entry.in_use > 0:
+                return False
+            del self._resident[model_name]
+        entry.model = None
+        _release_memory()
+        MODEL_RESIDENT.set(0, model=model_name)
+        MODEL_UNLOADS.inc(model=model_name, reason=reason)
+        print(f"📉 Embedding model bellekten kaldırıldı: {model_name} ({reason})")
+        return True
+
+    def _make_room(self, incoming_bytes: int):
+        if self.budget_bytes <= 0:
+            return
+        while True:
+            with self._lock:
+                if self.resident_bytes(locked=True) + incoming_bytes <= self.budget_bytes:
+                    return
+                idle = [(name, e) for name, e in self._resident.items() if e.in_use == 0]
+                if not idle:
+                    if incoming_bytes == 0 and len(self._resident) == 1:
+                        print("⚠️ Tek model bile embedding bellek bütçesini aşıyor")
+                    return
+                name = min(idle, key=lambda pair: pair[1].last_used)[0]
+            self.unload(name, "budget")
+
+    def _ensure_reaper(self):
+        if self.idle_seconds <= 0 or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="embedding-model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.idle_seconds / 4, 30.0))
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    name for name, entry in self._resident.items()
+                    if entry.in_use == 0 and now - entry.last_used >= self.idle_seconds
+                ]
+            for name in expired:
+                self.unload(name, "idle")
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Durum ---
+
+    def resident_bytes(self, locked: bool = False) -> int:
+        if locked:
+            return sum(entry.bytes for entry in self._resident.values())
+        with self._lock:
+            return sum(entry.bytes for entry in self._resident.values())
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for name, history in self._history.items():
+                entry = self._resident.get(name)
+                models[name] = {
+                    **history,
+                    "resident": entry is not None,
+                    "in_use": entry.in_use if entry else 0,
+                    "idle_seconds": round(now - entry.last_used, 1) if entry else None,
+                }
+            return {
+                "default_model": _embedding_model_name,
+                "budget_bytes": self.budget_bytes,
+                "idle_unload_seconds": self.idle_seconds,
+                "cache_dir": self.cache_dir,
+                "resident_bytes": sum(entry.bytes for entry in self._resident.values()),
+                "models": models,
+            }
+
+
+model_manager = ModelManager()
+metrics.registry.gauge(
+    "mcp_embedding_model_resident_bytes", "Bellekteki embedding modellerinin toplam boyutu",
+    callback=model_manager.resident_bytes
+)
+
+
+def get_embedding_model_name() -> str:
+    """Etkin embedding model adı (EMBEDDING_MODEL_NAME)"""
+    return _embedding_model_name
+
+
+def get_embedding_model(model_name: Optional[str] = None):
+    """
+    Embedding model'ini döndür (gerekirse yükler; model_name verilirse o model).
+    Uzun süre tutulacaksa model_manager.use() tercih edilmeli: idle/bütçe kaldırması kullanımdaki modele dokunmaz.
+    """
+    with model_manager.use(model_name) as model:
+        return model
 
 
 def generate_embedding(text: str) -> List[float]:
@@ -49,37 +326,142 @@ def generate_embedding(text: str) -> List[float]:
     Returns:
         Embedding vector (List[float])
     """
-    model = get_embedding_model()
-    embedding = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+    with model_manager.use() as model:
+        embedding = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
     return embedding.tolist()
 
 
-def generate_embeddings(texts: List[str], batch_size: int = 32) -> List[List[float]]:
+def generate_embeddings(texts: List[str], batch_size: int = 32, model_name: Optional[str] = None) -> List[List[float]]:
     """
     Birden fazla metni batch olarak embedding vector'üne dönüştür
     
     Args:
         texts: Embedding oluşturulacak metin listesi
         batch_size: Batch size for processing
+        model_name: Varsayılan dışında bir model (opsiyonel, örn. re-embed migration)
         
     Returns:
         Embedding vector listesi
     """
-    model = get_embedding_model()
-    embeddings = model.encode(
-        texts, 
-        convert_to_numpy=True, 
-        normalize_embeddings=True,
-        batch_size=batch_size,
-        show_progress_bar=len(texts) > 10
-    )
+    with model_manager.use(model_name) as model:
+        embeddings = model.encode(
+            texts, 
+            convert_to_numpy=True, 
+            normalize_embeddings=True,
+            batch_size=batch_size,
+            show_progress_bar=len(texts) > 10
+        )
     return embeddings.tolist()
 
 
-def get_embedding_dimension() -> int:
+def get_embedding_dimension(model_name: Optional[str] = None) -> int:
     """Embedding dimension'ını döndür"""
-    model = get_embedding_model()
-    return model.get_sentence_embedding_dimension()
+    return model_manager.dimension(model_name)
+
+
+def _is_heading_only(text: str) -> bool:
+    """Metin sadece başlık satırlarından mı oluşuyor (aranabilir içerik yok)"""
+    lines = [line for line in text.split("\n") if line.strip()]
+    return bool(lines) and all(_HEADING_RE.match(line) for line in lines)
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Uzun bölümü satır sınırlarından (satır da uzunsa kelimelerden) max_chars parçalara böl"""
+    parts: List[str] = []
+    current = ""
+    for line in text.split("\n"):
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        # Başlık tek başına (veya önceki parçanın sonunda) kalmaz, sonraki satırın ilk parçasıyla birlikte gider
+        if current and not _is_heading_only(current):
+            lines = current.split("\n")
+            tail = len(lines)
+            while tail > 0 and (not lines[tail - 1].strip() or _HEADING_RE.match(lines[tail - 1])):
+                tail -= 1
+            parts.append("\n".join(lines[:tail]))
+            current = "\n".join(lines[tail:]).strip()
+        while True:
+            prefix = f"{current}\n" if current else ""
+            budget = max_chars - len(prefix)
+            if len(line) <= budget:
+                current = prefix + line
+                break
+            if budget <= 0:
+                # Başlık tek başına sınırı aşıyor
+                parts.append(current)
+                current = ""
+                continue
+            cut = line.rfind(" ", 0, budget)
+            cut = cut if cut > 0 else budget
+            parts.append(prefix + line[:cut])
+            current = ""
+            line = line[cut:].lstrip()
+    if current.strip():
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def chunk_markdown_sections(
+    text: str,
+    max_chars: int = CHUNK_MAX_CHARS,
+    min_chars: int = CHUNK_MIN_CHARS
+) -> List[Dict]:
+    """
+    Markdown analiz metnini bölümlere (## / ### başlıkları, örn. parametre ve karşılaştırma blokları) ayır
+    
+    Args:
+        text: Markdown metin
+        max_chars: Chunk üst sınırı (aşan bölümler satır bazlı bölünür)
+        min_chars: Bu sınırın altındaki (veya sadece başlıktan oluşan) bölümler sonraki bölümle birleştirilir
+        
+    Returns:
+        [{"section": "Ana Zaman Aralığı Sonuçları > PM10-24h", "text": "..."}] (ilk chunk başlık/özet kısmıdır;
+        boş metin için boş liste)
+    """
+    sections: List[Dict] = []
+    parents: Dict[int, str] = {}
+    current_lines: List[str] = []
+    current_section = ""
+
+    def _flush():
+        body = "\n".join(current_lines).strip()
+        if body:
+            sections.append({"section": current_section, "text": body})
+
+    for line in text.split("\n"):
+        match = _HEADING_RE.match(line)
+        if match and len(match.group(1)) >= 2:
+            _flush()
+            current_lines = []
+            level = len(match.group(1))
+            parents = {lvl: title for lvl, title in parents.items() if lvl < level}
+            parents[level] = match.group(2)
+            current_section = " > ".join(parents[lvl] for lvl in sorted(parents))
+        elif match and not current_section:
+            current_section = match.group(2)
+        current_lines.append(line)
+    _flush()
+
+    # Küçük bölümleri (örn. sadece başlık satırı) sonraki bölümle birleştir; etiket sonraki bölümün (gövdenin)
+    # başlığıdır. Başlık-only chunk'lar tek başına aramada eşleşip bağlamsız sonuç döndürürdü.
+    merged: List[Dict] = []
+    for section in sections:
+        previous = merged[-1] if merged else None
+        if previous is not None and (len(previous["text"]) < min_chars or _is_heading_only(previous["text"])):
+            merged[-1] = {"section": section["section"], "text": f"{previous['text']}\n\n{section['text']}"}
+        else:
+            merged.append(section)
+    # Sonda kalan başlık-only bölümün birleşecek sonraki bölümü yok; içerik yoksa atılır
+    if len(merged) > 1 and _is_heading_only(merged[-1]["text"]):
+        merged.pop()
+
+    chunks: List[Dict] = []
+    for section in merged:
+        for part in _split_long(section["text"], max_chars):
+            chunks.append({"section": section["section"], "text": part})
+    return chunks
 
 
 def generate_vector_id(text: str, prefix: str = "") -> str:
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Admission - Eşzamanlılık Sınırı ve Tenant Bazlı Adil Kuyruk
+- Global eşzamanlı çağrı sınırı + maliyet sınıfı bazlı slotlar (SQL-ağır / embedding-ağır / hafif)
+- Slot yoksa istek tenant_slug bazlı kuyruğa girer; sıradaki istek weighted fair queuing
+  (start-time virtual clock) ile seçilir -> bir tenant'ın burst'ü diğerlerini aç bırakmaz
+- Kuyruk doluysa veya bekleme süresi aşılırsa AdmissionRejected (HTTP 429 + Retry-After)
+- İsteğin deadline'ı kuyrukta dolarsa (veya zaten dolmuşsa) DeadlineExceeded (HTTP 504)
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+import mcp_deadline as deadline
+import mcp_metrics as metrics
+
+ADMISSION_ENABLED = os.getenv("MCP_ADMISSION", "1") == "1"
+MAX_CONCURRENT = int(os.getenv("MCP_ADMISSION_MAX_CONCURRENT", "16"))
+MAX_QUEUE = int(os.getenv("MCP_ADMISSION_MAX_QUEUE", "128"))
+MAX_TENANT_QUEUE = int(os.getenv("MCP_ADMISSION_TENANT_QUEUE", "32"))
+MAX_WAIT_SECONDS = float(os.getenv("MCP_ADMISSION_MAX_WAIT_SECONDS", "10"))
+
+# Maliyet sınıfları: (eşzamanlı slot sayısı, fair queuing maliyeti). slot 0 = sadece global sınır
+COST_CLASSES = {
+    "sql": (int(os.getenv("MCP_ADMISSION_SQL_SLOTS", "6")), 4.0),
+    "embedding": (int(os.getenv("MCP_ADMISSION_EMBEDDING_SLOTS", "4")), 2.0),
+    "light": (0, 1.0),
+}
+TOOL_COST_CLASS = {
+    "tenant_time_range_analysis": "sql",
+    "tenant_monthly_comparison": "sql",
+    "tenant_distribution_analysis": "sql",
+    "save_analysis_to_vector_db": "embedding",
+    "search_analysis_from_vector_db": "embedding",
+    "tenant_device_list": "light",
+    "tenant_statistics": "light",
+    "tenant_statistics_all": "light",
+}
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    """MCP_TENANT_WEIGHTS="akcansa=2,bursa-metropolitan-municipality=0.5" (varsayılan ağırlık 1)"""
+    weights = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        slug, value = item.split("=", 1)
+        try:
+            weights[slug.strip()] = max(float(value), 0.01)
+        except ValueError:
+            continue
+    return weights
+
+
+TENANT_WEIGHTS = _parse_weights(os.getenv("MCP_TENANT_WEIGHTS", ""))
+
+QUEUE_WAIT = metrics.registry.histogram("mcp_admission_wait_seconds", "Admission kuyruğunda bekleme süresi")
+REJECTED = metrics.registry.counter("mcp_admission_rejected_total", "Reddedilen (429) çağrılar")
+CLASS_IN_USE = metrics.registry.gauge("mcp_admission_in_use", "Maliyet sınıfı bazlı kullanılan slotlar")
+TENANT_QUEUE_DEPTH = metrics.registry.gauge("mcp_admission_tenant_queue_depth", "Tenant bazlı kuyruk derinliği")
+
+
+class AdmissionRejected(Exception):
+    """Kapasite dolu; istemci retry_after saniye sonra tekrar denemeli"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Sunucu yoğun ({reason}), {retry_after} sn sonra tekrar deneyin")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("tenant", "cost_class", "cost", "start_tag", "granted", "event")
+
+    def __init__(self, tenant: str, cost_class: str, cost: float, start_tag: float):
+        self.tenant = tenant
+        self.cost_class = cost_class
+        self.cost = cost
+        self.start_tag = start_tag
+        self.granted = False
+        self.event = threading.Event()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        max_queue: int = MAX_QUEUE,
+        max_tenant_queue: int = MAX_TENANT_QUEUE,
+        enabled: bool = ADMISSION_ENABLED
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_tenant_queue = max_tenant_queue
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._class_in_use: Dict[str, int] = {name: 0 for name in COST_CLASSES}
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._queued = 0
+        self._virtual_time = 0.0
+        self._tenant_finish: Dict[str, float] = {}
+        self._avg_service_seconds = 0.5
+
+    # --- durum ---
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._queued
+
+    def in_use(self) -> int:
+        with self._lock:
+            return self._in_use
+
+    def _has_capacity(self, cost_class: str) -> bool:
+        if self._in_use >= self.max_concurrent:
+            return False
+        class_slots = COST_CLASSES[cost_class][0]
+        return class_slots <= 0 or self._class_in_use[cost_class] < class_slots
+
+    def _take(self, cost_class: str):
+        self._in_use += 1
+        self._class_in_use[cost_class] += 1
+        CLASS_IN_USE.set(self._class_in_use[cost_class], cost_class=cost_class)
+
+    def _retry_after(self) -> int:
+        # Kuyruktakilerin boşalması için kaba tahmin
+        estimate = (self._queued + 1) * self._avg_service_seconds / max(self.max_concurrent, 1)
+        return max(int(math.ceil(estimate)), 1)
+
+    def _dispatch_locked(self):
+        """Boş slot varken kuyruk başlarından en küçük virtual start tag'e sahip olanı ver"""
+        while self._queued:
+            best = None
+            for queue in self._queues.values():
+                head = queue[0]
+                if self._has_capacity(head.cost_class) and (best is None or head.start_tag < best.start_tag):
+                    best = head
+            if best is None:
+                return
+            self._remove_locked(best)
+            self._virtual_time = max(self._virtual_time, best.start_tag)
+            self._take(best.cost_class)
+            best.granted = True
+            best.event.set()
+
+    def _remove_locked(self, waiter: _Waiter):
+        queue = self._queues[waiter.tenant]
+        queue.remove(waiter)
+        self._queued -= 1
+        TENANT_QUEUE_DEPTH.set(len(queue), tenant=waiter.tenant)
+        if not queue:
+            del self._queues[waiter.tenant]
+
+    def acquire(self, tool: str, tenant: Optional[str], timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Slot al; gerekiyorsa adil kuyrukta bekle. Alınan maliyet sınıfını döndürür
+        (release'e verilir). Admission kapalıysa None döner.
+        timeout isteğin kalan deadline süresidir; dolmuşsa veya bekleme deadline'a takılırsa
+        DeadlineExceeded fırlatılır (kapasite hatası değil, tekrar denemek anlamsız).
+        """
+        if timeout is not None and timeout <= 0:
+            raise deadline.DeadlineExceeded("deadline")
+        if not self.enabled:
+            return None
+        tenant = tenant or "_global"
+        cost_class = TOOL_COST_CLASS.get(tool, "light")
+        cost = COST_CLASSES[cost_class][1]
+        weight = TENANT_WEIGHTS.get(tenant, 1.0)
+        deadline_bound = timeout is not None and timeout < MAX_WAIT_SECONDS
+        wait_limit = timeout if deadline_bound else MAX_WAIT_SECONDS
+        started = time.monotonic()
+
+        with self._lock:
+            if self._queued == 0 and self._has_capacity(cost_class):
+                self._take(cost_class)
+                self._tenant_finish[tenant] = max(self._tenant_finish.get(tenant, 0.0), self._virtual_time) + cost / weight
+                QUEUE_WAIT.observe(0.0, cost_class=cost_class)
+                return cost_class
+            tenant_queue = self._queues.get(tenant)
+            if self._queued >= self.max_queue:
+                REJECTED.inc(reason="queue_full", cost_class=cost_class)
+                raise AdmissionRejected("queue_full", self._retry_after())
+            if tenant_queue is not None and len(tenant_queue) >= self.max_tenant_queue:
+                REJECTED.inc(reason="tenant_queue_full", cost_class=cost_class)
+                raise AdmissionRejected("tenant_queue_full", self._retry_after())
+
+            # Start-time fair queuing: tag = max(tenant'ın son bitişi, global virtual time)
+            start_tag = max(self._tenant_finish.get(tenant, 0.0), self._virtual_time)
+            self._tenant_finish[tenant] = start_tag + cost / weight
+            waiter = _Waiter(tenant, cost_class, cost, start_tag)
+            self._queues.setdefault(tenant, deque()).append(waiter)
+            self._queued += 1
+            TENANT_QUEUE_DEPTH.set(len(self._queues[tenant]), tenant=tenant)
+            self._dispatch_locked()
+
+        waiter.event.wait(wait_limit)
+        with self._lock:
+            if not waiter.granted:
+                self._remove_locked(waiter)
+                # Kullanılmayan payı iade et ki tenant sonraki isteklerde cezalandırılmasın
+                self._tenant_finish[tenant] = max(self._tenant_finish[tenant] - cost / weight, self._virtual_time)
+                if deadline_bound:
+                    raise deadline.DeadlineExceeded("deadline")
+                REJECTED.inc(reason="wait_timeout", cost_class=cost_class)
+                raise AdmissionRejected("wait_timeout", self._retry_after())
+        QUEUE_WAIT.observe(time.monotonic() - started, cost_class=cost_class)
+        return cost_class
+
+    def release(self, cost_class: Optional[str], service_seconds: Optional[float] = None):
+        if cost_class is None:
+            return
+        with self._lock:
+            self._in_use -= 1
+            self._class_in_use[cost_class] -= 1
+            CLASS_IN_USE.set(self._class_in_use[cost_class], cost_class=cost_class)
+            if service_seconds is not None:
+                # Retry-After tahmini için hareketli ortalama
+                self._avg_service_seconds = 0.9 * self._avg_service_seconds + 0.1 * service_seconds
+            if not self._queues:
+                # Boşta iken virtual clock'u sıfırla (sınırsız büyümesin)
+                self._virtual_time = 0.0
+                self._tenant_finish.clear()
+            self._dispatch_locked()
+
+    @contextmanager
+    def admit(self, tool: str, tenant: Optional[str], timeout: Optional[float] = None):
+        cost_class = self.acquire(tool, tenant, timeout)
+        started = time.monotonic()
+        try:
+            yield cost_class
+        finally:
+            self.release(cost_class, time.monotonic() - started)
+
+
+admission = AdmissionController()
+metrics.registry.gauge("mcp_admission_queue_depth", "Admission kuyruğundaki toplam istek", callback=admission.queue_depth)
+metrics.registry.gauge("mcp_admission_in_flight", "Admission'dan geçmiş çalışan çağrılar", callback=admission.in_use)
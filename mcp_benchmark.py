@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Benchmark - Sentetik Tenant Verisi ve Tool Yük Testi
+Sentetik tenant/cihaz/ölçüm/analiz verisi üretip local Postgres/Mongo/Qdrant'a yükler,
+ardından call_tool iş yükünü sabit concurrency ile tekrar oynatır ve tool bazlı
+throughput + latency percentile raporu üretir (JSON çıktı ile versiyonlar arası karşılaştırma).
+
+Kullanım:
+    python3 mcp_benchmark.py seed --tenants 5 --devices 20 --years 1
+    python3 mcp_benchmark.py run --requests 500 --concurrency 8 --output bench.json
+    python3 mcp_benchmark.py run --url http://localhost:5006 --requests 500 --concurrency 8
+    python3 mcp_benchmark.py compare old.json new.json
+    python3 mcp_benchmark.py cleanup
+
+Not: Tüm sentetik kayıtlar "bench-" prefix'i ile üretilir ve `cleanup` ile silinir.
+Ölçümler aqi_ingest üzerinden yüklenir (aylık partition'lar oluşturulur); ardından tenant_devices full sync,
+seed aralığının günlük sketch'leri ve aylık özetleri hesaplanır ki tool'lar üretimdeki hızlı yolları ölçsün.
+Raporda hata (❌) ve boş/uyarı (⚠️ ... bulunamadı) sonuçlar ayrı sayılır.
+Qdrant için `QDRANT_LOCATION=:memory:` verilirse embedded (in-process) Qdrant kullanılır;
+bu durumda seed ve run aynı process'te çalışmalıdır (`run --seed-data`).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+BENCH_PREFIX = "bench-"
+MONGO_DB = os.getenv("MONGO_DB", "airqoonBaseMapDB")
+
+# Sentetik ölçüm parametreleri: (parametre, birim, taban değer, mevsimsel genlik)
+PARAMETERS = [
+    ("PM10-24h", "µg/m³", 40.0, 15.0),
+    ("PM2.5-24h", "µg/m³", 20.0, 8.0),
+    ("NO2-1h", "µg/m³", 30.0, 10.0),
+    ("O3-1h", "µg/m³", 60.0, 20.0),
+]
+
+SEARCH_QUERIES = [
+    "PM10 değerlerindeki değişiklikler",
+    "Şubat Nisan arası PM2.5 karşılaştırması",
+    "hava kalitesi iyileşmesi",
+    "NO2 seviyelerinde dramatik artış",
+    "ozon ortalamaları",
+]
+
+DEFAULT_TOOL_WEIGHTS = {
+    "tenant_time_range_analysis": 4,
+    "tenant_monthly_comparison": 2,
+    "tenant_device_list": 2,
+    "tenant_statistics": 2,
+    "tenant_distribution_analysis": 1,
+    "search_analysis_from_vector_db": 3,
+}
+
+
+class SyntheticDataGenerator:
+    """
+    Deterministik (seed'li) sentetik veri üreticisi
+    Ölçümler generator olarak üretilir, bellekte tutulmaz.
+    """
+
+    def __init__(
+        self,
+        tenants: int = 3,
+        devices_per_tenant: int = 10,
+        years: float = 1.0,
+        readings_per_day: int = 24,
+        analyses_per_tenant: int = 20,
+        end_date: Optional[date] = None,
+        seed: int = 42
+    ):
+        self.tenants = tenants
+        self.devices_per_tenant = devices_per_tenant
+        self.years = years
+        self.readings_per_day = readings_per_day
+        self.analyses_per_tenant = analyses_per_tenant
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=int(365 * years))
+        self.seed = seed
+
+    def tenant_slugs(self) -> List[str]:
+        return [f"{BENCH_PREFIX}tenant-{i:03d}" for i in range(self.tenants)]
+
+    def device_ids(self, tenant_slug: str) -> List[str]:
+        return [f"{tenant_slug}-dev-{i:04d}" for i in range(self.devices_per_tenant)]
+
+    def tenant_documents(self) -> List[Dict]:
+        return [
+            {"SlugName": slug, "Name": f"Benchmark Tenant {i}", "IsPublic": i % 2 == 0}
+            for i, slug in enumerate(self.tenant_slugs())
+        ]
+
+    def device_documents(self) -> Iterator[Dict]:
+        rng = random.Random(self.seed)
+        for slug in self.tenant_slugs():
+            for i, device_id in enumerate(self.device_ids(slug)):
+                yield {
+                    "DeviceId": device_id,
+                    "TenantSlugName": slug,
+                    "Name": f"Bench Device {i}",
+                    "Label": f"BD-{i:04d}",
+                    "LatestTelemetry": {
+                        name: round(base + rng.uniform(-amp, amp), 2)
+                        for name, _unit, base, amp in PARAMETERS
+                    },
+                }
+
+    def readings(self) -> Iterator[Tuple[str, str, float, str, datetime]]:
+        """(device_id, parameter, concentration, unit, calculated_datetime) satırları"""
+        rng = random.Random(self.seed + 1)
+        step = timedelta(seconds=86400 // max(self.readings_per_day, 1))
+        total_days = (self.end_date - self.start_date).days
+        for slug in self.tenant_slugs():
+            for device_id in self.device_ids(slug):
+                device_bias = rng.uniform(0.8, 1.2)
+                for day_offset in range(total_days):
+                    day = self.start_date + timedelta(days=day_offset)
+                    season = math.cos(2 * math.pi * (day.timetuple().tm_yday / 365.0))
+                    moment = datetime(day.year, day.month, day.day)
+                    for slot in range(self.readings_per_day):
+                        diurnal = math.sin(2 * math.pi * slot / max(self.readings_per_day, 1))
+                        for name, unit, base, amp in PARAMETERS:
+                            value = base * device_bias + amp * season + 0.3 * amp * diurnal + rng.gauss(0, amp * 0.2)
+                            yield device_id, name, round(max(value, 0.0), 2), unit, moment + step * slot
+
+    def analysis_texts(self, tenant_slug: str) -> Iterator[Tuple[str, Dict]]:
+        rng = random.Random(f"{self.seed}-{tenant_slug}")
+        months = max(int(self.years * 12), 2)
+        for i in range(self.analyses_per_tenant):
+            month_offset = rng.randrange(1, months)
+            month1 = (self.end_date.replace(day=1) - timedelta(days=31 * month_offset)).replace(day=1)
+            month2 = (month1 + timedelta(days=32)).replace(day=1)
+            text = f"# {tenant_slug} - Zaman Aralığı Analizi\n\n"
+            text += f"**Analiz Tarihi:** {month1} - {month2}\n\n## Karşılaştırma Analizi\n\n"
+            for name, unit, base, amp in PARAMETERS:
+                before = base + rng.uniform(-amp, amp)
+                after = before * rng.uniform(0.6, 1.4)
+                diff_pct = (after - before) / before * 100
+                text += f"### {name}\n- **Değişim:** {after - before:+.2f} ({diff_pct:+.1f}%)\n"
+                if abs(diff_pct) > 20:
+                    text += "  - ⚠️ **DRAMATİK DEĞİŞİM TESPİT EDİLDİ!**\n"
+                text += "\n"
+            yield text, {
+                "analysis_type": "time_range_analysis",
+                "start_date": month1.isoformat(),
+                "end_date": month2.isoformat(),
+                "benchmark": True,
+            }
+
+
+def seed_mongo(generator: SyntheticDataGenerator, mongo_uri: str) -> Dict:
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_uri)
+    db = client[MONGO_DB]
+    db["Tenants"].delete_many({"SlugName": {"$regex": f"^{BENCH_PREFIX}"}})
+    db["Devices"].delete_many({"TenantSlugName": {"$regex": f"^{BENCH_PREFIX}"}})
+    db["Tenants"].insert_many(generator.tenant_documents())
+
+    device_count = 0
+    batch = []
+    for doc in generator.device_documents():
+        batch.append(doc)
+        if len(batch) >= 1000:
+            db["Devices"].insert_many(batch)
+            device_count += len(batch)
+            batch = []
+    if batch:
+        db["Devices"].insert_many(batch)
+        device_count += len(batch)
+    client.close()
+    return {"tenants": generator.tenants, "devices": device_count}
+
+
+def seed_postgres(generator: SyntheticDataGenerator, conn, batch_rows: int = 50000) -> Dict:
+    """Ölçümleri aqi_ingest ile (COPY + eksik aylık partition'lar, sabit bellek) yükle"""
+    from aqi_ingest import COLUMNS, Ingestor
+
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM air_quality_index WHERE device_id LIKE %s", (f"{BENCH_PREFIX}%",))
+    conn.commit()
+
+    records = (dict(zip(COLUMNS, reading)) for reading in generator.readings())
+    report = Ingestor(conn, batch_rows).run(records, progress=False)
+    return {
+        "readings": report["inserted"],
+        "rejected": report["rejected"],
+        "months": len(report["months"]),
+        "seconds": report["seconds"],
+        "rows_per_second": report["rows_per_second"],
+    }
+
+
+def seed_derived(generator: SyntheticDataGenerator, conn) -> Dict:
+    """
+    Üretimde arka planda tutulan türetilmiş tabloları seed aralığı için oluştur:
+    tenant_devices (full sync), günlük sketch'ler ve aylık özetler. Bunlar olmadan tool'lar
+    yavaş fallback yollarını (Mongo cihaz listesi, exact SQL, canlı aggregate) ölçer.
+    """
+    import aqi_digest
+    import aqi_sketch
+    import tenant_device_sync
+
+    started = time.perf_counter()
+    tenant_device_sync.ensure_schema(conn)
+    sync = tenant_device_sync.sync_devices(conn, full=True)
+
+    days = [generator.start_date + timedelta(days=offset) for offset in range((generator.end_date - generator.start_date).days)]
+    sketches = aqi_sketch.run_sketches(conn, days=days)
+
+    months = sorted({day.replace(day=1) for day in days})
+    digests = aqi_digest.run_digest(conn, months=months, embed=False)
+
+    return {
+        "tenant_devices": sync.get("rows"),
+        "sketch_days": len(sketches.get("days", [])),
+        "digest_months": len(digests.get("months", [])),
+        "skipped": [name for name, result in (("sketch", sketches), ("digest", digests)) if result.get("skipped")],
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def seed_qdrant(generator: SyntheticDataGenerator, vector_api) -> Dict:
+    saved = 0
+    for slug in generator.tenant_slugs():
+        for text, metadata in generator.analysis_texts(slug):
+            vector_api.save_analysis(tenant_slug=slug, analysis_text=text, analysis_metadata=metadata)
+            saved += 1
+    return {"analyses": saved}
+
+
+def seed_all(generator: SyntheticDataGenerator, vector_api=None, skip: Optional[List[str]] = None) -> Dict:
+    skip = skip or []
+    report = {}
+    if "mongo" not in skip:
+        report["mongo"] = seed_mongo(generator, os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+        print(f"✓ Mongo: {report['mongo']}")
+    if "postgres" not in skip:
+        from aqi_partitioning import connect_pg
+        conn = connect_pg()
+        try:
+            report["postgres"] = seed_postgres(generator, conn)
+            print(f"✓ Postgres: {report['postgres']}")
+            report["derived"] = seed_derived(generator, conn)
+            print(f"✓ Türetilmiş tablolar: {report['derived']}")
+        finally:
+            conn.close()
+    if "qdrant" not in skip:
+        if vector_api is None:
+            from vector_db_api import TenantIsolatedVectorAPI
+            vector_api = TenantIsolatedVectorAPI()
+        report["qdrant"] = seed_qdrant(generator, vector_api)
+        print(f"✓ Qdrant: {report['qdrant']}")
+    return report
+
+
+def cleanup_all() -> Dict:
+    """Sentetik (bench-) kayıtları tüm store'lardan sil"""
+    report = {}
+    from pymongo import MongoClient
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    db = client[MONGO_DB]
+    report["mongo_tenants"] = db["Tenants"].delete_many({"SlugName": {"$regex": f"^{BENCH_PREFIX}"}}).deleted_count
+    report["mongo_devices"] = db["Devices"].delete_many({"TenantSlugName": {"$regex": f"^{BENCH_PREFIX}"}}).deleted_count
+    client.close()
+
+    from aqi_partitioning import connect_pg
+    conn = connect_pg()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM air_quality_index WHERE device_id LIKE %s", (f"{BENCH_PREFIX}%",))
+            report["postgres_readings"] = cursor.rowcount
+            cursor.execute("SELECT to_regclass('public.aqi_daily_sketch')")
+            if cursor.fetchone()[0]:
+                cursor.execute("DELETE FROM aqi_daily_sketch WHERE device_id LIKE %s", (f"{BENCH_PREFIX}%",))
+                report["postgres_sketches"] = cursor.rowcount
+            for table, key in (("tenant_monthly_digest", "postgres_digests"), ("tenant_devices", "postgres_tenant_devices")):
+                cursor.execute("SELECT to_regclass(%s)", (f"public.{table}",))
+                if cursor.fetchone()[0]:
+                    cursor.execute(f"DELETE FROM {table} WHERE tenant_slug LIKE %s", (f"{BENCH_PREFIX}%",))
+                    report[key] = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    from vector_db_api import TenantIsolatedVectorAPI
+    api = TenantIsolatedVectorAPI()
+    deleted = 0
+    for col in api.client.get_collections().collections:
+        if col.name.startswith(f"tenant_{BENCH_PREFIX}"):
+            api.client.delete_collection(col.name)
+            deleted += 1
+    report["qdrant_collections"] = deleted
+    return report
+
+
+class WorkloadBuilder:
+    """Ağırlıklı tool karışımından tekrarlanabilir call_tool iş yükü üretir"""
+
+    def __init__(self, generator: SyntheticDataGenerator, weights: Optional[Dict[str, int]] = None, seed: int = 7):
+        self.generator = generator
+        self.weights = weights or DEFAULT_TOOL_WEIGHTS
+        self.rng = random.Random(seed)
+        self.tenants = generator.tenant_slugs()
+
+    def _random_month(self) -> date:
+        months = max(int(self.generator.years * 12), 2)
+        return (self.generator.end_date.replace(day=1) - timedelta(days=31 * self.rng.randrange(1, months))).replace(day=1)
+
+    def _arguments(self, tool: str) -> Dict:
+        tenant = self.rng.choice(self.tenants)
+        if tool == "tenant_time_range_analysis":
+            # Web tier'ın çoğunlukla çalıştırdığı kısa aralıklı ("son gün") sorgular ağırlıklı
+            span = self.rng.choice([1, 1, 1, 7, 30])
+            end = self.generator.end_date - timedelta(days=self.rng.randrange(0, 30))
+            return {
+                "tenant_slug": tenant,
+                "start_date": (end - timedelta(days=span)).isoformat(),
+                "end_date": end.isoformat(),
+                "pollutants": ["PM10", "PM2.5"],
+            }
+        if tool == "tenant_monthly_comparison":
+            month1 = self._random_month()
+            month2 = (month1 + timedelta(days=62)).replace(day=1)
+            return {"tenant_slug": tenant, "month1": month1.strftime("%Y-%m"), "month2": month2.strftime("%Y-%m")}
+        if tool == "tenant_distribution_analysis":
+            # Uzun aralıklı (çeyrek / yıl) yüzdelik soruları
+            span = self.rng.choice([90, 365])
+            end = self.generator.end_date
+            return {
+                "tenant_slug": tenant,
+                "start_date": (end - timedelta(days=span)).isoformat(),
+                "end_date": end.isoformat(),
+                "pollutants": ["PM10"],
+            }
+        if tool == "search_analysis_from_vector_db":
+            return {"tenant_slug": tenant, "query_text": self.rng.choice(SEARCH_QUERIES), "limit": 5}
+        return {"tenant_slug": tenant}
+
+    def build(self, requests: int) -> List[Tuple[str, Dict]]:
+        tools = list(self.weights.keys())
+        weights = [self.weights[t] for t in tools]
+        return [(tool, self._arguments(tool)) for tool in self.rng.choices(tools, weights=weights, k=requests)]
+
+
+def in_process_caller() -> Callable[[str, Dict], str]:
+    """mcp_server.call_tool'u HTTP bridge ile aynı şekilde (thread başına event loop) çağır"""
+    import mcp_server
+
+    def call(tool: str, arguments: Dict) -> str:
+        result = asyncio.run(mcp_server.call_tool(tool, arguments))
+        return "\n".join(c.text for c in result if getattr(c, "type", None) == "text")
+
+    return call
+
+
+def http_caller(base_url: str, timeout: float = 60.0) -> Callable[[str, Dict], str]:
+    """Çalışan MCP HTTP bridge'ine /call_tool isteği gönder"""
+    url = base_url.rstrip("/") + "/call_tool"
+
+    def call(tool: str, arguments: Dict) -> str:
+        body = json.dumps({"tool": tool, "arguments": arguments}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = json.loads(resp.read().decode("utf-8"))
+        if "error" in payload:
+            raise RuntimeError(payload["error"])
+        return payload.get("text", "")
+
+    return call
+
+
+# Tool'ların "veri yok" uyarıları (örn. "⚠️ Bu zaman aralığında veri bulunamadı.")
+EMPTY_RESULT_PATTERN = re.compile(r"(?m)^\s*⚠.*bulunamadı")
+
+
+def classify_result(text: str) -> str:
+    """ok | error (❌) | empty (boş metin veya ⚠️ ... bulunamadı)"""
+    stripped = (text or "").strip()
+    if stripped.startswith("❌"):
+        return "error"
+    if not stripped or EMPTY_RESULT_PATTERN.search(stripped):
+        return "empty"
+    return "ok"
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return None
+    rank = max(int(math.ceil(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies_ms: List[float], errors: int, wall_seconds: float, empty: int = 0) -> Dict:
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "empty": empty,
+        "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else None,
+        "mean_ms": round(sum(values) / len(values), 2) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p90_ms": percentile(values, 90),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else None,
+    }
+
+
+def run_workload(
+    call: Callable[[str, Dict], str],
+    workload: List[Tuple[str, Dict]],
+    concurrency: int,
+    warmup: int = 0
+) -> Dict:
+    """İş yükünü sabit concurrency ile çalıştır; tool bazlı ve toplam özet döndür"""
+    for tool, arguments in workload[:warmup]:
+        try:
+            call(tool, arguments)
+        except Exception:
+            pass
+    measured = workload[warmup:]
+
+    def timed(item: Tuple[str, Dict]) -> Tuple[str, float, str]:
+        tool, arguments = item
+        started = time.perf_counter()
+        try:
+            outcome = classify_result(call(tool, arguments))
+        except Exception:
+            outcome = "error"
+        return tool, (time.perf_counter() - started) * 1000, outcome
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, measured))
+    wall = time.perf_counter() - started
+
+    per_tool: Dict[str, List[float]] = {}
+    per_tool_errors: Dict[str, int] = {}
+    per_tool_empty: Dict[str, int] = {}
+    for tool, elapsed_ms, outcome in samples:
+        per_tool.setdefault(tool, []).append(round(elapsed_ms, 3))
+        if outcome == "error":
+            per_tool_errors[tool] = per_tool_errors.get(tool, 0) + 1
+        elif outcome == "empty":
+            per_tool_empty[tool] = per_tool_empty.get(tool, 0) + 1
+
+    return {
+        "overall": summarize([s[1] for s in samples], sum(per_tool_errors.values()), wall, sum(per_tool_empty.values())),
+        "tools": {
+            tool: summarize(values, per_tool_errors.get(tool, 0), wall, per_tool_empty.get(tool, 0))
+            for tool, values in sorted(per_tool.items())
+        },
+        "wall_seconds": round(wall, 3),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare_reports(old: Dict, new: Dict) -> List[str]:
+    """İki benchmark JSON'unu tool bazlı karşılaştır"""
+    lines = []
+    for tool in sorted(set(old.get("tools", {})) | set(new.get("tools", {}))):
+        before = old.get("tools", {}).get(tool)
+        after = new.get("tools", {}).get(tool)
+        if not before or not after:
+            lines.append(f"{tool}: sadece {'yeni' if after else 'eski'} raporda var")
+            continue
+        parts = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            a, b = before.get(key), after.get(key)
+            if a and b:
+                parts.append(f"{key} {a} -> {b} ({(b - a) / a * 100:+.1f}%)")
+        lines.append(f"{tool}: " + ", ".join(parts))
+    return lines
+
+
+def _generator_from_args(args) -> SyntheticDataGenerator:
+    return SyntheticDataGenerator(
+        tenants=args.tenants,
+        devices_per_tenant=args.devices,
+        years=args.years,
+        readings_per_day=args.readings_per_day,
+        analyses_per_tenant=args.analyses,
+        seed=args.seed
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Airqoon MCP benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_dataset_args(p):
+        p.add_argument("--tenants", type=int, default=3)
+        p.add_argument("--devices", type=int, default=10, help="Tenant başına cihaz")
+        p.add_argument("--years", type=float, default=1.0)
+        p.add_argument("--readings-per-day", type=int, default=24)
+        p.add_argument("--analyses", type=int, default=20, help="Tenant başına analiz")
+        p.add_argument("--seed", type=int, default=42)
+
+    seed_parser = sub.add_parser("seed", help="Sentetik veriyi yükle")
+    add_dataset_args(seed_parser)
+    seed_parser.add_argument("--skip", action="append", choices=["mongo", "postgres", "qdrant"], default=[])
+
+    run_parser = sub.add_parser("run", help="call_tool iş yükünü çalıştır")
+    add_dataset_args(run_parser)
+    run_parser.add_argument("--requests", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=4)
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--url", help="MCP HTTP bridge URL'i (verilmezse in-process call_tool)")
+    run_parser.add_argument("--tools", help="Virgülle ayrılmış tool listesi (varsayılan: karışım)")
+    run_parser.add_argument("--seed-data", action="store_true", help="Çalıştırmadan önce veriyi yükle")
+    run_parser.add_argument("--output", help="JSON rapor dosyası")
+
+    compare_parser = sub.add_parser("compare", help="İki JSON raporu karşılaştır")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    sub.add_parser("cleanup", help="bench- kayıtlarını sil")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        seed_all(_generator_from_args(args), skip=args.skip)
+        return 0
+
+    if args.command == "cleanup":
+        print(f"✓ Temizlendi: {cleanup_all()}")
+        return 0
+
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        for line in compare_reports(old, new):
+            print(line)
+        return 0
+
+    generator = _generator_from_args(args)
+    if args.url:
+        call = http_caller(args.url)
+    else:
+        call = in_process_caller()
+
+    if args.seed_data:
+        vector_api = None
+        if not args.url:
+            import mcp_server
+            vector_api = mcp_server.get_vector_api()
+        seed_all(generator, vector_api=vector_api)
+
+    weights = DEFAULT_TOOL_WEIGHTS
+    if args.tools:
+        weights = {tool.strip(): 1 for tool in args.tools.split(",") if tool.strip()}
+    workload = WorkloadBuilder(generator, weights=weights, seed=args.seed).build(args.requests + args.warmup)
+
+    print(f"🔄 {args.requests} istek, concurrency={args.concurrency} ({'HTTP ' + args.url if args.url else 'in-process'})")
+    results = run_workload(call, workload, concurrency=args.concurrency, warmup=args.warmup)
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "git_revision": _git_revision(),
+        "mode": "http" if args.url else "in_process",
+        "config": {
+            "tenants": args.tenants,
+            "devices_per_tenant": args.devices,
+            "years": args.years,
+            "readings_per_day": args.readings_per_day,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "tool_weights": weights,
+        },
+        **results,
+    }
+
+    overall = report["overall"]
+    print(f"✓ Toplam: {overall['throughput_rps']} req/s, p50={overall['p50_ms']}ms, p95={overall['p95_ms']}ms, p99={overall['p99_ms']}ms, hata={overall['errors']}, boş={overall['empty']}")
+    for tool, summary in report["tools"].items():
+        print(f"  - {tool}: n={summary['count']}, p50={summary['p50_ms']}ms, p95={summary['p95_ms']}ms, hata={summary['errors']}, boş={summary['empty']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ Rapor yazıldı: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Deadline - İstek Süresi Yayılımı ve Sunucu Tarafı İptal
+İstemcinin verdiği süre (X-Request-Timeout-Ms veya X-Request-Deadline header'ı)
+Postgres statement_timeout, Mongo maxTimeMS ve Qdrant timeout'una çevrilir.
+Süre dolduğunda veya istemci bağlantıyı kapattığında çalışan tool coroutine'i iptal edilir,
+devam eden Postgres sorgusu conn.cancel() ile durdurulur.
+"""
+
+import contextvars
+import math
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Mapping, Optional
+
+import mcp_metrics as metrics
+
+# Sunucu tarafı üst sınır (header yoksa da uygulanır, 0 = sınırsız)
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("MCP_DEFAULT_TIMEOUT_SECONDS", "0"))
+# Yanıtı yazabilmek için alt sistemlere verilen süreden düşülen pay
+SAFETY_MARGIN_SECONDS = float(os.getenv("MCP_DEADLINE_MARGIN_MS", "250")) / 1000.0
+WATCHDOG_INTERVAL_SECONDS = 0.1
+
+CANCELLATIONS = metrics.registry.counter("mcp_tool_cancellations_total", "İptal edilen tool çağrıları (sebep bazlı)")
+
+
+class DeadlineExceeded(Exception):
+    """İstek süresi doldu veya istemci bağlantıyı kapattı"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"İstek iptal edildi: {reason}")
+        self.reason = reason
+
+
+class RequestDeadline:
+    def __init__(self, timeout_seconds: Optional[float]):
+        self.expires_at = time.monotonic() + timeout_seconds if timeout_seconds else None
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str):
+        """İptal et ve kayıtlı callback'leri (pg cancel, task.cancel) çalıştır"""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        with self._lock:
+            self._callbacks.append(callback)
+            already_cancelled = self._cancelled.is_set()
+        if already_cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+    def child(self, timeout_seconds: float) -> "RequestDeadline":
+        """
+        Daha kısa süreli alt deadline (örn. batch içinde kendi süresi olan tek çağrı).
+        Üst deadline iptal edilirse alt deadline da aynı sebeple iptal edilir.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout_seconds = min(timeout_seconds, remaining)
+        child = RequestDeadline(max(timeout_seconds, 0.001))
+        propagate = lambda: child.cancel(self.reason or "deadline")
+        with self._lock:
+            self._callbacks.append(propagate)
+            already_cancelled = self._cancelled.is_set()
+        if already_cancelled:
+            propagate()
+        return child
+
+    def check(self):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            self.cancel("deadline")
+        if self.cancelled:
+            raise DeadlineExceeded(self.reason or "deadline")
+
+
+_current: contextvars.ContextVar[Optional[RequestDeadline]] = contextvars.ContextVar("mcp_request_deadline", default=None)
+
+
+def activate(deadline: Optional[RequestDeadline]):
+    return _current.set(deadline)
+
+
+def current() -> Optional[RequestDeadline]:
+    return _current.get()
+
+
+def check():
+    """Pahalı bir aşamaya geçmeden önce çağrılır; süre dolduysa DeadlineExceeded fırlatır"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+@contextmanager
+def on_cancel(callback: Callable[[], None]):
+    """Aktif deadline yoksa no-op"""
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    with deadline.on_cancel(callback):
+        yield
+
+
+def _budget_seconds() -> Optional[float]:
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    if remaining is None:
+        return None
+    return max(remaining - SAFETY_MARGIN_SECONDS, 0.001)
+
+
+def statement_timeout_ms() -> Optional[int]:
+    budget = _budget_seconds()
+    return None if budget is None else max(int(budget * 1000), 1)
+
+
+def mongo_max_time_ms() -> Optional[int]:
+    return statement_timeout_ms()
+
+
+def mongo_kwargs() -> dict:
+    """find()/find_one() için max_time_ms argümanı (deadline yoksa boş)"""
+    ms = mongo_max_time_ms()
+    return {"max_time_ms": ms} if ms else {}
+
+
+def qdrant_timeout_seconds() -> Optional[int]:
+    """Qdrant REST timeout'u tam saniye kabul eder"""
+    budget = _budget_seconds()
+    return None if budget is None else max(int(math.ceil(budget)), 1)
+
+
+def timeout_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    X-Request-Timeout-Ms: kalan süre (ms, tercih edilen)
+    X-Request-Deadline: mutlak bitiş zamanı (unix epoch saniye)
+    """
+    timeout = None
+    raw_timeout = headers.get("X-Request-Timeout-Ms")
+    raw_deadline = headers.get("X-Request-Deadline")
+    try:
+        if raw_timeout:
+            timeout = float(raw_timeout) / 1000.0
+        elif raw_deadline:
+            timeout = float(raw_deadline) - time.time()
+    except ValueError:
+        timeout = None
+
+    if DEFAULT_TIMEOUT_SECONDS > 0:
+        timeout = DEFAULT_TIMEOUT_SECONDS if timeout is None else min(timeout, DEFAULT_TIMEOUT_SECONDS)
+    if timeout is not None:
+        timeout = max(timeout, 0.001)
+    return timeout
+
+
+def disconnect_probe(environ: Mapping) -> Optional[Callable[[], bool]]:
+    """
+    WSGI environ'dan istemci soketini bul ve "bağlantı kapandı mı" kontrolü döndür.
+    Werkzeug (werkzeug.socket) ve gunicorn (gunicorn.socket) desteklenir; bulunamazsa None.
+    """
+    sock = environ.get("werkzeug.socket") or environ.get("gunicorn.socket")
+    if sock is None:
+        return None
+
+    def is_disconnected() -> bool:
+        try:
+            data = sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+            return data == b""
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            return True
+
+    return is_disconnected
+
+
+class Watchdog:
+    """Deadline ve istemci bağlantısını izleyip gerektiğinde iptal tetikleyen thread"""
+
+    def __init__(self, deadline: RequestDeadline, is_disconnected: Optional[Callable[[], bool]] = None):
+        self.deadline = deadline
+        self.is_disconnected = is_disconnected
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="mcp-deadline-watchdog", daemon=True)
+
+    def _loop(self):
+        while not self._done.wait(WATCHDOG_INTERVAL_SECONDS):
+            remaining = self.deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                self.deadline.cancel("deadline")
+                return
+            if self.is_disconnected is not None and self.is_disconnected():
+                self.deadline.cancel("client_disconnected")
+                return
+
+    def __enter__(self):
+        if self.deadline.expires_at is not None or self.is_disconnected is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        return False
+
+
+def record_cancellation(tool: str, reason: str):
+    CANCELLATIONS.inc(tool=tool, reason=reason)
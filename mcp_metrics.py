@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Metrics - Aşama Bazlı Latency ve Prometheus Export
+Her tool çağrısının aşamalarını (Mongo tenant lookup, SQL aggregation, embedding,
+Qdrant upsert/search vb.) ölçer, tool bazlı hata sayar, pool/kuyruk doluluğunu izler
+ve Prometheus text formatında (/metrics) sunar. Harici bağımlılık yoktur.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Aktif tool adı ve (istenirse) istek bazlı zamanlama dökümü
+_current_tool: contextvars.ContextVar[str] = contextvars.ContextVar("mcp_current_tool", default="unknown")
+_request_timings: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("mcp_request_timings", default=None)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, metric_type: str):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "counter")
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Değer set/inc/dec ile veya render anında callback ile okunur"""
+
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, "gauge")
+        self._values: Dict[Tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        if self._callback is not None and not labels:
+            return float(self._callback())
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                return self.header() + [f"{self.name} {float(self._callback())}"]
+            except Exception:
+                return self.header()
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, "histogram")
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # key -> [bucket_counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        lines = self.header()
+        for key, bucket_counts, total, count in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', repr(bound)),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory: Callable[[], _Metric]) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name, help_text, callback))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+TOOL_DURATION = registry.histogram("mcp_tool_duration_seconds", "Tool çağrısı toplam süresi")
+TOOL_CALLS = registry.counter("mcp_tool_calls_total", "Tool çağrı sayısı")
+TOOL_ERRORS = registry.counter("mcp_tool_errors_total", "Hata ile sonuçlanan tool çağrıları")
+STAGE_DURATION = registry.histogram("mcp_stage_duration_seconds", "Tool içi aşama süreleri")
+TOOLS_IN_FLIGHT = registry.gauge("mcp_tools_in_flight", "Çalışmakta olan tool çağrıları")
+
+
+@contextmanager
+def tool_call(tool: str):
+    """
+    Tool çağrısını ölç. Aşamalar bu context içinde `stage()` ile etiketlenir.
+    Handler'lar hataları "❌" ile başlayan metin olarak döndürdüğü için
+    çağıran taraf `mark_error()` ile de hata bildirebilir.
+    """
+    token = _current_tool.set(tool)
+    TOOLS_IN_FLIGHT.inc(tool=tool)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        TOOL_ERRORS.inc(tool=tool)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        TOOLS_IN_FLIGHT.dec(tool=tool)
+        TOOL_CALLS.inc(tool=tool)
+        TOOL_DURATION.observe(elapsed, tool=tool)
+        _current_tool.reset(token)
+
+
+def mark_error(tool: Optional[str] = None):
+    TOOL_ERRORS.inc(tool=tool or _current_tool.get())
+
+
+@contextmanager
+def stage(name: str):
+    """Tool içindeki tek bir aşamayı ölç (örn: 'mongo_tenant_lookup', 'sql_aggregation')"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, tool=_current_tool.get(), stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append({"stage": name, "ms": round(elapsed * 1000, 3)})
+
+
+def start_request_timings() -> List[Dict]:
+    """
+    Bu context (ve buradan başlatılan asyncio.run) için aşama dökümünü toplamaya başla.
+    Dönen liste, aşamalar tamamlandıkça doldurulur.
+    """
+    timings: List[Dict] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def render_prometheus() -> str:
+    return registry.render()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Profiler - Çalışma Anında Açılıp Kapanan Sampling Profiler
+Canlı instance'ı yeniden başlatmadan N saniyelik örnekleme yapar:
+- sys._current_frames() ile periyodik stack örnekleri -> flamegraph uyumlu collapsed stack çıktısı
+  (flamegraph.pl / speedscope / inferno ile açılabilir)
+- Opsiyonel: tracemalloc ile tool bazlı bellek ayırma (allocation) takibi
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+DEFAULT_INTERVAL_MS = float(os.getenv("MCP_PROFILER_INTERVAL_MS", "10"))
+MAX_DURATION_SECONDS = float(os.getenv("MCP_PROFILER_MAX_SECONDS", "120"))
+TRACEMALLOC_FRAMES = int(os.getenv("MCP_PROFILER_TRACEMALLOC_FRAMES", "10"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """Tek bir profil oturumu (örnekler + opsiyonel allocation istatistikleri)"""
+
+    def __init__(self, duration: float, interval_ms: float, allocations: bool):
+        self.duration = duration
+        self.interval = max(interval_ms, 1.0) / 1000.0
+        self.allocations = allocations
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.tool_allocations: Dict[str, Dict] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                # Profiler'ın kendi thread'lerini örnekleme
+                if thread_id == own_id or names.get(thread_id, "").startswith("mcp-profiler"):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.finished_at = time.time()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample_loop, name="mcp-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def record_tool_allocation(self, tool: str, size_diff: int, peak: int, top: List[Dict]):
+        with self._lock:
+            stats = self.tool_allocations.setdefault(
+                tool, {"calls": 0, "net_bytes": 0, "max_peak_bytes": 0, "sites": Counter()}
+            )
+            stats["calls"] += 1
+            stats["net_bytes"] += size_diff
+            stats["max_peak_bytes"] = max(stats["max_peak_bytes"], peak)
+            for site in top:
+                stats["sites"][site["site"]] += site["size_diff"]
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed stack formatı: 'frame1;frame2;... count'"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self) -> Dict:
+        with self._lock:
+            allocations = {
+                tool: {
+                    "calls": stats["calls"],
+                    "net_bytes": stats["net_bytes"],
+                    "max_peak_bytes": stats["max_peak_bytes"],
+                    "top_sites": [
+                        {"site": site, "size_diff": size}
+                        for site, size in stats["sites"].most_common(10)
+                    ],
+                }
+                for tool, stats in self.tool_allocations.items()
+            }
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+            "allocations": allocations if self.allocations else None,
+        }
+
+
+class SamplingProfiler:
+    """Process genelinde tek aktif oturuma izin veren profiler kontrolcüsü"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session: Optional[ProfileSession] = None
+        self._started_tracemalloc = False
+
+    @property
+    def session(self) -> Optional[ProfileSession]:
+        return self._session
+
+    def start(self, seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS, allocations: bool = False) -> ProfileSession:
+        seconds = min(max(seconds, 0.1), MAX_DURATION_SECONDS)
+        with self._lock:
+            if self._session is not None and self._session.running:
+                raise RuntimeError("Profiler zaten çalışıyor")
+            if allocations and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            session = ProfileSession(seconds, interval_ms, allocations)
+            session.start()
+            self._session = session
+
+        if allocations:
+            # Süre dolunca tracemalloc'u kapat (overhead sadece profil süresince)
+            def _finish():
+                session._thread.join()
+                self._stop_tracemalloc()
+            threading.Thread(target=_finish, name="mcp-profiler-finish", daemon=True).start()
+        return session
+
+    def stop(self) -> Optional[ProfileSession]:
+        with self._lock:
+            session = self._session
+        if session is None:
+            return None
+        session.stop(wait=True)
+        self._stop_tracemalloc()
+        return session
+
+    def run(self, seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS, allocations: bool = False) -> ProfileSession:
+        """Oturumu başlat ve süre dolana kadar bekle"""
+        session = self.start(seconds, interval_ms, allocations)
+        session._thread.join()
+        self._stop_tracemalloc()
+        return session
+
+    def _stop_tracemalloc(self):
+        with self._lock:
+            if self._started_tracemalloc and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def track_tool_allocations(self, tool: str):
+        """
+        Allocation takibi açık bir oturum varsa tool çağrısı öncesi/sonrası
+        tracemalloc snapshot'larını karşılaştır. Snapshot'lar process geneli olduğu için
+        eşzamanlı çağrılarda değerler yaklaşıktır.
+        """
+        session = self._session
+        if session is None or not session.allocations or not session.running or not tracemalloc.is_tracing():
+            yield
+            return
+
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start_current, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            if tracemalloc.is_tracing():
+                after = tracemalloc.take_snapshot()
+                end_current, peak = tracemalloc.get_traced_memory()
+                top = [
+                    {
+                        "site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                        "size_diff": stat.size_diff,
+                    }
+                    for stat in after.compare_to(before, "lineno")[:10]
+                    if stat.size_diff > 0
+                ]
+                session.record_tool_allocation(tool, end_current - start_current, peak - start_current, top)
+
+
+profiler = SamplingProfiler()
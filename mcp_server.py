@@ -5,6 +5,7 @@ Tenant bazlı hava kalitesi analizleri ve zaman aralığı karşılaştırmalar
 """
 
 import asyncio
+import base64
 import os
 from datetime import datetime, timedelta
 from typing import Any, Optional, List, Dict
@@ -26,25 +27,104 @@ except ImportError:
     from mcp.types import Tool, TextContent
 import json
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import threading
+import time
+import hmac
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Database connections
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
+from bson import ObjectId
+from bson.errors import InvalidId
 import psycopg2
+from psycopg2 import errorcodes
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager, nullcontext
+
+# Prepared statement registry
+from sql_registry import registry as sql_registry
+
+# Metrics (aşama süreleri, hata sayaçları, /metrics)
+import mcp_metrics as metrics
+
+# Runtime sampling profiler (/admin/profile)
+from mcp_profiler import profiler
+
+# Eşzamanlı özdeş tool çağrılarını birleştirme
+from mcp_singleflight import singleflight
+
+# İstek deadline'ı ve iptal (statement_timeout / maxTimeMS / Qdrant timeout)
+import mcp_deadline as deadline
+
+# Global eşzamanlılık sınırı + tenant bazlı adil kuyruk (HTTP bridge)
+from mcp_admission import admission, AdmissionRejected
 
 # Vector DB
 from vector_db_api import TenantIsolatedVectorAPI
+from vector_retention import RetentionWorker, RETENTION_INTERVAL_SECONDS
+from vector_query_cache import query_cache
+
+# Mongo Devices -> PostgreSQL tenant_devices eşlemesi
+from tenant_device_sync import DeviceSyncWorker, SYNC_INTERVAL_SECONDS as DEVICE_SYNC_INTERVAL_SECONDS
+
+# Aylık değişim özetleri (gecelik batch)
+from aqi_digest import DigestWorker, DIGEST_INTERVAL_SECONDS
+
+# Cihaz/parametre/gün bazlı dağılım sketch'leri
+from aqi_sketch import SketchWorker, SKETCH_INTERVAL_SECONDS, merge_blobs
 
 # MCP Server instance
 server = Server("airqoon-analyzer")
 
 # Database connections (lazy initialization)
 mongo_client = None
-pg_conn = None
+pg_pool = None
+pg_pool_lock = threading.Lock()
+pg_pool_slots = None
 vector_api = None
 
+# /call_tools batch worker pool
+batch_executor = None
+batch_executor_lock = threading.Lock()
+MCP_BATCH_WORKERS = int(os.getenv("MCP_BATCH_WORKERS", "8"))
+MCP_BATCH_MAX_CALLS = int(os.getenv("MCP_BATCH_MAX_CALLS", "16"))
+
+# Analiz sorgularında cihaz kaynağı: auto (tenant_devices doluysa join, değilse Mongo + ANY),
+# postgres (sadece join) veya mongo (eski davranış)
+TENANT_DEVICES_SOURCE = os.getenv("MCP_TENANT_DEVICES_SOURCE", "auto")
+TENANT_DEVICES_RETRY_SECONDS = 60
+tenant_devices_missing_at = None
+
+# tenant_device_list sayfalama (cursor = TenantSlugName + _id üzerinde index)
+DEVICE_PAGE_DEFAULT = int(os.getenv("MCP_DEVICE_PAGE_SIZE", "100"))
+DEVICE_PAGE_MAX = int(os.getenv("MCP_DEVICE_PAGE_MAX", "500"))
+MONGO_ENSURE_INDEXES = os.getenv("MCP_MONGO_ENSURE_INDEXES", "1") == "1"
+mongo_indexes_ready = False
+mongo_indexes_lock = threading.Lock()
+
+# tenant_distribution_analysis (aqi_daily_sketch merge)
+SKETCH_HISTOGRAM_MAX_BINS = int(os.getenv("MCP_SKETCH_HISTOGRAM_MAX_BINS", "50"))
+
+# tenant_statistics_all sonucu önbelleği (Mongo + Qdrant birleşik)
+TENANT_STATS_CACHE_SECONDS = float(os.getenv("MCP_TENANT_STATS_CACHE_SECONDS", "30"))
+tenant_stats_cache = None
+tenant_stats_cached_at = 0.0
+tenant_stats_lock = threading.Lock()
+
+# Pool boyutu ve plan cache modu (auto | force_generic_plan | force_custom_plan)
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
+PG_PLAN_CACHE_MODE = os.getenv("PG_PLAN_CACHE_MODE", "")
+
+# Pool ve HTTP doluluk metrikleri
+PG_POOL_IN_USE = metrics.registry.gauge("mcp_pg_pool_in_use", "Kullanımdaki PostgreSQL bağlantıları")
+PG_POOL_WAITING = metrics.registry.gauge("mcp_pg_pool_waiting", "Boş PostgreSQL bağlantısı bekleyen istekler")
+metrics.registry.gauge("mcp_pg_pool_max", "PostgreSQL pool kapasitesi", callback=lambda: PG_POOL_MAX)
+HTTP_IN_FLIGHT = metrics.registry.gauge("mcp_http_requests_in_flight", "İşlenmekte olan /call_tool istekleri")
+
 # HTTP readiness flag (used by /healthz). We treat MCP as "ready" once the embedding model warm-up completes.
 _http_ready = threading.Event()
 
@@ -56,24 +136,104 @@ def get_mongo_client():
         mongo_client = MongoClient(mongo_uri)
     return mongo_client
 
-def get_pg_connection():
-    """PostgreSQL connection'ı döndür (singleton)"""
-    global pg_conn
-    if pg_conn is None or pg_conn.closed:
-        pg_host = os.getenv("PGHOST", "localhost")
-        pg_db = os.getenv("PGDATABASE", "airqoon")
-        pg_user = os.getenv("PGUSER", os.getenv("USER", "bhan"))
-        pg_password = os.getenv("PGPASSWORD")
-        pg_port = int(os.getenv("PGPORT", "5432"))
-
-        pg_conn = psycopg2.connect(
-            host=pg_host,
-            database=pg_db,
-            user=pg_user,
-            password=pg_password,
-            port=pg_port
-        )
-    return pg_conn
+def ensure_mongo_indexes():
+    """Cursor sayfalaması için Devices (TenantSlugName, _id) index'i (süreç başına bir kez)"""
+    global mongo_indexes_ready
+    if mongo_indexes_ready or not MONGO_ENSURE_INDEXES:
+        return
+    with mongo_indexes_lock:
+        if mongo_indexes_ready:
+            return
+        try:
+            get_mongo_client()["airqoonBaseMapDB"]["Devices"].create_index(
+                [("TenantSlugName", ASCENDING), ("_id", ASCENDING)],
+                name="tenant_device_cursor",
+                background=True
+            )
+        except Exception as e:
+            # Yetkisi olmayan (read-only) kullanıcıda sorgu yine çalışır, sadece index'siz
+            print(f"⚠️ Devices index'i oluşturulamadı: {e}")
+        mongo_indexes_ready = True
+
+def get_pg_pool() -> ThreadedConnectionPool:
+    """PostgreSQL connection pool'unu döndür (singleton)"""
+    global pg_pool, pg_pool_slots
+    if pg_pool is None:
+        with pg_pool_lock:
+            if pg_pool is None:
+                pg_host = os.getenv("PGHOST", "localhost")
+                pg_db = os.getenv("PGDATABASE", "airqoon")
+                pg_user = os.getenv("PGUSER", os.getenv("USER", "bhan"))
+                pg_password = os.getenv("PGPASSWORD")
+                pg_port = int(os.getenv("PGPORT", "5432"))
+
+                pg_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+                pg_pool = ThreadedConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    host=pg_host,
+                    database=pg_db,
+                    user=pg_user,
+                    password=pg_password,
+                    port=pg_port
+                )
+    return pg_pool
+
+
+@contextmanager
+def pg_connection():
+    """
+    Pool'dan connection al, iş bitince geri bırak.
+    Pool doluysa ThreadedConnectionPool hata fırlatmasın diye slot beklenir.
+    """
+    pool = get_pg_pool()
+    request_deadline = deadline.current()
+    remaining = request_deadline.remaining() if request_deadline else None
+    PG_POOL_WAITING.inc()
+    try:
+        with metrics.stage("pg_pool_wait"):
+            acquired = pg_pool_slots.acquire(timeout=max(remaining, 0) if remaining is not None else None)
+    finally:
+        PG_POOL_WAITING.dec()
+    if not acquired:
+        raise deadline.DeadlineExceeded("deadline")
+    PG_POOL_IN_USE.inc()
+    conn = None
+    statement_timeout = None
+    try:
+        conn = pool.getconn()
+        if conn.closed:
+            sql_registry.forget_connection(conn)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        if not conn.autocommit:
+            # Sadece okuma yapılıyor; "idle in transaction" bağlantı bırakma
+            conn.autocommit = True
+            if PG_PLAN_CACHE_MODE:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET plan_cache_mode = %s", (PG_PLAN_CACHE_MODE,))
+        # Kalan istek süresi -> statement_timeout; iptalde çalışan sorgu conn.cancel() ile durur
+        statement_timeout = deadline.statement_timeout_ms()
+        if statement_timeout is not None:
+            with conn.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", (statement_timeout,))
+        with deadline.on_cancel(conn.cancel):
+            yield conn
+    finally:
+        if conn is not None:
+            if statement_timeout is not None and conn.closed == 0:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("RESET statement_timeout")
+                except psycopg2.Error:
+                    conn.close()
+            broken = conn.closed != 0
+            if broken:
+                sql_registry.forget_connection(conn)
+            pool.putconn(conn, close=broken)
+        PG_POOL_IN_USE.dec()
+        pg_pool_slots.release()
+
 
 def get_vector_api():
     """Vector API instance'ı döndür (singleton)"""
@@ -83,6 +243,138 @@ def get_vector_api():
     return vector_api
 
 
+# Ana analiz sorgusu - her pooled connection'da ilk kullanımda PREPARE edilir
+AQI_RANGE_AGGREGATE = "aqi_range_aggregate"
+sql_registry.register(
+    AQI_RANGE_AGGREGATE,
+    """
+    SELECT 
+        parameter,
+        AVG(concentration) as avg_concentration,
+        MIN(concentration) as min_concentration,
+        MAX(concentration) as max_concentration,
+        COUNT(*) as measurement_count,
+        MAX(concentration_unit) as concentration_unit
+    FROM air_quality_index
+    WHERE device_id = ANY($1)
+        AND calculated_datetime >= $2
+        AND calculated_datetime < $3
+        AND parameter = ANY($4)
+    GROUP BY parameter
+    ORDER BY parameter
+    """,
+    ["varchar[]", "timestamp", "timestamp", "varchar[]"]
+)
+
+
+# tenant_devices üzerinden join: cihaz listesi parametre olarak gönderilmez
+AQI_RANGE_AGGREGATE_BY_TENANT = "aqi_range_aggregate_by_tenant"
+sql_registry.register(
+    AQI_RANGE_AGGREGATE_BY_TENANT,
+    """
+    SELECT 
+        a.parameter,
+        AVG(a.concentration) as avg_concentration,
+        MIN(a.concentration) as min_concentration,
+        MAX(a.concentration) as max_concentration,
+        COUNT(*) as measurement_count,
+        MAX(a.concentration_unit) as concentration_unit
+    FROM tenant_devices td
+    JOIN air_quality_index a ON a.device_id = td.device_id
+    WHERE td.tenant_slug = $1
+        AND a.calculated_datetime >= $2
+        AND a.calculated_datetime < $3
+        AND a.parameter = ANY($4)
+    GROUP BY a.parameter
+    ORDER BY a.parameter
+    """,
+    ["varchar", "timestamp", "timestamp", "varchar[]"]
+)
+
+# aqi_digest.py'nin önceden hesapladığı aylık aggregate'ler; ay kirliyse veya ay bitmeden hesaplandıysa fresh = false
+TENANT_DIGEST_MONTH = "tenant_digest_month"
+sql_registry.register(
+    TENANT_DIGEST_MONTH,
+    """
+    SELECT
+        f.fresh,
+        d.parameter,
+        d.avg_concentration,
+        d.min_concentration,
+        d.max_concentration,
+        d.measurement_count,
+        d.concentration_unit
+    FROM (
+        SELECT
+            EXISTS (
+                SELECT 1 FROM aqi_digest_runs r
+                WHERE r.month = $2 AND r.completed_at >= ($2 + INTERVAL '1 month')
+            )
+            AND NOT EXISTS (SELECT 1 FROM aqi_digest_dirty_months m WHERE m.month = $2) AS fresh
+    ) f
+    LEFT JOIN tenant_monthly_digest d
+        ON f.fresh AND d.tenant_slug = $1 AND d.month = $2 AND d.parameter = ANY($3)
+    ORDER BY d.parameter
+    """,
+    ["varchar", "date", "varchar[]"]
+)
+
+# Günlük DDSketch'ler (aqi_sketch.py); $5 verilirse sadece bu cihazlar.
+# covered_days: parametre için sketch'i olan gün sayısı (istenen gün sayısından azsa sonuç kısmidir)
+SKETCH_RANGE_BY_TENANT = "sketch_range_by_tenant"
+sql_registry.register(
+    SKETCH_RANGE_BY_TENANT,
+    """
+    WITH sketches AS (
+        SELECT s.parameter, s.device_id, s.day, s.concentration_unit, s.sketch
+        FROM tenant_devices td
+        JOIN aqi_daily_sketch s ON s.device_id = td.device_id
+        WHERE td.tenant_slug = $1
+            AND s.day >= $2
+            AND s.day < $3
+            AND s.parameter = ANY($4)
+            AND ($5::varchar[] IS NULL OR s.device_id = ANY($5))
+    ),
+    coverage AS (
+        SELECT parameter, COUNT(DISTINCT day) AS covered_days FROM sketches GROUP BY parameter
+    )
+    SELECT s.parameter, s.device_id, s.concentration_unit, s.sketch, c.covered_days
+    FROM sketches s
+    JOIN coverage c ON c.parameter = s.parameter
+    """,
+    ["varchar", "date", "date", "varchar[]", "varchar[]"]
+)
+
+SKETCH_RANGE_BY_DEVICES = "sketch_range_by_devices"
+sql_registry.register(
+    SKETCH_RANGE_BY_DEVICES,
+    """
+    WITH sketches AS (
+        SELECT parameter, device_id, day, concentration_unit, sketch
+        FROM aqi_daily_sketch
+        WHERE device_id = ANY($1)
+            AND day >= $2
+            AND day < $3
+            AND parameter = ANY($4)
+    ),
+    coverage AS (
+        SELECT parameter, COUNT(DISTINCT day) AS covered_days FROM sketches GROUP BY parameter
+    )
+    SELECT s.parameter, s.device_id, s.concentration_unit, s.sketch, c.covered_days
+    FROM sketches s
+    JOIN coverage c ON c.parameter = s.parameter
+    """,
+    ["varchar[]", "date", "date", "varchar[]"]
+)
+
+TENANT_DEVICE_COUNT = "tenant_device_count"
+sql_registry.register(
+    TENANT_DEVICE_COUNT,
+    "SELECT COUNT(*) AS device_count FROM tenant_devices WHERE tenant_slug = $1",
+    ["varchar"]
+)
+
+
 @server.list_tools()
 async def list_tools() -> List[Tool]:
     """MCP server'ın sağladığı tool'ları listele"""
@@ -148,15 +440,78 @@ async def list_tools() -> List[Tool]:
                 "required": ["tenant_slug", "month1", "month2"]
             }
         ),
+        Tool(
+            name="tenant_distribution_analysis",
+            description="Tenant'ın uzun zaman aralıklarındaki ölçüm dağılımını (medyan, P95 gibi yüzdelikler ve histogram) günlük sketch'leri birleştirerek yaklaşık hesaplar. Örnek: Akçansa'nın 2025 yılı PM10 medyanı ve P95'i.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "tenant_slug": {
+                        "type": "string",
+                        "description": "Tenant slug"
+                    },
+                    "start_date": {
+                        "type": "string",
+                        "description": "Başlangıç tarihi (YYYY-MM-DD, gün bazında)"
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "Bitiş tarihi (YYYY-MM-DD, hariç)"
+                    },
+                    "pollutants": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Kirleticiler (örn: ['PM10', 'PM2.5'])"
+                    },
+                    "device_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Sadece bu cihazlar (opsiyonel, varsayılan: tenant'ın tüm cihazları)"
+                    },
+                    "percentiles": {
+                        "type": "array",
+                        "items": {"type": "number"},
+                        "description": "Yüzdelikler (0-100)",
+                        "default": [50, 90, 95, 99]
+                    },
+                    "histogram_bins": {
+                        "type": "integer",
+                        "description": f"Histogram aralık sayısı (0 = histogram yok, en fazla {SKETCH_HISTOGRAM_MAX_BINS})",
+                        "default": 10
+                    }
+                },
+                "required": ["tenant_slug", "start_date", "end_date"]
+            }
+        ),
         Tool(
             name="tenant_device_list",
-            description="Tenant'a ait cihazları listeler",
+            description="Tenant'a ait cihazları sayfa sayfa listeler (cursor ile)",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "tenant_slug": {
                         "type": "string",
                         "description": "Tenant slug"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"Sayfa boyutu (varsayılan: {DEVICE_PAGE_DEFAULT}, en fazla: {DEVICE_PAGE_MAX})",
+                        "default": DEVICE_PAGE_DEFAULT
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Önceki sayfanın döndürdüğü next_cursor (ilk sayfa için boş)"
+                    },
+                    "telemetry_fields": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Sadece bu LatestTelemetry alanlarını getir (örn: ['PM10', 'NO2']). Boşsa sadece telemetri var/yok bayrağı döner"
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["markdown", "json"],
+                        "description": "Çıktı formatı: markdown (varsayılan) veya kompakt json",
+                        "default": "markdown"
                     }
                 },
                 "required": ["tenant_slug"]
@@ -176,6 +531,26 @@ async def list_tools() -> List[Tool]:
                 "required": ["tenant_slug"]
             }
         ),
+        Tool(
+            name="tenant_statistics_all",
+            description="Tüm tenant'ların istatistiklerini (cihaz sayısı, vector DB point sayısı) tek çağrıda döndürür",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "refresh": {
+                        "type": "boolean",
+                        "description": "Önbelleği atlayıp yeniden hesapla",
+                        "default": False
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["markdown", "json"],
+                        "description": "Çıktı formatı: markdown (varsayılan) veya kompakt json",
+                        "default": "markdown"
+                    }
+                }
+            }
+        ),
         Tool(
             name="save_analysis_to_vector_db",
             description="Analiz sonuçlarını vector database'e kaydet (RAG için). Analiz metnini embedding'e dönüştürüp vector DB'ye kaydeder.",
@@ -199,6 +574,10 @@ async def list_tools() -> List[Tool]:
                         "type": "object",
                         "description": "Ek metadata (örn: tarih, parametreler, vb.)",
                         "default": {}
+                    },
+                    "dedup_threshold": {
+                        "type": "number",
+                        "description": "Near-duplicate eşiği (0-1). Bu skorun üzerinde benzer bir analiz varsa yenisi eklenmez (varsayılan: VECTOR_DEDUP_THRESHOLD)"
                     }
                 },
                 "required": ["tenant_slug", "analysis_text"]
@@ -232,6 +611,11 @@ async def list_tools() -> List[Tool]:
                         "type": "string",
                         "description": "Analiz tipi filter'ı (opsiyonel)",
                         "default": None
+                    },
+                    "search_mode": {
+                        "type": "string",
+                        "enum": ["hybrid", "dense"],
+                        "description": "hybrid: semantic + birebir kelime eşleşmesi (PM2.5-24h, Şubat 2025, cihaz adı), RRF ile birleştirilir; dense: sadece semantic (varsayılan: VECTOR_SEARCH_MODE)"
                     }
                 },
                 "required": ["tenant_slug", "query_text"]
@@ -242,16 +626,42 @@ async def list_tools() -> List[Tool]:
 
 @server.call_tool()
 async def call_tool(name: str, arguments: Any) -> List[TextContent]:
-    """Tool çağrılarını işle"""
+    """Tool çağrılarını işle (süre ve hata metrikleriyle, özdeş eşzamanlı çağrılar birleştirilir)"""
+    with metrics.tool_call(name):
+        request_deadline = deadline.current()
+        result = await singleflight.do(
+            name,
+            arguments,
+            lambda: execute_tool(name, arguments),
+            timeout=request_deadline.remaining() if request_deadline is not None else None
+        )
+        # Handler'lar hataları "❌" ile başlayan metin olarak döndürür
+        if result and getattr(result[0], "text", "").startswith("❌"):
+            metrics.mark_error(name)
+        return result
+
+
+async def execute_tool(name: str, arguments: Any) -> List[TextContent]:
+    """Tool'u gerçekten çalıştır (single-flight lideri)"""
+    with profiler.track_tool_allocations(name):
+        return await dispatch_tool(name, arguments)
+
+
+async def dispatch_tool(name: str, arguments: Any) -> List[TextContent]:
+    """Tool adını ilgili handler'a yönlendir"""
     
     if name == "tenant_time_range_analysis":
         return await handle_time_range_analysis(arguments)
     elif name == "tenant_monthly_comparison":
         return await handle_monthly_comparison(arguments)
+    elif name == "tenant_distribution_analysis":
+        return await handle_distribution_analysis(arguments)
     elif name == "tenant_device_list":
         return await handle_device_list(arguments)
     elif name == "tenant_statistics":
         return await handle_tenant_statistics(arguments)
+    elif name == "tenant_statistics_all":
+        return await handle_tenant_statistics_all(arguments)
     elif name == "save_analysis_to_vector_db":
         return await handle_save_analysis_to_vector_db(arguments)
     elif name == "search_analysis_from_vector_db":
@@ -286,6 +696,78 @@ def normalize_pollutant_names(pollutants: List[str]) -> List[str]:
     return normalized
 
 
+def tenant_device_count(cursor, tenant_slug: str) -> int:
+    """
+    tenant_devices'taki cihaz sayısı. 0 ise çağıran Mongo'ya düşer (auto modda
+    henüz senkronlanmamış tenant veya tablo yok). mongo modunda hiç sorgulanmaz.
+    """
+    global tenant_devices_missing_at
+    if TENANT_DEVICES_SOURCE == "mongo":
+        return 0
+    if tenant_devices_missing_at is not None and time.monotonic() - tenant_devices_missing_at < TENANT_DEVICES_RETRY_SECONDS:
+        return 0
+    try:
+        with metrics.stage("pg_tenant_devices"):
+            rows = sql_registry.execute(cursor, TENANT_DEVICE_COUNT, (tenant_slug,))
+    except psycopg2.Error as e:
+        if e.pgcode != errorcodes.UNDEFINED_TABLE:
+            raise
+        # Sync henüz çalışmadı; Mongo yolunu kullan, bir süre sonra tekrar dene
+        tenant_devices_missing_at = time.monotonic()
+        if TENANT_DEVICES_SOURCE == "postgres":
+            raise
+        return 0
+    tenant_devices_missing_at = None
+    return int(rows[0]["device_count"]) if rows else 0
+
+
+def fetch_tenant_device_ids(tenant_slug: str) -> List[str]:
+    """Mongo Devices'tan tenant cihaz ID'leri (tenant_devices kullanılamadığında)"""
+    if TENANT_DEVICES_SOURCE == "postgres":
+        return []
+    mongo = get_mongo_client()
+    db = mongo["airqoonBaseMapDB"]
+    with metrics.stage("mongo_device_lookup"):
+        devices = list(db["Devices"].find(
+            {"TenantSlugName": tenant_slug},
+            {"DeviceId": 1},
+            **deadline.mongo_kwargs()
+        ))
+    return [d["DeviceId"] for d in devices]
+
+
+def whole_month(start_date: Optional[str], end_date: Optional[str]) -> Optional[str]:
+    """Aralık tam olarak bir takvim ayıysa (YYYY-MM-01 .. sonraki ayın 1'i) ayın ilk günü"""
+    from dateutil.relativedelta import relativedelta
+
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    if start.day != 1 or end != start + relativedelta(months=1):
+        return None
+    return start.strftime("%Y-%m-%d")
+
+
+def fetch_digest_results(cursor, tenant_slug: str, months: List[str], pollutants: List[str]) -> Optional[List[List[Dict]]]:
+    """Tüm aylar için güncel özet varsa ay başına satırlar, yoksa None (canlı aggregate kullanılır)"""
+    results = []
+    try:
+        with metrics.stage("sql_digest"):
+            for month in months:
+                rows = sql_registry.execute(cursor, TENANT_DIGEST_MONTH, (tenant_slug, month, pollutants))
+                if not rows or not rows[0]["fresh"]:
+                    return None
+                results.append([row for row in rows if row["parameter"] is not None])
+    except psycopg2.Error as e:
+        # Özet tabloları henüz oluşturulmamış
+        if e.pgcode != errorcodes.UNDEFINED_TABLE:
+            raise
+        return None
+    return results
+
+
 async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
     """Zaman aralığı analizi"""
     tenant_slug = arguments.get("tenant_slug")
@@ -301,7 +783,8 @@ async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
     # Tenant doğrulama
     mongo = get_mongo_client()
     db = mongo["airqoonBaseMapDB"]
-    tenant = db["Tenants"].find_one({"SlugName": tenant_slug})
+    with metrics.stage("mongo_tenant_lookup"):
+        tenant = db["Tenants"].find_one({"SlugName": tenant_slug}, **deadline.mongo_kwargs())
     
     if not tenant:
         return [TextContent(
@@ -309,58 +792,59 @@ async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
             text=f"❌ Tenant bulunamadı: {tenant_slug}"
         )]
     
-    # MongoDB'den tenant'a ait device'ları al
-    mongo = get_mongo_client()
-    db = mongo["airqoonBaseMapDB"]
-    devices = list(db["Devices"].find(
-        {"TenantSlugName": tenant_slug},
-        {"DeviceId": 1}
-    ))
-    
-    if not devices:
-        return [TextContent(
-            type="text",
-            text=f"⚠️ {tenant_slug} tenant'ına ait cihaz bulunamadı."
-        )]
-    
-    device_ids = [d["DeviceId"] for d in devices]
-    
-    # PostgreSQL'den veri çek
-    conn = get_pg_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
-        # Ana zaman aralığı analizi - device_id bazlı
-        query = """
-            SELECT 
-                parameter,
-                AVG(concentration) as avg_concentration,
-                MIN(concentration) as min_concentration,
-                MAX(concentration) as max_concentration,
-                COUNT(*) as measurement_count,
-                MAX(concentration_unit) as concentration_unit
-            FROM air_quality_index
-            WHERE device_id = ANY(%s)
-                AND calculated_datetime >= %s::timestamp
-                AND calculated_datetime < %s::timestamp
-                AND parameter = ANY(%s)
-            GROUP BY parameter
-            ORDER BY parameter;
-        """
-        
-        cursor.execute(query, (device_ids, start_date, end_date, normalized_pollutants))
-        main_results = cursor.fetchall()
-        
-        # Karşılaştırma zaman aralığı (varsa)
-        comparison_results = None
-        if comparison_start and comparison_end:
-            cursor.execute(query, (device_ids, comparison_start, comparison_end, normalized_pollutants))
-            comparison_results = cursor.fetchall()
+        deadline.check()
+        # PostgreSQL'den veri çek (pooled connection + prepared statement)
+        with metrics.stage("sql_aggregation"), pg_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Senkron tenant_devices varsa tenant_slug ile join, yoksa Mongo'dan cihaz listesi
+                device_count = tenant_device_count(cursor, tenant_slug)
+                if device_count:
+                    query_name, device_param = AQI_RANGE_AGGREGATE_BY_TENANT, tenant_slug
+                else:
+                    device_ids = fetch_tenant_device_ids(tenant_slug)
+                    device_count = len(device_ids)
+                    query_name, device_param = AQI_RANGE_AGGREGATE, device_ids
+                
+                if not device_count:
+                    return [TextContent(
+                        type="text",
+                        text=f"⚠️ {tenant_slug} tenant'ına ait cihaz bulunamadı."
+                    )]
+                
+                # Tam ay aralıkları önceden hesaplanmış aylık özetlerden (aqi_digest.py)
+                digest_results = None
+                if query_name == AQI_RANGE_AGGREGATE_BY_TENANT:
+                    months = [whole_month(start_date, end_date)]
+                    if comparison_start and comparison_end:
+                        months.append(whole_month(comparison_start, comparison_end))
+                    if all(months):
+                        digest_results = fetch_digest_results(cursor, tenant_slug, months, normalized_pollutants)
+                
+                if digest_results is not None:
+                    main_results = digest_results[0]
+                    comparison_results = digest_results[1] if len(digest_results) > 1 else None
+                else:
+                    # Ana zaman aralığı analizi
+                    main_results = sql_registry.execute(
+                        cursor,
+                        query_name,
+                        (device_param, start_date, end_date, normalized_pollutants)
+                    )
+                    
+                    # Karşılaştırma zaman aralığı (varsa)
+                    comparison_results = None
+                    if comparison_start and comparison_end:
+                        comparison_results = sql_registry.execute(
+                            cursor,
+                            query_name,
+                            (device_param, comparison_start, comparison_end, normalized_pollutants)
+                        )
         
         # Sonuçları formatla
         result_text = f"# {tenant.get('Name', tenant_slug)} - Zaman Aralığı Analizi\n\n"
         result_text += f"**Tenant:** {tenant_slug}\n"
-        result_text += f"**Analiz Edilen Cihaz Sayısı:** {len(device_ids)}\n"
+        result_text += f"**Analiz Edilen Cihaz Sayısı:** {device_count}\n"
         result_text += f"**Analiz Tarihi:** {start_date} - {end_date}\n"
         if comparison_start and comparison_end:
             result_text += f"**Karşılaştırma Tarihi:** {comparison_start} - {comparison_end}\n"
@@ -404,6 +888,7 @@ async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
                     result_text += "\n"
         
         # Vector DB'ye otomatik kaydet
+        deadline.check()
         vector_api = get_vector_api()
         try:
             analysis_metadata = {
@@ -411,7 +896,8 @@ async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
                 "start_date": start_date,
                 "end_date": end_date,
                 "tenant_name": tenant.get('Name', tenant_slug),
-                "device_count": len(device_ids)
+                "device_count": device_count,
+                "pollutants": normalized_pollutants
             }
             # Karşılaştırma tarihlerini sadece varsa ekle
             if comparison_start and comparison_end:
@@ -432,12 +918,12 @@ async def handle_time_range_analysis(arguments: Dict) -> List[TextContent]:
         return [TextContent(type="text", text=result_text)]
         
     except Exception as e:
+        # statement_timeout / conn.cancel() kaynaklı hatalar iptal olarak yukarı taşınır
+        deadline.check()
         return [TextContent(
             type="text",
             text=f"❌ Hata: {str(e)}"
         )]
-    finally:
-        cursor.close()
 
 
 async def handle_monthly_comparison(arguments: Dict) -> List[TextContent]:
@@ -481,29 +967,275 @@ async def handle_monthly_comparison(arguments: Dict) -> List[TextContent]:
     })
 
 
-async def handle_device_list(arguments: Dict) -> List[TextContent]:
-    """Tenant'a ait cihazları listele"""
+def requested_day_count(start_date: str, end_date: str) -> Optional[int]:
+    """[start, end) aralığındaki gün sayısı; tarihler çözülemezse None"""
+    try:
+        start = datetime.strptime(str(start_date)[:10], "%Y-%m-%d").date()
+        end = datetime.strptime(str(end_date)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    return max((end - start).days, 0)
+
+
+async def handle_distribution_analysis(arguments: Dict) -> List[TextContent]:
+    """Günlük sketch'leri birleştirerek yüzdelik ve histogram (ham satır taranmaz)"""
     tenant_slug = arguments.get("tenant_slug")
+    start_date = arguments.get("start_date")
+    end_date = arguments.get("end_date")
+    pollutants = arguments.get("pollutants") or ["PM10", "PM2.5"]
+    requested_devices = arguments.get("device_ids") or None
+    percentiles = arguments.get("percentiles") or [50, 90, 95, 99]
+    histogram_bins = arguments.get("histogram_bins", 10)
+
+    try:
+        percentiles = sorted({float(p) for p in percentiles})
+        histogram_bins = int(histogram_bins or 0)
+    except (TypeError, ValueError):
+        return [TextContent(type="text", text="❌ Hata: percentiles sayı listesi, histogram_bins tam sayı olmalı")]
+    if any(p < 0 or p > 100 for p in percentiles):
+        return [TextContent(type="text", text="❌ Hata: percentiles 0-100 arasında olmalı")]
+    histogram_bins = min(max(histogram_bins, 0), SKETCH_HISTOGRAM_MAX_BINS)
+
+    normalized_pollutants = normalize_pollutant_names(pollutants)
+
+    mongo = get_mongo_client()
+    db = mongo["airqoonBaseMapDB"]
+    with metrics.stage("mongo_tenant_lookup"):
+        tenant = db["Tenants"].find_one({"SlugName": tenant_slug}, **deadline.mongo_kwargs())
+
+    if not tenant:
+        return [TextContent(
+            type="text",
+            text=f"❌ Tenant bulunamadı: {tenant_slug}"
+        )]
+
+    try:
+        deadline.check()
+        with metrics.stage("sql_sketch_fetch"), pg_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                device_count = tenant_device_count(cursor, tenant_slug)
+                if device_count:
+                    rows = sql_registry.execute(
+                        cursor,
+                        SKETCH_RANGE_BY_TENANT,
+                        (tenant_slug, start_date, end_date, normalized_pollutants, requested_devices)
+                    )
+                else:
+                    device_ids = fetch_tenant_device_ids(tenant_slug)
+                    if requested_devices:
+                        # Başka tenant'ın cihazları sorgulanamaz
+                        allowed = set(requested_devices)
+                        device_ids = [d for d in device_ids if d in allowed]
+                    device_count = len(device_ids)
+                    if not device_count:
+                        return [TextContent(
+                            type="text",
+                            text=f"⚠️ {tenant_slug} tenant'ına ait cihaz bulunamadı."
+                        )]
+                    rows = sql_registry.execute(
+                        cursor,
+                        SKETCH_RANGE_BY_DEVICES,
+                        (device_ids, start_date, end_date, normalized_pollutants)
+                    )
+
+        deadline.check()
+        with metrics.stage("sketch_merge"):
+            blobs_by_parameter: Dict[str, List] = {}
+            devices_by_parameter: Dict[str, set] = {}
+            covered_days: Dict[str, int] = {}
+            units: Dict[str, str] = {}
+            for row in rows:
+                blobs_by_parameter.setdefault(row["parameter"], []).append(row["sketch"])
+                devices_by_parameter.setdefault(row["parameter"], set()).add(row["device_id"])
+                covered_days[row["parameter"]] = row["covered_days"]
+                if row.get("concentration_unit"):
+                    units[row["parameter"]] = row["concentration_unit"]
+            merged = {parameter: merge_blobs(blobs) for parameter, blobs in sorted(blobs_by_parameter.items())}
+
+        result_text = f"# {tenant.get('Name', tenant_slug)} - Dağılım Analizi\n\n"
+        result_text += f"**Tenant:** {tenant_slug}\n"
+        result_text += f"**Analiz Tarihi:** {start_date} - {end_date} (gün bazında)\n"
+        if requested_devices:
+            result_text += f"**Cihazlar:** {', '.join(requested_devices)}\n"
+        result_text += "\n"
+
+        if not merged:
+            result_text += "⚠️ Bu zaman aralığı için sketch bulunamadı (python3 aqi_sketch.py build --start ... --end ...).\n"
+            return [TextContent(type="text", text=result_text)]
+
+        requested_days = requested_day_count(start_date, end_date)
+        partial = [p for p in merged if requested_days and covered_days[p] < requested_days]
+        if partial:
+            # Sketch'i olmayan günler (worker kapalı / backfill yapılmamış / ölçüm yok) yüzdeliklere girmez
+            result_text += (
+                f"⚠️ Kısmi kapsam: {', '.join(partial)} için {requested_days} günün sadece bir kısmının sketch'i var; "
+                f"sonuçlar yalnızca bu günleri yansıtır (python3 aqi_sketch.py build --start {start_date} --end {end_date}).\n\n"
+            )
+
+        for parameter, sketch in merged.items():
+            unit = units.get(parameter) or "µg/m³"
+            accuracy = sketch.relative_accuracy * 100
+            result_text += f"## {parameter}\n"
+            if requested_days:
+                result_text += f"- Kapsanan Gün: {covered_days[parameter]} / {requested_days}\n"
+            result_text += f"- Cihaz Sayısı: {len(devices_by_parameter[parameter])}\n"
+            result_text += f"- Ölçüm Sayısı: {sketch.count}\n"
+            result_text += f"- Ortalama: {sketch.mean:.2f} {unit}\n"
+            result_text += f"- Minimum: {sketch.min:.2f} {unit}\n"
+            result_text += f"- Maksimum: {sketch.max:.2f} {unit}\n"
+            for pct, value in zip(percentiles, sketch.quantiles([p / 100 for p in percentiles])):
+                label = f"P{pct:g}" + (" (medyan)" if pct == 50 else "")
+                result_text += f"- {label}: ~{value:.2f} {unit} (±%{accuracy:g})\n"
+            result_text += "\n"
+
+            histogram = sketch.histogram(histogram_bins)
+            if histogram:
+                result_text += f"### {parameter} Histogram\n\n"
+                result_text += "| Aralık | Ölçüm | Oran |\n"
+                result_text += "|---|---:|---:|\n"
+                for lower, upper, count in histogram:
+                    result_text += f"| {lower:.2f} - {upper:.2f} | {count} | {count / sketch.count * 100:.1f}% |\n"
+                result_text += "\n"
+
+        return [TextContent(type="text", text=result_text)]
+
+    except Exception as e:
+        # statement_timeout / conn.cancel() kaynaklı hatalar iptal olarak yukarı taşınır
+        deadline.check()
+        return [TextContent(
+            type="text",
+            text=f"❌ Hata: {str(e)}"
+        )]
+
+
+def encode_device_cursor(tenant_slug: str, last_id: ObjectId) -> str:
+    raw = json.dumps({"t": tenant_slug, "a": str(last_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_device_cursor(cursor: str, tenant_slug: str) -> ObjectId:
+    """Cursor'ı çöz; başka tenant'a ait veya bozuk cursor'da ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = ObjectId(data["a"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Geçersiz cursor: {e}")
+    if data.get("t") != tenant_slug:
+        raise ValueError("Cursor başka bir tenant'a ait")
+    return last_id
+
+
+def fetch_device_page(
+    tenant_slug: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    telemetry_fields: Optional[List[str]] = None
+) -> Dict:
+    """
+    (TenantSlugName, _id) index'i üzerinde keyset sayfalama.
+    LatestTelemetry hiçbir zaman bütün olarak çekilmez: sunucu tarafında sadece
+    var/yok bayrağı ve istenen alanlar hesaplanır.
+    """
+    ensure_mongo_indexes()
+    match = {"TenantSlugName": tenant_slug}
+    if cursor:
+        match["_id"] = {"$gt": decode_device_cursor(cursor, tenant_slug)}
+    
+    projection = {
+        "_id": 1,
+        "DeviceId": 1,
+        "Name": 1,
+        "Label": 1,
+        # Eksik/null alan BSON sıralamasında null'a eşittir
+        "has_telemetry": {"$gt": ["$LatestTelemetry", None]},
+    }
+    if telemetry_fields:
+        # Noktalı anahtarlar (örn: "PM2.5-24h") için projection yerine $objectToArray filtresi
+        projection["telemetry"] = {
+            "$arrayToObject": {
+                "$filter": {
+                    "input": {"$objectToArray": {"$ifNull": ["$LatestTelemetry", {}]}},
+                    "cond": {"$in": ["$$this.k", [str(field) for field in telemetry_fields]]}
+                }
+            }
+        }
     
     mongo = get_mongo_client()
     db = mongo["airqoonBaseMapDB"]
+    max_time_ms = deadline.mongo_max_time_ms()
+    with metrics.stage("mongo_device_list"):
+        devices = list(db["Devices"].aggregate(
+            [
+                {"$match": match},
+                {"$sort": {"_id": 1}},
+                # Bir fazlası: sonraki sayfa var mı
+                {"$limit": limit + 1},
+                {"$project": projection},
+            ],
+            **({"maxTimeMS": max_time_ms} if max_time_ms else {})
+        ))
     
-    devices = list(db["Devices"].find(
-        {"TenantSlugName": tenant_slug},
-        {"DeviceId": 1, "Name": 1, "Label": 1, "LatestTelemetry": 1}
-    ).limit(100))
+    next_cursor = None
+    if len(devices) > limit:
+        devices = devices[:limit]
+        next_cursor = encode_device_cursor(tenant_slug, devices[-1]["_id"])
+    return {"devices": devices, "next_cursor": next_cursor}
+
+
+async def handle_device_list(arguments: Dict) -> List[TextContent]:
+    """Tenant'a ait cihazları sayfa sayfa listele"""
+    tenant_slug = arguments.get("tenant_slug")
+    output_format = arguments.get("format") or "markdown"
+    telemetry_fields = arguments.get("telemetry_fields") or []
+    try:
+        limit = int(arguments.get("limit") or DEVICE_PAGE_DEFAULT)
+    except (TypeError, ValueError):
+        return [TextContent(type="text", text="❌ limit bir tam sayı olmalı")]
+    limit = max(1, min(limit, DEVICE_PAGE_MAX))
+    if not isinstance(telemetry_fields, list):
+        return [TextContent(type="text", text="❌ telemetry_fields bir liste olmalı")]
+    
+    try:
+        page = fetch_device_page(tenant_slug, limit, arguments.get("cursor"), telemetry_fields)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"❌ {e}")]
+    devices = page["devices"]
+    
+    if output_format == "json":
+        compact = {
+            "tenant_slug": tenant_slug,
+            "count": len(devices),
+            "next_cursor": page["next_cursor"],
+            "devices": [
+                {
+                    "device_id": device.get("DeviceId"),
+                    "name": device.get("Name"),
+                    "label": device.get("Label"),
+                    "has_telemetry": bool(device.get("has_telemetry")),
+                    **({"telemetry": device.get("telemetry") or {}} if telemetry_fields else {})
+                }
+                for device in devices
+            ]
+        }
+        return [TextContent(type="text", text=json.dumps(compact, ensure_ascii=False, separators=(",", ":"), default=str))]
     
     result_text = f"# {tenant_slug} - Cihaz Listesi\n\n"
-    result_text += f"**Toplam Cihaz:** {len(devices)}\n\n"
+    result_text += f"**Bu Sayfadaki Cihaz:** {len(devices)}\n\n"
     
     for device in devices:
         result_text += f"## {device.get('Name', 'Unknown')}\n"
         result_text += f"- Device ID: {device.get('DeviceId')}\n"
         result_text += f"- Label: {device.get('Label', 'N/A')}\n"
-        if device.get('LatestTelemetry'):
+        if device.get('has_telemetry'):
             result_text += f"- Son Telemetri: Mevcut\n"
+        for field, value in (device.get('telemetry') or {}).items():
+            result_text += f"  - {field}: {value}\n"
         result_text += "\n"
     
+    if page["next_cursor"]:
+        result_text += f"**Sonraki Sayfa (cursor):** `{page['next_cursor']}`\n"
+    
     return [TextContent(type="text", text=result_text)]
 
 
@@ -514,17 +1246,27 @@ async def handle_tenant_statistics(arguments: Dict) -> List[TextContent]:
     mongo = get_mongo_client()
     db = mongo["airqoonBaseMapDB"]
     
-    tenant = db["Tenants"].find_one({"SlugName": tenant_slug})
+    with metrics.stage("mongo_tenant_lookup"):
+        tenant = db["Tenants"].find_one({"SlugName": tenant_slug}, **deadline.mongo_kwargs())
     if not tenant:
         return [TextContent(type="text", text=f"❌ Tenant bulunamadı: {tenant_slug}")]
     
-    device_count = db["Devices"].count_documents({"TenantSlugName": tenant_slug})
+    with metrics.stage("mongo_device_count"):
+        max_time_ms = deadline.mongo_max_time_ms()
+        device_count = db["Devices"].count_documents(
+            {"TenantSlugName": tenant_slug},
+            **({"maxTimeMS": max_time_ms} if max_time_ms else {})
+        )
     
     # Vector DB istatistikleri
     vector_api = get_vector_api()
     try:
-        vector_stats = vector_api.get_collection_stats(tenant_slug)
+        deadline.check()
+        with metrics.stage("qdrant_collection_stats"):
+            vector_stats = vector_api.get_collection_stats(tenant_slug)
         vector_points = vector_stats.get("points_count", 0)
+    except deadline.DeadlineExceeded:
+        raise
     except:
         vector_points = 0
     
@@ -537,17 +1279,109 @@ async def handle_tenant_statistics(arguments: Dict) -> List[TextContent]:
     return [TextContent(type="text", text=result_text)]
 
 
+def collect_all_tenant_statistics() -> List[Dict]:
+    """
+    Tüm tenant'lar için istatistikler: Tenants tek find, cihaz sayıları tek $group
+    aggregation, vector point sayıları tek collection listesi + paralel get_collection.
+    """
+    mongo = get_mongo_client()
+    db = mongo["airqoonBaseMapDB"]
+    
+    with metrics.stage("mongo_tenant_lookup"):
+        tenants = list(db["Tenants"].find(
+            {},
+            {"_id": 0, "SlugName": 1, "Name": 1, "IsPublic": 1},
+            **deadline.mongo_kwargs()
+        ))
+    
+    with metrics.stage("mongo_device_count"):
+        max_time_ms = deadline.mongo_max_time_ms()
+        device_counts = {
+            row["_id"]: row["count"]
+            for row in db["Devices"].aggregate(
+                [{"$group": {"_id": "$TenantSlugName", "count": {"$sum": 1}}}],
+                **({"maxTimeMS": max_time_ms} if max_time_ms else {})
+            )
+        }
+    
+    slugs = [tenant["SlugName"] for tenant in tenants if tenant.get("SlugName")]
+    try:
+        deadline.check()
+        vector_stats = get_vector_api().get_all_collection_stats(slugs)
+    except deadline.DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ Vector DB istatistikleri alınamadı: {e}")
+        vector_stats = {}
+    
+    return [
+        {
+            "tenant_slug": tenant["SlugName"],
+            "name": tenant.get("Name") or tenant["SlugName"],
+            "device_count": device_counts.get(tenant["SlugName"], 0),
+            "vector_points": vector_stats.get(tenant["SlugName"], {}).get("points_count", 0),
+            "is_public": bool(tenant.get("IsPublic")),
+        }
+        for tenant in sorted(tenants, key=lambda t: t.get("SlugName") or "")
+        if tenant.get("SlugName")
+    ]
+
+
+def get_all_tenant_statistics(refresh: bool = False) -> List[Dict]:
+    """collect_all_tenant_statistics sonucunu TENANT_STATS_CACHE_SECONDS boyunca önbellekten döndür"""
+    global tenant_stats_cache, tenant_stats_cached_at
+    with tenant_stats_lock:
+        fresh = time.monotonic() - tenant_stats_cached_at < TENANT_STATS_CACHE_SECONDS
+        if tenant_stats_cache is not None and fresh and not refresh:
+            return tenant_stats_cache
+    stats = collect_all_tenant_statistics()
+    with tenant_stats_lock:
+        tenant_stats_cache = stats
+        tenant_stats_cached_at = time.monotonic()
+    return stats
+
+
+async def handle_tenant_statistics_all(arguments: Dict) -> List[TextContent]:
+    """Tüm tenant'ların istatistikleri (admin Tenants sayfası için tek çağrı)"""
+    arguments = arguments or {}
+    stats = get_all_tenant_statistics(bool(arguments.get("refresh")))
+    
+    if (arguments.get("format") or "markdown") == "json":
+        compact = {
+            "count": len(stats),
+            "total_devices": sum(item["device_count"] for item in stats),
+            "total_vector_points": sum(item["vector_points"] for item in stats),
+            "tenants": stats
+        }
+        return [TextContent(type="text", text=json.dumps(compact, ensure_ascii=False, separators=(",", ":"), default=str))]
+    
+    result_text = "# Tüm Tenant'lar - İstatistikler\n\n"
+    result_text += f"**Tenant Sayısı:** {len(stats)}\n"
+    result_text += f"**Toplam Cihaz:** {sum(item['device_count'] for item in stats)}\n"
+    result_text += f"**Toplam Vector DB Points:** {sum(item['vector_points'] for item in stats)}\n\n"
+    result_text += "| Tenant Slug | Ad | Cihaz Sayısı | Vector DB Points | Public |\n"
+    result_text += "|---|---|---|---|---|\n"
+    for item in stats:
+        name = str(item["name"]).replace("|", "/")
+        public = "Evet" if item["is_public"] else "Hayır"
+        result_text += f"| {item['tenant_slug']} | {name} | {item['device_count']} | {item['vector_points']} | {public} |\n"
+    
+    return [TextContent(type="text", text=result_text)]
+
+
 async def handle_save_analysis_to_vector_db(arguments: Dict) -> List[TextContent]:
     """Analiz sonuçlarını vector database'e kaydet"""
     tenant_slug = arguments.get("tenant_slug")
     analysis_text = arguments.get("analysis_text")
     analysis_type = arguments.get("analysis_type", "analysis")
     metadata = arguments.get("metadata", {})
+    dedup_threshold = arguments.get("dedup_threshold")
     
     # Tenant doğrulama
     mongo = get_mongo_client()
     db = mongo["airqoonBaseMapDB"]
-    tenant = db["Tenants"].find_one({"SlugName": tenant_slug})
+    with metrics.stage("mongo_tenant_lookup"):
+        tenant = db["Tenants"].find_one({"SlugName": tenant_slug}, **deadline.mongo_kwargs())
     
     if not tenant:
         return [TextContent(
@@ -567,7 +1401,8 @@ async def handle_save_analysis_to_vector_db(arguments: Dict) -> List[TextContent
         vector_id = vector_api.save_analysis(
             tenant_slug=tenant_slug,
             analysis_text=analysis_text,
-            analysis_metadata=analysis_metadata
+            analysis_metadata=analysis_metadata,
+            dedup_threshold=dedup_threshold
         )
         
         result_text = f"# Analiz Vector DB'ye Kaydedildi\n\n"
@@ -581,6 +1416,7 @@ async def handle_save_analysis_to_vector_db(arguments: Dict) -> List[TextContent
         return [TextContent(type="text", text=result_text)]
         
     except Exception as e:
+        deadline.check()
         return [TextContent(
             type="text",
             text=f"❌ Hata: {str(e)}\n\nNot: sentence-transformers yüklü mü? pip install sentence-transformers"
@@ -594,11 +1430,13 @@ async def handle_search_analysis_from_vector_db(arguments: Dict) -> List[TextCon
     limit = arguments.get("limit", 5)
     score_threshold = arguments.get("score_threshold", 0.5)
     filter_type = arguments.get("filter_type")
+    search_mode = arguments.get("search_mode")
     
     # Tenant doğrulama
     mongo = get_mongo_client()
     db = mongo["airqoonBaseMapDB"]
-    tenant = db["Tenants"].find_one({"SlugName": tenant_slug})
+    with metrics.stage("mongo_tenant_lookup"):
+        tenant = db["Tenants"].find_one({"SlugName": tenant_slug}, **deadline.mongo_kwargs())
     
     if not tenant:
         return [TextContent(
@@ -619,12 +1457,17 @@ async def handle_search_analysis_from_vector_db(arguments: Dict) -> List[TextCon
             query_text=query_text,
             limit=limit,
             score_threshold=score_threshold,
-            filter_metadata=filter_metadata
+            filter_metadata=filter_metadata,
+            mode=search_mode
         )
+        # Hybrid aramada skor RRF (sıra) skorudur, cosine benzerlik değil
+        hybrid = bool(results) and results[0].get("search_mode") == "hybrid"
+        score_label = "RRF Score" if hybrid else "Similarity"
         
         result_text = f"# RAG Arama Sonuçları\n\n"
         result_text += f"**Tenant:** {tenant_slug}\n"
         result_text += f"**Sorgu:** {query_text}\n"
+        result_text += f"**Arama Modu:** {'hybrid (dense + lexical, RRF)' if hybrid else 'dense'}\n"
         result_text += f"**Bulunan Sonuç:** {len(results)} adet\n\n"
         
         if not results:
@@ -639,16 +1482,20 @@ async def handle_search_analysis_from_vector_db(arguments: Dict) -> List[TextCon
                 analysis_type = payload.get("analysis_type", "unknown")
                 created_at = payload.get("created_at", "N/A")
                 
-                result_text += f"### {i}. Sonuç (Similarity: {score:.3f})\n\n"
+                result_text += f"### {i}. Sonuç ({score_label}: {score:.3f})\n\n"
                 result_text += f"**Analiz Tipi:** {analysis_type}\n"
                 result_text += f"**Oluşturulma Tarihi:** {created_at}\n"
-                result_text += f"**Similarity Score:** {score:.3f}\n\n"
+                result_text += f"**{score_label}:** {score:.3f}\n"
+                if result.get("matched_section"):
+                    result_text += f"**Eşleşen Bölüm:** {result['matched_section']}\n"
+                result_text += "\n"
                 result_text += f"**Analiz Metni:**\n```\n{text[:500]}{'...' if len(text) > 500 else ''}\n```\n\n"
                 result_text += "---\n\n"
         
         return [TextContent(type="text", text=result_text)]
         
     except Exception as e:
+        deadline.check()
         return [TextContent(
             type="text",
             text=f"❌ Hata: {str(e)}\n\nNot: sentence-transformers yüklü mü? pip install sentence-transformers"
@@ -685,6 +1532,68 @@ async def main():
         sys.exit(1)
 
 
+def get_batch_executor() -> ThreadPoolExecutor:
+    """/call_tools için paylaşılan worker pool (singleton)"""
+    global batch_executor
+    if batch_executor is None:
+        with batch_executor_lock:
+            if batch_executor is None:
+                batch_executor = ThreadPoolExecutor(max_workers=MCP_BATCH_WORKERS, thread_name_prefix="mcp-batch")
+    return batch_executor
+
+
+async def _call_tool_cancellable(tool_name: str, arguments: Dict, request_deadline) -> List[TextContent]:
+    """Deadline iptal edildiğinde (süre doldu / istemci koptu) tool task'ını da iptal et"""
+    if request_deadline is None:
+        return await call_tool(tool_name, arguments)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    with request_deadline.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel)):
+        return await call_tool(tool_name, arguments)
+
+
+def run_tool_sync(
+    tool_name: str,
+    arguments: Dict,
+    want_timings: bool = False,
+    request_deadline: Optional[deadline.RequestDeadline] = None
+) -> Dict:
+    """
+    Tool'u kendi event loop'unda senkron çalıştır ve HTTP yanıtına uygun sonuç döndür.
+    Her çağrı ayrı contextvars context'inde çalışır (worker thread'ler arasında zamanlama sızmaz).
+    request_deadline verilirse süre dolduğunda/istemci koptuğunda çağrı iptal edilir
+    (status="cancelled", reason="deadline" | "client_disconnected").
+    Çağrı önce admission kontrolünden geçer; kapasite yoksa status="rejected" + retry_after döner.
+    """
+    tenant_slug = arguments.get("tenant_slug") if isinstance(arguments, dict) else None
+
+    def _run() -> Dict:
+        timings = metrics.start_request_timings() if want_timings else None
+        deadline.activate(request_deadline)
+        started = time.perf_counter()
+        try:
+            if request_deadline is not None:
+                request_deadline.check()
+            with admission.admit(tool_name, tenant_slug, request_deadline.remaining() if request_deadline else None):
+                result = asyncio.run(_call_tool_cancellable(tool_name, arguments, request_deadline))
+            text = "\n".join([c.text for c in result if getattr(c, "type", None) == "text"]) if result else ""
+            outcome = {"status": "ok", "text": text}
+        except AdmissionRejected as e:
+            outcome = {"status": "rejected", "error": str(e), "reason": e.reason, "retry_after": e.retry_after}
+        except (deadline.DeadlineExceeded, asyncio.CancelledError) as e:
+            reason = getattr(e, "reason", None) or (request_deadline.reason if request_deadline else None) or "deadline"
+            deadline.record_cancellation(tool_name, reason)
+            outcome = {"status": "cancelled", "error": f"İstek iptal edildi: {reason}", "reason": reason}
+        except Exception as e:
+            outcome = {"status": "error", "error": str(e)}
+        outcome["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        if timings is not None:
+            outcome["stages"] = timings
+        return outcome
+
+    return contextvars.copy_context().run(_run)
+
+
 def run_http_server():
     app = Flask(__name__)
 
@@ -698,21 +1607,222 @@ def run_http_server():
             return jsonify({"status": "starting"}), 503
         return jsonify({"status": "ok"})
 
+    @app.get("/sql_stats")
+    def sql_stats():
+        return jsonify(sql_registry.get_stats())
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    def _admin_authorized() -> bool:
+        # Admin endpoint'leri sadece MCP_ADMIN_TOKEN tanımlıysa ve header eşleşirse açılır
+        token = os.getenv("MCP_ADMIN_TOKEN")
+        provided = request.headers.get("X-Admin-Token", "")
+        return bool(token) and hmac.compare_digest(provided, token)
+
+    def _profile_response(session):
+        if request.args.get("format", "collapsed") == "json":
+            return jsonify({**session.summary(), "collapsed": session.collapsed()})
+        response = Response(session.collapsed(), mimetype="text/plain")
+        response.headers["X-Profile-Samples"] = str(session.samples)
+        return response
+
+    @app.post("/admin/profile")
+    def admin_profile():
+        """
+        ?seconds=N&interval_ms=10&allocations=1&format=collapsed|json&mode=run|start
+        mode=run: N saniye örnekler ve collapsed stack döndürür
+        mode=start: arka planda başlatır, sonuç /admin/profile/stop ile alınır
+        """
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+
+        try:
+            seconds = float(request.args.get("seconds", "10"))
+            interval_ms = float(request.args.get("interval_ms", "10"))
+        except ValueError:
+            return jsonify({"error": "seconds ve interval_ms sayı olmalı"}), 400
+        allocations = request.args.get("allocations") == "1"
+
+        try:
+            if request.args.get("mode", "run") == "start":
+                session = profiler.start(seconds, interval_ms, allocations)
+                return jsonify(session.summary()), 202
+            session = profiler.run(seconds, interval_ms, allocations)
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+        return _profile_response(session)
+
+    @app.post("/admin/profile/stop")
+    def admin_profile_stop():
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        session = profiler.stop()
+        if session is None:
+            return jsonify({"error": "aktif profil oturumu yok"}), 404
+        return _profile_response(session)
+
+    @app.get("/admin/query_cache")
+    def admin_query_cache():
+        """Semantic query cache: hit oranı, bellek, tenant kayıtları ve son false-hit denetimleri"""
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        return jsonify(query_cache.stats())
+
+    @app.get("/admin/embedding_model")
+    def admin_embedding_model():
+        """Embedding model residency: bellekteki modeller, boyut, son yükleme süresi/kaynağı, idle süresi"""
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        from embedding_utils import model_manager
+        return jsonify(model_manager.status())
+
+    @app.post("/admin/embedding_model/unload")
+    def admin_embedding_model_unload():
+        """?model=... (varsayılan: etkin model); kullanımdaysa 409"""
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        from embedding_utils import model_manager, get_embedding_model_name
+        model_name = request.args.get("model") or get_embedding_model_name()
+        if not model_manager.unload(model_name):
+            return jsonify({"error": f"model bellekte değil veya kullanımda: {model_name}"}), 409
+        return jsonify(model_manager.status())
+
+    def _request_deadline() -> Optional[deadline.RequestDeadline]:
+        # X-Request-Timeout-Ms / X-Request-Deadline + istemci bağlantı kontrolü
+        timeout = deadline.timeout_from_headers(request.headers)
+        is_disconnected = deadline.disconnect_probe(request.environ)
+        if timeout is None and is_disconnected is None:
+            return None
+        return deadline.RequestDeadline(timeout)
+
+    def _watch(request_deadline: Optional[deadline.RequestDeadline]):
+        if request_deadline is None:
+            return nullcontext()
+        return deadline.Watchdog(request_deadline, deadline.disconnect_probe(request.environ))
+
+    def _cancelled_status(reason: Optional[str]) -> int:
+        # 499: istemci bağlantıyı kapattı (nginx konvansiyonu), 504: süre doldu
+        return 499 if reason == "client_disconnected" else 504
+
     @app.post("/call_tool")
     def call_tool_http():
         payload = request.get_json(silent=True) or {}
         tool_name = payload.get("tool")
         arguments = payload.get("arguments") or {}
+        # Opsiyonel aşama dökümü: {"timings": true} veya X-Timing-Breakdown: 1
+        want_timings = bool(payload.get("timings")) or request.headers.get("X-Timing-Breakdown") == "1"
 
         if not tool_name:
             return jsonify({"error": "tool is required"}), 400
 
+        request_deadline = _request_deadline()
+        HTTP_IN_FLIGHT.inc()
         try:
-            result = asyncio.run(call_tool(tool_name, arguments))
-            text = "\n".join([c.text for c in result if getattr(c, "type", None) == "text"]) if result else ""
-            return jsonify({"text": text})
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+            with _watch(request_deadline):
+                outcome = run_tool_sync(tool_name, arguments, want_timings, request_deadline)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+
+        if outcome["status"] == "rejected":
+            response = jsonify({"error": outcome["error"], "reason": outcome["reason"], "retry_after": outcome["retry_after"]})
+            response.headers["Retry-After"] = str(outcome["retry_after"])
+            return response, 429
+        if outcome["status"] == "cancelled":
+            return jsonify({"error": outcome["error"], "reason": outcome["reason"]}), _cancelled_status(outcome["reason"])
+        if outcome["status"] != "ok":
+            return jsonify({"error": outcome["error"]}), 500
+        response = {"text": outcome["text"]}
+        if want_timings:
+            response["timings"] = {"total_ms": outcome["elapsed_ms"], "stages": outcome["stages"]}
+        return jsonify(response)
+
+    @app.post("/call_tools")
+    def call_tools_http():
+        """
+        Batch: {"calls": [{"tool": "...", "arguments": {...}, "timeout_ms": 4000}, ...], "timings": false}
+        Çağrılar sunucuda eşzamanlı çalışır, sonuçlar aynı sırayla döner.
+        Deadline tüm batch için ortaktır; timeout_ms verilen çağrı ayrıca kendi (daha kısa) süresiyle sınırlanır
+        ve batch yanıtı onu bu süreden fazla beklemez (best-effort RAG araması asıl çağrıyı geciktirmesin).
+        Süresi dolan çağrılar status="cancelled", admission'dan geçemeyenler status="rejected" + retry_after döner.
+        """
+        payload = request.get_json(silent=True) or {}
+        calls = payload.get("calls")
+        want_timings = bool(payload.get("timings")) or request.headers.get("X-Timing-Breakdown") == "1"
+
+        if not isinstance(calls, list) or not calls:
+            return jsonify({"error": "calls must be a non-empty array"}), 400
+        if len(calls) > MCP_BATCH_MAX_CALLS:
+            return jsonify({"error": f"en fazla {MCP_BATCH_MAX_CALLS} çağrı gönderilebilir"}), 400
+
+        started = time.perf_counter()
+        request_deadline = _request_deadline()
+
+        def call_deadline(call: Dict) -> Optional[deadline.RequestDeadline]:
+            try:
+                timeout = float(call.get("timeout_ms") or 0) / 1000.0
+            except (TypeError, ValueError):
+                timeout = 0.0
+            if timeout <= 0:
+                return request_deadline
+            if request_deadline is None:
+                return deadline.RequestDeadline(timeout)
+            return request_deadline.child(timeout)
+
+        def run_call(tool_name: str, arguments: Dict, own_deadline: Optional[deadline.RequestDeadline]) -> Dict:
+            # Kendi süresi olan çağrının süresi batch watchdog'u tarafından izlenmez
+            watch = deadline.Watchdog(own_deadline) if own_deadline is not request_deadline else nullcontext()
+            with watch:
+                return run_tool_sync(tool_name, arguments, want_timings, own_deadline)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            with _watch(request_deadline):
+                futures = []
+                for call in calls:
+                    if not isinstance(call, dict) or not call.get("tool"):
+                        futures.append((None, None))
+                        continue
+                    own_deadline = call_deadline(call)
+                    futures.append((own_deadline, get_batch_executor().submit(
+                        run_call, call["tool"], call.get("arguments") or {}, own_deadline
+                    )))
+
+                results = []
+                for call, (own_deadline, future) in zip(calls, futures):
+                    if future is None:
+                        results.append({"status": "error", "error": "tool is required", "elapsed_ms": 0.0})
+                        continue
+                    if own_deadline is not request_deadline:
+                        # İptale yanıt vermeyen (örn. bloklayan embedding yüklemesi) çağrıyı beklemeden geç
+                        try:
+                            outcome = future.result(
+                                timeout=max(own_deadline.remaining(), 0.0) + deadline.SAFETY_MARGIN_SECONDS
+                            )
+                        except FutureTimeoutError:
+                            own_deadline.cancel("deadline")
+                            deadline.record_cancellation(call["tool"], "deadline")
+                            outcome = {
+                                "status": "cancelled", "error": "İstek iptal edildi: deadline", "reason": "deadline",
+                                "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+                            }
+                    else:
+                        outcome = future.result()
+                    if not want_timings:
+                        outcome.pop("stages", None)
+                    outcome["tool"] = call["tool"]
+                    results.append(outcome)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+
+        if request_deadline is not None and request_deadline.reason == "client_disconnected":
+            return jsonify({"error": "İstek iptal edildi: client_disconnected"}), 499
+
+        return jsonify({
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
 
     port = int(os.getenv("MCP_HTTP_PORT", "5005"))
 
@@ -734,6 +1844,22 @@ def run_http_server():
     else:
         _http_ready.set()
 
+    # tenant_devices senkronizasyonu (TENANT_DEVICES_SYNC_INTERVAL_SECONDS > 0 ise)
+    if DEVICE_SYNC_INTERVAL_SECONDS > 0:
+        DeviceSyncWorker(DEVICE_SYNC_INTERVAL_SECONDS).start()
+
+    # Aylık değişim özetleri (AQI_DIGEST_INTERVAL_SECONDS > 0 ise, örn. 86400)
+    if DIGEST_INTERVAL_SECONDS > 0:
+        DigestWorker(DIGEST_INTERVAL_SECONDS, vector_api=get_vector_api()).start()
+
+    # Günlük dağılım sketch'leri (AQI_SKETCH_INTERVAL_SECONDS > 0 ise)
+    if SKETCH_INTERVAL_SECONDS > 0:
+        SketchWorker(SKETCH_INTERVAL_SECONDS).start()
+
+    # Vector retention / compaction (VECTOR_RETENTION_INTERVAL_SECONDS > 0 ise)
+    if RETENTION_INTERVAL_SECONDS > 0:
+        RetentionWorker(RETENTION_INTERVAL_SECONDS).start()
+
     app.run(host="0.0.0.0", port=port, debug=False)
 
 
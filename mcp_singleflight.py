@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Airqoon MCP Single-Flight - Eşzamanlı Özdeş Tool Çağrılarını Birleştirme
+Aynı (tool, normalize edilmiş arguments) için devam eden bir çağrı varsa yeni gelenler
+işi tekrar çalıştırmaz, lider çağrının sonucunu bekler. HTTP bridge her isteği kendi
+thread'i/event loop'unda çalıştırdığı için paylaşım concurrent.futures.Future ile yapılır.
+
+Sadece başarılı sonuçlar paylaşılır: lider hata verirse (kendi deadline'ı dolduğu veya iptal
+edildiği için de olabilir) takipçiler işi kendi deadline'larıyla kendileri çalıştırır.
+Takipçi lideri en fazla kendi kalan süresi kadar bekler. Yazma tool'ları varsayılan olarak hariçtir.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import mcp_deadline as deadline
+import mcp_metrics as metrics
+
+SINGLEFLIGHT_ENABLED = os.getenv("MCP_SINGLEFLIGHT", "1") == "1"
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("MCP_SINGLEFLIGHT_TIMEOUT_SECONDS", "30"))
+SINGLEFLIGHT_EXCLUDE = {
+    tool.strip() for tool in os.getenv("MCP_SINGLEFLIGHT_EXCLUDE", "save_analysis_to_vector_db").split(",") if tool.strip()
+}
+
+COALESCED = metrics.registry.counter("mcp_singleflight_coalesced_total", "Lider çağrının sonucunu paylaşan çağrılar")
+TIMEOUTS = metrics.registry.counter(
+    "mcp_singleflight_timeouts_total", "Lideri beklerken timeout olup kendisi çalıştıran çağrılar"
+)
+LEADER_FAILURES = metrics.registry.counter(
+    "mcp_singleflight_leader_failures_total", "Lider hata verdiği için kendisi çalıştıran takipçiler"
+)
+
+
+def _normalize(value: Any) -> Any:
+    """None alanları at, string'leri trim'le, dict anahtarlarını sırala"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items()) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def make_key(tool: str, arguments: Optional[Dict]) -> str:
+    canonical = json.dumps(
+        {"tool": tool, "arguments": _normalize(arguments or {})},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, timeout: float = SINGLEFLIGHT_TIMEOUT_SECONDS, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    async def do(
+        self,
+        tool: str,
+        arguments: Optional[Dict],
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        timeout: takipçinin lideri bekleyeceği süre (genelde isteğin kalan deadline'ı);
+        verilmezse aktif deadline'ın kalanı, o da yoksa self.timeout
+        """
+        if not self.enabled or tool in SINGLEFLIGHT_EXCLUDE:
+            return await fn()
+
+        key = make_key(tool, arguments)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if leader:
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except BaseException:
+                # Hata paylaşılmaz (liderin deadline'ı / iptali takipçiye ait değil): takipçiler kendisi çalıştırır
+                future.cancel()
+                raise
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+
+        # Takipçi: liderin sonucunu bekle (shield -> timeout liderin future'ını iptal etmesin)
+        COALESCED.inc(tool=tool)
+        if timeout is None:
+            request_deadline = deadline.current()
+            timeout = request_deadline.remaining() if request_deadline is not None else None
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            with metrics.stage("singleflight_wait"):
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    max(timeout, 0.0)
+                )
+        except asyncio.TimeoutError:
+            TIMEOUTS.inc(tool=tool)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            LEADER_FAILURES.inc(tool=tool)
+        # Lider bitmedi veya hata verdi -> kendi deadline'ı hâlâ geçerliyse kendi başına çalıştır
+        deadline.check()
+        return await fn()
+
+
+singleflight = SingleFlight()
+metrics.registry.gauge("mcp_singleflight_in_flight", "Devam eden lider çağrılar", callback=singleflight.in_flight)
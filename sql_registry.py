@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Airqoon SQL Query Registry - Server-side Prepared Statements
+Sık çalışan analiz sorgularını her pooled connection'da ilk kullanımda PREPARE eder,
+sonraki çağrılarda sadece EXECUTE gönderir (parse/analyze ve plan cache tekrar kullanılır).
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import psycopg2
+from psycopg2 import errorcodes
+
+# EXPLAIN ANALYZE ile planlama/çalışma süresi örnekleme oranı (0 = kapalı)
+EXPLAIN_SAMPLE_RATE = float(os.getenv("PG_EXPLAIN_SAMPLE_RATE", "0"))
+
+
+class PreparedQuery:
+    """Registry'ye kayıtlı tek bir named statement"""
+
+    def __init__(self, name: str, sql: str, param_types: Sequence[str]):
+        self.name = name
+        self.sql = sql
+        self.param_types = list(param_types)
+        self.executions = 0
+        self.prepares = 0
+        self.total_prepare_ms = 0.0
+        self.total_execute_ms = 0.0
+        self.explain_samples = 0
+        self.last_planning_ms: Optional[float] = None
+        self.last_execution_ms: Optional[float] = None
+
+    @property
+    def prepare_sql(self) -> str:
+        types = ", ".join(self.param_types)
+        return f"PREPARE {self.name} ({types}) AS {self.sql}"
+
+    @property
+    def execute_sql(self) -> str:
+        placeholders = ", ".join(["%s"] * len(self.param_types))
+        return f"EXECUTE {self.name} ({placeholders})"
+
+    def to_dict(self) -> Dict:
+        return {
+            "executions": self.executions,
+            "prepares": self.prepares,
+            "avg_prepare_ms": round(self.total_prepare_ms / self.prepares, 3) if self.prepares else None,
+            "avg_execute_ms": round(self.total_execute_ms / self.executions, 3) if self.executions else None,
+            "explain_samples": self.explain_samples,
+            "last_planning_ms": self.last_planning_ms,
+            "last_execution_ms": self.last_execution_ms,
+        }
+
+
+class QueryRegistry:
+    """
+    Named statement registry
+    Prepared statement'lar connection (backend) bazlıdır; hangi backend'de hangi
+    statement'ın hazırlandığı backend PID ile takip edilir. Bağlantı yenilenirse
+    PID değişir ve statement ilk kullanımda tekrar hazırlanır.
+    """
+
+    def __init__(self, explain_sample_rate: float = EXPLAIN_SAMPLE_RATE):
+        self._queries: Dict[str, PreparedQuery] = {}
+        self._prepared: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self.explain_sample_rate = explain_sample_rate
+
+    def register(self, name: str, sql: str, param_types: Sequence[str]) -> PreparedQuery:
+        """SQL'i ($1, $2, ... placeholder'larıyla) isimli statement olarak kaydet"""
+        query = PreparedQuery(name, sql, param_types)
+        with self._lock:
+            self._queries[name] = query
+        return query
+
+    def _ensure_prepared(self, cursor, query: PreparedQuery):
+        backend_pid = cursor.connection.get_backend_pid()
+        with self._lock:
+            prepared = self._prepared.setdefault(backend_pid, set())
+            if query.name in prepared:
+                return
+
+        started = time.perf_counter()
+        cursor.execute(query.prepare_sql)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            prepared.add(query.name)
+            query.prepares += 1
+            query.total_prepare_ms += elapsed_ms
+
+    def forget_connection(self, conn):
+        """Kapanan/yenilenen connection'ın prepared kaydını temizle"""
+        try:
+            backend_pid = conn.get_backend_pid()
+        except Exception:
+            return
+        with self._lock:
+            self._prepared.pop(backend_pid, None)
+
+    def execute(self, cursor, name: str, params: Sequence[Any]) -> List:
+        """Statement'ı (gerekirse önce PREPARE ederek) çalıştır ve satırları döndür"""
+        query = self._queries[name]
+        self._ensure_prepared(cursor, query)
+
+        started = time.perf_counter()
+        try:
+            cursor.execute(query.execute_sql, tuple(params))
+        except psycopg2.Error as e:
+            if e.pgcode != errorcodes.INVALID_SQL_STATEMENT_NAME:
+                raise
+            # Backend statement'ı kaybetmiş (DISCARD ALL, pooler vb.) -> yeniden hazırla
+            self.forget_connection(cursor.connection)
+            if not cursor.connection.autocommit:
+                cursor.connection.rollback()
+            self._ensure_prepared(cursor, query)
+            cursor.execute(query.execute_sql, tuple(params))
+        rows = cursor.fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            query.executions += 1
+            query.total_execute_ms += elapsed_ms
+
+        if self.explain_sample_rate > 0 and random.random() < self.explain_sample_rate:
+            try:
+                self.explain(cursor, name, params)
+            except psycopg2.Error:
+                if not cursor.connection.autocommit:
+                    cursor.connection.rollback()
+
+        return rows
+
+    def explain(self, cursor, name: str, params: Sequence[Any]) -> Dict:
+        """
+        EXPLAIN ANALYZE ile planlama ve çalışma süresini ölç.
+        Not: Sorgu bir kez daha çalıştırılır, sadece örnekleme/teşhis için kullanın.
+        """
+        query = self._queries[name]
+        self._ensure_prepared(cursor, query)
+        cursor.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {query.execute_sql}", tuple(params))
+        row = cursor.fetchone()
+        plan_json = row[0] if not isinstance(row, dict) else next(iter(row.values()))
+        plan = plan_json[0] if isinstance(plan_json, list) else plan_json
+
+        timing = {
+            "planning_ms": plan.get("Planning Time"),
+            "execution_ms": plan.get("Execution Time"),
+        }
+        with self._lock:
+            query.explain_samples += 1
+            query.last_planning_ms = timing["planning_ms"]
+            query.last_execution_ms = timing["execution_ms"]
+        return timing
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            stats = {name: q.to_dict() for name, q in self._queries.items()}
+            prepared_backends = len(self._prepared)
+        return {"statements": stats, "prepared_backends": prepared_backends}
+
+
+# Global registry (mcp_server ve yardımcı job'lar tarafından paylaşılır)
+registry = QueryRegistry()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Airqoon tenant_devices - Mongo Devices -> PostgreSQL Tenant/Cihaz Eşlemesi
+Analiz sorguları cihaz listesini Mongo'dan çekip `device_id = ANY(...)` ile göndermek yerine
+tenant_devices tablosuna tenant_slug üzerinden join yapar.
+
+Senkronizasyon:
+  - incremental: son görülen Mongo _id'sinden (ObjectId watermark) sonraki yeni cihazlar upsert edilir
+  - full: tüm Devices staging tabloya yüklenir; değişenler upsert, Mongo'da olmayanlar silinir
+    (tenant değişikliği ve silinen cihazlar sadece full sync ile yakalanır)
+Değişen cihazların verisi olan aylık özetler (aqi_digest) aynı transaction'da kirli işaretlenir.
+
+Kullanım:
+    python3 tenant_device_sync.py sync [--full]
+    python3 tenant_device_sync.py status
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+from pymongo import MongoClient
+from bson import ObjectId
+
+import aqi_digest
+import mcp_metrics as metrics
+from aqi_partitioning import connect_pg
+
+TABLE_NAME = "tenant_devices"
+STATE_TABLE = f"{TABLE_NAME}_sync_state"
+STATE_KEY = "devices"
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("TENANT_DEVICES_SYNC_INTERVAL_SECONDS", "0"))  # 0 = worker kapalı
+FULL_SYNC_INTERVAL_SECONDS = float(os.getenv("TENANT_DEVICES_FULL_SYNC_INTERVAL_SECONDS", "3600"))
+BATCH_SIZE = int(os.getenv("TENANT_DEVICES_SYNC_BATCH", "1000"))
+
+# Aynı anda tek senkronizasyon (worker + CLI)
+ADVISORY_LOCK_KEY = 0x7464_7379  # "tdsy"
+
+SYNC_CHANGES = metrics.registry.counter("mcp_tenant_devices_changes_total", "tenant_devices senkronizasyon değişiklikleri")
+LAST_SYNC = metrics.registry.gauge("mcp_tenant_devices_last_sync_timestamp", "Son başarılı tenant_devices sync (unix)")
+ROW_COUNT = metrics.registry.gauge("mcp_tenant_devices_rows", "tenant_devices satır sayısı")
+
+
+def ensure_schema(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+                tenant_slug VARCHAR(255) NOT NULL,
+                device_id VARCHAR(255) NOT NULL,
+                mongo_id CHAR(24),
+                synced_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (tenant_slug, device_id)
+            );
+            """
+        )
+        # air_quality_index join'i device_id üzerinden; ters yönlü aramalar için
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_device ON {TABLE_NAME} (device_id);")
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                name VARCHAR(50) PRIMARY KEY,
+                watermark CHAR(24),
+                last_sync_at TIMESTAMPTZ,
+                last_full_sync_at TIMESTAMPTZ,
+                row_count BIGINT
+            );
+            """
+        )
+    conn.commit()
+
+
+def get_mongo_devices():
+    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    return MongoClient(mongo_uri)["airqoonBaseMapDB"]["Devices"]
+
+
+def _device_rows(devices_collection, query: Dict) -> Iterator[List[Tuple[str, str, str]]]:
+    """Mongo Devices'ı _id sırasıyla BATCH_SIZE'lık (tenant_slug, device_id, mongo_id) listeleri halinde akıt"""
+    cursor = devices_collection.find(
+        query,
+        {"_id": 1, "DeviceId": 1, "TenantSlugName": 1},
+        batch_size=BATCH_SIZE
+    ).sort("_id", 1)
+    batch = []
+    for doc in cursor:
+        if not doc.get("DeviceId") or not doc.get("TenantSlugName"):
+            continue
+        batch.append((str(doc["TenantSlugName"]), str(doc["DeviceId"]), str(doc["_id"])))
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_state(cursor) -> Dict:
+    cursor.execute(
+        f"SELECT watermark, last_sync_at, last_full_sync_at, row_count FROM {STATE_TABLE} WHERE name = %s",
+        (STATE_KEY,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return {"watermark": None, "last_sync_at": None, "last_full_sync_at": None, "row_count": None}
+    return dict(zip(("watermark", "last_sync_at", "last_full_sync_at", "row_count"), row))
+
+
+def _write_state(cursor, watermark: Optional[str], full: bool):
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}")
+    row_count = cursor.fetchone()[0]
+    cursor.execute(
+        f"""
+        INSERT INTO {STATE_TABLE} (name, watermark, last_sync_at, last_full_sync_at, row_count)
+        VALUES (%s, %s, NOW(), CASE WHEN %s THEN NOW() END, %s)
+        ON CONFLICT (name) DO UPDATE SET
+            watermark = COALESCE(EXCLUDED.watermark, {STATE_TABLE}.watermark),
+            last_sync_at = EXCLUDED.last_sync_at,
+            last_full_sync_at = COALESCE(EXCLUDED.last_full_sync_at, {STATE_TABLE}.last_full_sync_at),
+            row_count = EXCLUDED.row_count
+        """,
+        (STATE_KEY, watermark, full, row_count)
+    )
+    return row_count
+
+
+def _upsert_sql(source: str) -> str:
+    return f"""
+        INSERT INTO {TABLE_NAME} (tenant_slug, device_id, mongo_id, synced_at)
+        SELECT DISTINCT ON (tenant_slug, device_id) tenant_slug, device_id, mongo_id, NOW()
+        FROM {source}
+        ORDER BY tenant_slug, device_id, mongo_id DESC
+        ON CONFLICT (tenant_slug, device_id) DO UPDATE SET
+            mongo_id = EXCLUDED.mongo_id,
+            synced_at = EXCLUDED.synced_at
+        WHERE {TABLE_NAME}.mongo_id IS DISTINCT FROM EXCLUDED.mongo_id
+        RETURNING device_id
+    """
+
+
+def sync_devices(conn, devices_collection=None, full: bool = False) -> Dict:
+    """
+    Tek senkronizasyon turu. Başka bir süreç sync ediyorsa {"skipped": True} döner.
+    İlk çalıştırmada (watermark yok) otomatik olarak full sync yapılır.
+    """
+    started = time.perf_counter()
+    devices_collection = devices_collection if devices_collection is not None else get_mongo_devices()
+    report = {"mode": "full" if full else "incremental", "read": 0, "upserted": 0, "deleted": 0}
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            report["skipped"] = True
+            return report
+
+        state = _read_state(cursor)
+        if state["watermark"] is None:
+            full = True
+            report["mode"] = "full"
+
+        cursor.execute(
+            """
+            CREATE TEMP TABLE tenant_devices_staging (
+                tenant_slug VARCHAR(255) NOT NULL,
+                device_id VARCHAR(255) NOT NULL,
+                mongo_id CHAR(24)
+            ) ON COMMIT DROP
+            """
+        )
+        query = {} if full else {"_id": {"$gt": ObjectId(state["watermark"])}}
+        watermark = None
+        for batch in _device_rows(devices_collection, query):
+            execute_values(
+                cursor,
+                "INSERT INTO tenant_devices_staging (tenant_slug, device_id, mongo_id) VALUES %s",
+                batch,
+                page_size=BATCH_SIZE
+            )
+            report["read"] += len(batch)
+            watermark = batch[-1][2]
+
+        cursor.execute(_upsert_sql("tenant_devices_staging"))
+        report["upserted"] = cursor.rowcount
+        changed = {row[0] for row in cursor.fetchall()}
+        if full:
+            cursor.execute(
+                f"""
+                DELETE FROM {TABLE_NAME} td
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM tenant_devices_staging s
+                    WHERE s.tenant_slug = td.tenant_slug AND s.device_id = td.device_id
+                )
+                RETURNING td.device_id
+                """
+            )
+            report["deleted"] = cursor.rowcount
+            changed.update(row[0] for row in cursor.fetchall())
+
+        # Cihazın tenant'ı değiştiyse o cihazın verisi olan aylık özetler artık yanlış tenant'a sayılıyor
+        report["digest_months_dirty"] = len(aqi_digest.mark_devices_dirty(cursor, changed))
+
+        report["rows"] = _write_state(cursor, watermark, full)
+    conn.commit()
+
+    SYNC_CHANGES.inc(report["upserted"], kind="upserted")
+    SYNC_CHANGES.inc(report["deleted"], kind="deleted")
+    LAST_SYNC.set(time.time())
+    ROW_COUNT.set(report["rows"])
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def sync_status(conn, devices_collection=None) -> Dict:
+    """Satır sayıları (tenant bazlı), son sync zamanları, lag ve Mongo'da bekleyen yeni cihazlar"""
+    with conn.cursor() as cursor:
+        state = _read_state(cursor)
+        cursor.execute(
+            f"SELECT tenant_slug, COUNT(*) FROM {TABLE_NAME} GROUP BY tenant_slug ORDER BY tenant_slug"
+        )
+        per_tenant = dict(cursor.fetchall())
+    conn.rollback()
+
+    now = datetime.now(timezone.utc)
+    status = {
+        **state,
+        "rows": sum(per_tenant.values()),
+        "tenants": per_tenant,
+        "lag_seconds": round((now - state["last_sync_at"]).total_seconds(), 1) if state["last_sync_at"] else None,
+        "pending_new_devices": None,
+    }
+    try:
+        devices_collection = devices_collection if devices_collection is not None else get_mongo_devices()
+        query = {"_id": {"$gt": ObjectId(state["watermark"])}} if state["watermark"] else {}
+        status["pending_new_devices"] = devices_collection.count_documents(query)
+    except Exception as e:
+        status["pending_error"] = str(e)
+    return status
+
+
+class DeviceSyncWorker:
+    """tenant_devices'ı periyodik olarak (incremental + arada full) senkronlayan arka plan thread'i"""
+
+    def __init__(
+        self,
+        interval_seconds: float = SYNC_INTERVAL_SECONDS,
+        full_interval_seconds: float = FULL_SYNC_INTERVAL_SECONDS,
+        connect: Callable = connect_pg
+    ):
+        self.interval = interval_seconds
+        self.full_interval = full_interval_seconds
+        self.connect = connect
+        self._last_full: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="tenant-device-sync", daemon=True)
+
+    def _run_once(self, devices_collection):
+        conn = self.connect()
+        try:
+            full = self._last_full is None or time.monotonic() - self._last_full >= self.full_interval
+            report = sync_devices(conn, devices_collection, full=full)
+            if report.get("mode") == "full" and not report.get("skipped"):
+                self._last_full = time.monotonic()
+            if report.get("upserted") or report.get("deleted"):
+                print(f"🔄 tenant_devices sync: {report}")
+        finally:
+            conn.close()
+
+    def _loop(self):
+        devices_collection = None
+        try:
+            conn = self.connect()
+            try:
+                ensure_schema(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ tenant_devices şeması oluşturulamadı: {e}")
+        # İlk tur hemen (full), sonrası interval'de bir
+        while True:
+            try:
+                if devices_collection is None:
+                    devices_collection = get_mongo_devices()
+                self._run_once(devices_collection)
+            except Exception as e:
+                print(f"⚠️ tenant_devices sync başarısız: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mongo Devices -> PostgreSQL tenant_devices senkronizasyonu")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = sub.add_parser("sync", help="Senkronize et")
+    sync_parser.add_argument("--full", action="store_true", help="Tüm cihazları karşılaştır (silinen/taşınan cihazlar dahil)")
+    sub.add_parser("status", help="Satır sayıları ve sync gecikmesi")
+
+    args = parser.parse_args(argv)
+    conn = connect_pg()
+    try:
+        ensure_schema(conn)
+        if args.command == "sync":
+            report = sync_devices(conn, full=args.full)
+            if report.get("skipped"):
+                print("⚠ Başka bir sync çalışıyor, atlandı")
+            else:
+                print(f"✅ {report['mode']} sync: {report['read']} okundu, {report['upserted']} upsert, "
+                      f"{report['deleted']} silindi, toplam {report['rows']} satır ({report['elapsed_ms']} ms)")
+        elif args.command == "status":
+            status = sync_status(conn)
+            print(f"📦 {TABLE_NAME}: {status['rows']} satır, {len(status['tenants'])} tenant")
+            print(f"  - Son sync: {status['last_sync_at'] or '-'} (lag: {status['lag_seconds']} sn)")
+            print(f"  - Son full sync: {status['last_full_sync_at'] or '-'}")
+            print(f"  - Mongo'da bekleyen yeni cihaz: {status['pending_new_devices']}")
+            for slug, count in status["tenants"].items():
+                print(f"  - {slug}: {count}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
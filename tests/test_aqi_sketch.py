@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from aqi_sketch import DDSketch, merge_blobs
+
+QS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+def exact_quantile(values, q):
+    # quantiles() ile aynı rank tanımı: q * (n - 1), alt sıradaki değer
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def assert_within(sketch, values, bound):
+    for q, approx in zip(QS, sketch.quantiles(QS)):
+        exact = exact_quantile(values, q)
+        assert abs(approx - exact) <= bound * abs(exact) + 1e-12, (q, approx, exact)
+
+
+def lognormal(seed, n=5000):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3, 1) for _ in range(n)]
+
+
+def sketch_of(values, accuracy=0.01):
+    sketch = DDSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("accuracy", [0.005, 0.01, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    values = lognormal(1)
+    assert_within(sketch_of(values, accuracy), values, accuracy)
+
+
+def test_empty_sketch_has_no_quantiles():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean is None
+    assert merge_blobs([]).count == 0
+
+
+def test_merge_same_accuracy_is_lossless():
+    first, second = lognormal(2), lognormal(3)
+    merged = sketch_of(first)
+    merged.merge(sketch_of(second))
+    combined = sketch_of(first + second)
+    assert merged.positive == combined.positive
+    assert merged.count == combined.count
+    assert_within(merged, first + second, 0.01)
+
+
+def test_merge_across_accuracies_uses_coarsest():
+    fine_values, coarse_values = lognormal(4), lognormal(5)
+    merged = merge_blobs([sketch_of(fine_values, 0.01).to_bytes(), sketch_of(coarse_values, 0.02).to_bytes()])
+    assert merged.relative_accuracy == 0.02
+    assert merged.count == len(fine_values) + len(coarse_values)
+    # İnce bucket'lar temsilci değerleriyle yeniden eşlenir: hata en fazla iki hassasiyetin birleşimi
+    assert_within(merged, fine_values + coarse_values, (1 + 0.01) * (1 + 0.02) - 1)
+
+
+def test_bytes_round_trip():
+    rng = random.Random(6)
+    values = [rng.uniform(-50, 50) for _ in range(1000)] + [0.0] * 10
+    sketch = sketch_of(values)
+    restored = DDSketch.from_bytes(sketch.to_bytes())
+    assert restored.relative_accuracy == sketch.relative_accuracy
+    assert (restored.count, restored.zero_count) == (sketch.count, sketch.zero_count)
+    assert (restored.min, restored.max, restored.sum) == (sketch.min, sketch.max, sketch.sum)
+    assert restored.positive == sketch.positive
+    assert restored.negative == sketch.negative
+    assert restored.quantiles(QS) == sketch.quantiles(QS)
+    assert_within(restored, values, 0.01)
+
+
+def test_from_bytes_rejects_unknown_version():
+    payload = bytearray(DDSketch().to_bytes())
+    payload[0] = 99
+    with pytest.raises(ValueError):
+        DDSketch.from_bytes(bytes(payload))
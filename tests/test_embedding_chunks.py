@@ -0,0 +1,54 @@
+from embedding_utils import chunk_markdown_sections
+
+
+def body(label, lines):
+    return "\n".join(f"- {label} ölçüm {i}: {40 + i} µg/m³ (limit aşımı yok, ortalamanın altında)" for i in range(lines))
+
+
+def assert_no_heading_only_chunks(chunks):
+    for chunk in chunks:
+        assert any(not line.startswith("#") for line in chunk["text"].split("\n") if line.strip()), chunk
+
+
+def test_empty_input_has_no_chunks():
+    assert chunk_markdown_sections("") == []
+    assert chunk_markdown_sections("\n\n  \n") == []
+
+
+def test_title_merges_into_unnested_section():
+    text = "# Akçansa Şubat 2025 Analizi\n\n## PM10-24h\n" + body("PM10", 3)
+    chunks = chunk_markdown_sections(text, max_chars=600, min_chars=0)
+    assert len(chunks) == 1
+    assert chunks[0]["section"] == "PM10-24h"
+    assert chunks[0]["text"].startswith("# Akçansa Şubat 2025 Analizi")
+
+
+def test_small_sibling_section_merges_forward():
+    text = "### PM10-24h\n- Ortalama: 41\n\n### NO2-1h\n" + body("NO2", 3)
+    chunks = chunk_markdown_sections(text, max_chars=600, min_chars=80)
+    assert len(chunks) == 1
+    assert "- Ortalama: 41" in chunks[0]["text"]
+    assert chunks[0]["section"] == "NO2-1h"
+
+
+def test_heading_stays_with_first_split_part():
+    text = "## Ana Zaman Aralığı Sonuçları\n" + "uzun " * 200
+    chunks = chunk_markdown_sections(text, max_chars=120, min_chars=0)
+    assert len(chunks) > 1
+    assert chunks[0]["text"].startswith("## Ana Zaman Aralığı Sonuçları\nuzun")
+    assert all(len(chunk["text"]) <= 120 for chunk in chunks)
+    assert_no_heading_only_chunks(chunks)
+
+
+def test_merged_heading_is_not_left_at_end_of_part():
+    text = "## Özet\n- kısa\n\n## PM10-24h\n" + body("PM10", 6)
+    chunks = chunk_markdown_sections(text, max_chars=200, min_chars=80)
+    assert_no_heading_only_chunks(chunks)
+    for chunk in chunks:
+        assert not chunk["text"].split("\n")[-1].startswith("#"), chunk
+
+
+def test_trailing_heading_is_dropped():
+    text = "## PM10-24h\n" + body("PM10", 3) + "\n\n## Öneriler"
+    chunks = chunk_markdown_sections(text, max_chars=600, min_chars=0)
+    assert [chunk["section"] for chunk in chunks] == ["PM10-24h"]
@@ -0,0 +1,32 @@
+import pytest
+
+import mcp_deadline as deadline
+from mcp_admission import AdmissionController, AdmissionRejected
+
+
+def test_expired_deadline_is_cancelled_before_queueing():
+    controller = AdmissionController(max_concurrent=4, enabled=True)
+    with pytest.raises(deadline.DeadlineExceeded) as exc:
+        controller.acquire("tenant_statistics", "akcansa", timeout=0)
+    assert exc.value.reason == "deadline"
+    assert controller.in_use() == 0
+    assert controller.queue_depth() == 0
+
+
+def test_deadline_expiring_in_queue_is_cancelled_not_rejected():
+    controller = AdmissionController(max_concurrent=1, enabled=True)
+    held = controller.acquire("tenant_statistics", "akcansa")
+    with pytest.raises(deadline.DeadlineExceeded):
+        controller.acquire("tenant_statistics", "akcansa", timeout=0.01)
+    assert controller.queue_depth() == 0
+    controller.release(held)
+    assert controller.acquire("tenant_statistics", "akcansa", timeout=1) == "light"
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, enabled=True)
+    controller.acquire("tenant_statistics", "akcansa")
+    with pytest.raises(AdmissionRejected) as exc:
+        controller.acquire("tenant_statistics", "akcansa", timeout=5)
+    assert exc.value.reason == "queue_full"
+    assert exc.value.retry_after >= 1
@@ -0,0 +1,31 @@
+from mcp_benchmark import classify_result, run_workload
+
+
+def test_classify_result():
+    assert classify_result("# Analiz\n- PM10: 41.2") == "ok"
+    assert classify_result("❌ Tenant bulunamadı: x") == "error"
+    assert classify_result("⚠️ bench-t1 tenant'ına ait cihaz bulunamadı.") == "empty"
+    assert classify_result("# Analiz\n\n⚠️ Bu zaman aralığında veri bulunamadı.\n") == "empty"
+    assert classify_result("") == "empty"
+
+
+def test_run_workload_counts_empty_results_separately():
+    responses = {
+        "ok": "# sonuç",
+        "empty": "⚠️ Sorgunuza uygun analiz bulunamadı.",
+        "error": "❌ hata",
+    }
+
+    def call(tool, arguments):
+        if tool == "raise":
+            raise RuntimeError("bağlantı hatası")
+        return responses[tool]
+
+    workload = [(tool, {}) for tool in ("ok", "ok", "empty", "error", "raise")]
+    report = run_workload(call, workload, concurrency=2)
+
+    assert report["overall"]["count"] == 5
+    assert report["overall"]["errors"] == 2
+    assert report["overall"]["empty"] == 1
+    assert report["tools"]["empty"]["empty"] == 1
+    assert report["tools"]["ok"]["errors"] == 0
@@ -0,0 +1,32 @@
+import pytest
+
+import mcp_deadline as deadline
+
+
+def test_child_deadline_is_bounded_by_parent():
+    parent = deadline.RequestDeadline(0.05)
+    child = parent.child(5)
+    assert child.remaining() <= 0.05
+
+
+def test_child_deadline_uses_its_own_shorter_timeout():
+    parent = deadline.RequestDeadline(10)
+    child = parent.child(0.01)
+    assert child.remaining() <= 0.01
+    assert parent.remaining() > 9
+
+
+def test_parent_cancellation_propagates_to_child():
+    parent = deadline.RequestDeadline(10)
+    child = parent.child(5)
+    parent.cancel("client_disconnected")
+    assert child.cancelled
+    with pytest.raises(deadline.DeadlineExceeded) as exc:
+        child.check()
+    assert exc.value.reason == "client_disconnected"
+
+
+def test_child_of_cancelled_parent_is_cancelled():
+    parent = deadline.RequestDeadline(10)
+    parent.cancel("deadline")
+    assert parent.child(5).cancelled
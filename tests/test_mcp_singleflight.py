@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+import mcp_deadline as deadline
+from mcp_singleflight import SINGLEFLIGHT_EXCLUDE, SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_followers_share_leader_success():
+    flight = SingleFlight(timeout=5)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("tenant_statistics", {"tenant_slug": "a"}, work) for _ in range(5)))
+
+    assert run(main()) == ["ok"] * 5
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_leader_deadline_error_is_not_shared():
+    flight = SingleFlight(timeout=5)
+    calls = []
+
+    async def leader_work():
+        calls.append("leader")
+        await asyncio.sleep(0.05)
+        raise deadline.DeadlineExceeded("deadline")
+
+    async def follower_work():
+        calls.append("follower")
+        return "follower-result"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("tenant_statistics", {"tenant_slug": "a"}, leader_work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("tenant_statistics", {"tenant_slug": "a"}, follower_work))
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        return results
+
+    leader_result, follower_result = run(main())
+    assert isinstance(leader_result, deadline.DeadlineExceeded)
+    assert follower_result == "follower-result"
+    assert calls == ["leader", "follower"]
+
+
+def test_leader_cancellation_lets_follower_run():
+    flight = SingleFlight(timeout=5)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def follower_work():
+        return "own"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("tenant_statistics", {}, slow))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("tenant_statistics", {}, follower_work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert run(main()) == "own"
+
+
+def test_follower_waits_at_most_its_own_deadline():
+    flight = SingleFlight(timeout=30)
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return "leader"
+
+    async def follower_work():
+        return "follower"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("tenant_statistics", {}, slow))
+        await asyncio.sleep(0.01)
+        request_deadline = deadline.RequestDeadline(0.05)
+        deadline.activate(request_deadline)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(deadline.DeadlineExceeded):
+            await flight.do("tenant_statistics", {}, follower_work, timeout=request_deadline.remaining())
+        waited = loop.time() - started
+        leader.cancel()
+        return waited
+
+    assert run(main()) < 0.3
+
+
+def test_follower_uses_active_deadline_when_timeout_not_given():
+    flight = SingleFlight(timeout=30)
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return "leader"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("tenant_statistics", {}, slow))
+        await asyncio.sleep(0.01)
+        deadline.activate(deadline.RequestDeadline(0.05))
+        with pytest.raises(deadline.DeadlineExceeded):
+            await flight.do("tenant_statistics", {}, slow)
+        leader.cancel()
+
+    run(main())
+
+
+def test_write_tools_are_not_coalesced_by_default():
+    assert "save_analysis_to_vector_db" in SINGLEFLIGHT_EXCLUDE
+    flight = SingleFlight(timeout=5)
+    calls = []
+
+    async def save():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "saved"
+
+    async def main():
+        args = {"tenant_slug": "a", "analysis_text": "x"}
+        return await asyncio.gather(*(flight.do("save_analysis_to_vector_db", args, save) for _ in range(3)))
+
+    assert run(main()) == ["saved"] * 3
+    assert len(calls) == 3
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+from qdrant_client.models import Distance, VectorParams
+
+import vector_db_api
+from vector_sparse import encode_query, point_vector, sparse_vectors_config
+
+TENANT = "akcansa"
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(vector_db_api, "QDRANT_LOCATION", ":memory:")
+    api = vector_db_api.TenantIsolatedVectorAPI()
+    api.client.create_collection(
+        collection_name=api.dedicated_collection_name(TENANT),
+        vectors_config=VectorParams(size=3, distance=Distance.COSINE),
+        sparse_vectors_config=sparse_vectors_config()
+    )
+    api.insert_vectors(TENANT, [
+        {"id": 1, "vector": point_vector([1.0, 0.0, 0.0], "PM10-24h Şubat 2025 aylık analiz"), "payload": {"n": 1}},
+        {"id": 2, "vector": point_vector([0.0, 1.0, 0.0], "NO2-1h Mart 2025 aylık analiz"), "payload": {"n": 2}},
+    ])
+    return api
+
+
+def test_hybrid_unrelated_query_returns_nothing(api):
+    # Dense olarak hiçbir analize benzemeyen ama token'ları örtüşen sorgu
+    hits = api.search_vectors(
+        TENANT, [0.0, 0.0, 1.0], limit=5, score_threshold=0.5,
+        sparse_query=encode_query("PM10 NO2 2025 aylık analiz")
+    )
+    assert hits == []
+
+
+def test_hybrid_keeps_only_hits_above_dense_threshold(api):
+    hits = api.search_vectors(
+        TENANT, [1.0, 0.1, 0.0], limit=5, score_threshold=0.5,
+        sparse_query=encode_query("NO2 Mart 2025 aylık analiz")
+    )
+    assert [hit["payload"]["n"] for hit in hits] == [1]
+    assert hits[0]["search_mode"] == "hybrid"
+
+
+def test_hybrid_without_threshold_fuses_both_sides(api):
+    hits = api.search_vectors(
+        TENANT, [1.0, 0.0, 0.0], limit=5, sparse_query=encode_query("NO2 Mart")
+    )
+    assert sorted(hit["payload"]["n"] for hit in hits) == [1, 2]
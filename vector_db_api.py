@@ -5,28 +5,178 @@ Her tenant sadece kendi verilerine erişebilir
 """
 
 import os
-from typing import List, Dict, Optional
+import base64
+import zlib
+from typing import List, Dict, Optional, Union
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue, Query, VectorParams, Distance
+from qdrant_client.models import (
+    PointStruct, Filter, FieldCondition, MatchValue, Query, VectorParams, Distance, Range, FilterSelector, PointIdsList,
+    PayloadSchemaType, HasIdCondition, Prefetch, FusionQuery, Fusion, SparseVector, QueryRequest
+)
+try:
+    from qdrant_client.models import KeywordIndexParams, KeywordIndexType
+    # Qdrant >= 1.11: tenant anahtarı olarak işaretli index (tenant bazlı segment yerleşimi)
+    TENANT_INDEX_SCHEMA = KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+except ImportError:
+    TENANT_INDEX_SCHEMA = PayloadSchemaType.KEYWORD
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import json
+import threading
+import time
 from datetime import datetime
 import hashlib
 import uuid
 
+# Aşama metrikleri (embedding, Qdrant upsert/search)
+import mcp_metrics as metrics
+
+# İstek deadline'ı (Qdrant timeout + pahalı aşamalar öncesi kontrol)
+import mcp_deadline as deadline
+
+# Benzer RAG sorguları için tenant bazlı semantic cache (yazmalarda tenant cache'i düşer)
+from vector_query_cache import query_cache, params_key as query_cache_params
+
+# Hybrid arama için BM25 tarzı sparse (lexical) vector'ler
+from vector_sparse import SPARSE_VECTOR_NAME, sparse_vectors_config, point_vector, encode_query, is_empty
+
 # Embedding utilities
 try:
-    from embedding_utils import generate_embedding, generate_vector_id, get_embedding_dimension
+    from embedding_utils import (
+        generate_embedding, generate_embeddings, generate_vector_id, get_embedding_dimension, chunk_markdown_sections
+    )
 except ImportError:
     # Fallback - eğer embedding_utils yüklenemezse fonksiyonlar None olur
     generate_embedding = None
+    generate_embeddings = None
     generate_vector_id = None
     get_embedding_dimension = None
+    chunk_markdown_sections = None
 
 # Qdrant bağlantı bilgileri
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+# Embedded Qdrant (":memory:" veya local path) - test/benchmark için, verilirse host/port yok sayılır
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION", None)
+
+# Kayıt öncesi near-duplicate kontrolü: bu skorun üzerindeki benzer analiz varsa yenisi eklenmez (0 = kapalı)
+VECTOR_DEDUP_THRESHOLD = float(os.getenv("VECTOR_DEDUP_THRESHOLD", "0"))
+
+# Point id'ye girmeyen metadata alanları: her kayıtta değişenler ve analizin girdisi değil sonucu olanlar
+# (aynı analiz yeniden çalıştırılınca bunlar değişse de üzerine yazılmalı). Kalan tüm çağıran metadata'sı kimliğe girer
+ANALYSIS_NON_IDENTITY_FIELDS = frozenset({
+    "created_at", "saved_at", "timestamp", "request_id", "session_id",
+    "tenant_name", "device_count", "dramatic_parameters",
+})
+
+# Bu alan gruplarından biri tam ise parametreler analizi tek başına tanımlar (aynı parametrelerle tekrar çalıştırılan
+# analiz üzerine yazılır); değilse kimliğe metnin hash'i de eklenir
+ANALYSIS_DESCRIPTIVE_FIELD_SETS = (
+    ("start_date", "end_date", "pollutants"),
+    ("start_date", "end_date", "pollutant"),
+    ("month1", "month2"),
+)
+
+# Chunk'lanmış analizlerde aramada istenen sonuç sayısının kaç katı chunk çekilip parent'a indirgeneceği
+CHUNK_OVERFETCH = int(os.getenv("VECTOR_CHUNK_OVERFETCH", "3"))
+
+# RAG arama modu: "dense" veya "hybrid" (dense + sparse, Qdrant'ta RRF ile birleştirilir). Sparse vector'ü
+# olmayan (eski) collection'larda hybrid istense de dense arama yapılır
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "dense")
+# Hybrid aramada her prefetch'in (dense / sparse) istenen sonuç sayısının kaç katı aday getireceği
+HYBRID_PREFETCH_FACTOR = int(os.getenv("VECTOR_HYBRID_PREFETCH", "4"))
+
+# Büyük analiz metinleri payload'da zlib + base64 olarak saklanır ("text_z"); 0 = kapalı
+VECTOR_TEXT_COMPRESS_MIN_BYTES = int(os.getenv("VECTOR_TEXT_COMPRESS_MIN_BYTES", "1024"))
+
+# Arama sonuçlarında çekilen payload alanları (tam metin hariç, gösterilecek sonuçlar için ayrıca çekilir)
+SEARCH_PAYLOAD_FIELDS = [
+    "_tenant", "type", "analysis_type", "created_at", "parent_id", "chunk_index", "section", "chunk_text",
+    "start_date", "end_date", "comparison_start_date", "comparison_end_date", "tenant_name",
+]
+TEXT_PAYLOAD_FIELDS = ["_tenant", "text", "text_z"]
+
+# Retention / chunk temizliği filtrelerinde kullanılan payload index'leri
+PAYLOAD_INDEXES = {
+    "created_at_ts": PayloadSchemaType.INTEGER,
+    "parent_id": PayloadSchemaType.KEYWORD,
+    "analysis_type": PayloadSchemaType.KEYWORD,
+    "chunk_index": PayloadSchemaType.INTEGER,
+}
+
+# Depolama modu: "dedicated" (her tenant'a tenant_{slug}) veya "shared" (küçük tenant'lar ortak collection'da,
+# _tenant payload anahtarıyla bölümlenir; VECTOR_PROMOTION_THRESHOLD point'i geçen tenant kendi collection'ına taşınır)
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "dedicated")
+SHARED_COLLECTION = os.getenv("VECTOR_SHARED_COLLECTION", "airqoon_shared")
+VECTOR_PROMOTION_THRESHOLD = int(os.getenv("VECTOR_PROMOTION_THRESHOLD", "1000"))
+# Collection listesinin önbellekte tutulma süresi (her çağrıda get_collections yapılmasın)
+COLLECTION_CACHE_SECONDS = float(os.getenv("VECTOR_COLLECTION_CACHE_SECONDS", "30"))
+# Toplu istatistikte paralel get_collection çağrısı sayısı
+STATS_WORKERS = int(os.getenv("VECTOR_STATS_WORKERS", "8"))
+# Model bazlı fiziksel collection'lar "{ad}__{model}" olarak adlandırılır ve "{ad}" alias'ı üzerinden
+# kullanılır (bkz. vector_reembed.py); tenant/collection listelerinde sadece mantıksal adlar görünür
+COLLECTION_VERSION_SEPARATOR = "__"
+
+DUPLICATES_SKIPPED = metrics.registry.counter(
+    "mcp_vector_duplicates_skipped_total", "Near-duplicate olduğu için eklenmeyen analizler"
+)
+SEARCHES = metrics.registry.counter(
+    "mcp_vector_searches_total", "Qdrant vector aramaları (mode=dense|hybrid)"
+)
+
+
+def _compress_text(text: str) -> Dict:
+    """Eşik üzerindeki metni {"text_z": ...}, altındakini {"text": ...} olarak döndür"""
+    raw = text.encode("utf-8")
+    if VECTOR_TEXT_COMPRESS_MIN_BYTES <= 0 or len(raw) < VECTOR_TEXT_COMPRESS_MIN_BYTES:
+        return {"text": text}
+    return {"text_z": base64.b64encode(zlib.compress(raw, 6)).decode("ascii")}
+
+
+def _decode_text(payload: Optional[Dict]) -> Optional[Dict]:
+    """Payload'daki sıkıştırılmış metni ("text_z") açıp "text" alanına koy"""
+    if not payload or "text_z" not in payload:
+        return payload
+    decoded = dict(payload)
+    decoded["text"] = zlib.decompress(base64.b64decode(decoded.pop("text_z"))).decode("utf-8")
+    return decoded
+
+
+def collection_aliases(client) -> Dict[str, str]:
+    """alias -> fiziksel collection (alias desteklemeyen client'ta boş)"""
+    try:
+        return {alias.alias_name: alias.collection_name for alias in client.get_aliases().aliases}
+    except Exception:
+        return {}
+
+
+def logical_collection_names(client) -> set:
+    """Alias'lar + versiyonsuz collection'lar (alias arkasındaki "{ad}__{model}" collection'ları hariç)"""
+    names = {
+        col.name for col in client.get_collections().collections
+        if COLLECTION_VERSION_SEPARATOR not in col.name
+    }
+    names.update(collection_aliases(client))
+    return names
+
+
+def _within_threshold(fused_points: List, dense_points: List) -> List:
+    """RRF ile birleştirilmiş sonuçlardan sadece dense eşiğini geçen (dense prefetch'te dönen) point'leri tut"""
+    allowed = {str(point.id) for point in dense_points}
+    return [point for point in fused_points if str(point.id) in allowed]
+
+
+def _tenant_condition(tenant_slug: str) -> FieldCondition:
+    return FieldCondition(key="_tenant", match=MatchValue(value=tenant_slug))
+
+
+def _same_point_id(left, right) -> bool:
+    """Qdrant UUID'leri tireli döndürür, md5 hex id'lerle karşılaştırmak için normalize et"""
+    try:
+        return uuid.UUID(str(left)) == uuid.UUID(str(right))
+    except ValueError:
+        return str(left) == str(right)
 
 
 class TenantIsolatedVectorAPI:
@@ -37,7 +187,11 @@ class TenantIsolatedVectorAPI:
     
     def __init__(self):
         """Qdrant client'ı başlat"""
-        if QDRANT_API_KEY:
+        if QDRANT_LOCATION == ":memory:":
+            self.client = QdrantClient(location=QDRANT_LOCATION)
+        elif QDRANT_LOCATION:
+            self.client = QdrantClient(path=QDRANT_LOCATION)
+        elif QDRANT_API_KEY:
             self.client = QdrantClient(
                 url=f"http://{QDRANT_HOST}:{QDRANT_PORT}",
                 api_key=QDRANT_API_KEY
@@ -46,18 +200,77 @@ class TenantIsolatedVectorAPI:
             self.client = QdrantClient(
                 url=f"http://{QDRANT_HOST}:{QDRANT_PORT}"
             )
+        self._collections_cache = None
+        self._collections_cached_at = 0.0
+        self._collections_lock = threading.Lock()
+        self._promoting = set()
+        self._promotion_lock = threading.Lock()
+        self._sparse_cache: Dict[str, tuple] = {}
     
-    def _get_collection_name(self, tenant_slug: str) -> str:
-        """Tenant slug'ından collection adını döndür"""
+    def _collection_names(self, refresh: bool = False) -> set:
+        """Mevcut collection adları (COLLECTION_CACHE_SECONDS boyunca önbellekten)"""
+        with self._collections_lock:
+            fresh = time.monotonic() - self._collections_cached_at < COLLECTION_CACHE_SECONDS
+            if self._collections_cache is not None and fresh and not refresh:
+                return self._collections_cache
+        with metrics.stage("qdrant_collection_check"):
+            names = logical_collection_names(self.client)
+        with self._collections_lock:
+            self._collections_cache = names
+            self._collections_cached_at = time.monotonic()
+        return names
+    
+    def _invalidate_collections(self):
+        with self._collections_lock:
+            self._collections_cache = None
+            self._sparse_cache = {}
+    
+    def has_sparse(self, collection_name: str) -> bool:
+        """Collection'da sparse (lexical) vector tanımlı mı (COLLECTION_CACHE_SECONDS boyunca önbellekten)"""
+        with self._collections_lock:
+            cached = self._sparse_cache.get(collection_name)
+            if cached is not None and time.monotonic() - cached[1] < COLLECTION_CACHE_SECONDS:
+                return cached[0]
+        try:
+            sparse = self.client.get_collection(collection_name).config.params.sparse_vectors or {}
+            enabled = SPARSE_VECTOR_NAME in sparse
+        except Exception:
+            enabled = False
+        with self._collections_lock:
+            self._sparse_cache[collection_name] = (enabled, time.monotonic())
+        return enabled
+    
+    def dedicated_collection_name(self, tenant_slug: str) -> str:
         return f"tenant_{tenant_slug}"
     
+    def is_shared(self, tenant_slug: str) -> bool:
+        """Tenant verisi ortak collection'da mı (shared modda dedicated collection'ı olmayanlar)"""
+        if VECTOR_STORAGE_MODE != "shared":
+            return False
+        if tenant_slug in self._promoting:
+            return True
+        return self.dedicated_collection_name(tenant_slug) not in self._collection_names()
+    
+    def _get_collection_name(self, tenant_slug: str) -> str:
+        """Tenant slug'ından collection adını döndür (shared modda küçük tenant'lar için ortak collection)"""
+        if self.is_shared(tenant_slug):
+            return SHARED_COLLECTION
+        return self.dedicated_collection_name(tenant_slug)
+    
+    def _tenant_filter(
+        self,
+        tenant_slug: str,
+        must: Optional[List] = None,
+        must_not: Optional[List] = None
+    ) -> Filter:
+        """Tüm sorgu/silme filtreleri buradan üretilir: _tenant koşulu her zaman eklenir"""
+        return Filter(must=[_tenant_condition(tenant_slug), *(must or [])], must_not=must_not or None)
+    
     def _verify_tenant_collection(self, tenant_slug: str) -> bool:
         """Tenant collection'ının var olduğunu doğrula"""
         collection_name = self._get_collection_name(tenant_slug)
         try:
-            collections = self.client.get_collections()
-            existing = collection_name in [col.name for col in collections.collections]
-            if existing:
+            if collection_name in self._collection_names():
                 return True
 
             # Auto-create missing collection to avoid hard failures in RAG flow.
@@ -73,11 +286,38 @@ class TenantIsolatedVectorAPI:
                 vectors_config=VectorParams(
                     size=vector_size,
                     distance=Distance.COSINE
-                )
+                ),
+                sparse_vectors_config=sparse_vectors_config()
             )
+            self.ensure_payload_indexes(collection_name)
+            self._invalidate_collections()
             return True
         except Exception:
-            return False
+            self._invalidate_collections()
+            return collection_name in self._collection_names()
+    
+    def ensure_payload_indexes(self, collection_name: str, shared: Optional[bool] = None):
+        """Filtrelenen payload alanları için index oluştur (var olanlar atlanır)"""
+        try:
+            existing = set((self.client.get_collection(collection_name).payload_schema or {}).keys())
+        except Exception:
+            existing = set()
+        indexes = dict(PAYLOAD_INDEXES)
+        if shared is None:
+            shared = collection_name == SHARED_COLLECTION
+        if shared:
+            indexes["_tenant"] = TENANT_INDEX_SCHEMA
+        for field_name, schema in indexes.items():
+            if field_name in existing:
+                continue
+            try:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=schema
+                )
+            except Exception as e:
+                print(f"⚠ Payload index oluşturulamadı ({collection_name}.{field_name}): {e}")
     
     def insert_vector(
         self, 
@@ -100,17 +340,51 @@ class TenantIsolatedVectorAPI:
             payload = {}
         payload["_tenant"] = tenant_slug  # Double-check için
         
+        deadline.check()
         try:
-            self.client.upsert(
-                collection_name=collection_name,
-                points=[
-                    PointStruct(
-                        id=vector_id,
-                        vector=vector,
-                        payload=payload
-                    )
-                ]
-            )
+            with metrics.stage("qdrant_upsert"):
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=[
+                        PointStruct(
+                            id=vector_id,
+                            vector=vector,
+                            payload=payload
+                        )
+                    ],
+                    timeout=deadline.qdrant_timeout_seconds()
+                )
+            query_cache.invalidate(tenant_slug)
+            return True
+        except Exception as e:
+            raise Exception(f"Vector ekleme hatası: {str(e)}")
+    
+    def insert_vectors(self, tenant_slug: str, points: List[Dict]) -> bool:
+        """
+        Birden fazla vector'ü tek upsert ile ekle
+        points: [{"id": ..., "vector": [...], "payload": {...}}]
+        """
+        if not self._verify_tenant_collection(tenant_slug):
+            raise ValueError(f"Tenant collection bulunamadı: {tenant_slug}")
+        
+        collection_name = self._get_collection_name(tenant_slug)
+        
+        deadline.check()
+        try:
+            with metrics.stage("qdrant_upsert"):
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=[
+                        PointStruct(
+                            id=point["id"],
+                            vector=point["vector"],
+                            payload={**(point.get("payload") or {}), "_tenant": tenant_slug}
+                        )
+                        for point in points
+                    ],
+                    timeout=deadline.qdrant_timeout_seconds()
+                )
+            query_cache.invalidate(tenant_slug)
             return True
         except Exception as e:
             raise Exception(f"Vector ekleme hatası: {str(e)}")
@@ -121,50 +395,111 @@ class TenantIsolatedVectorAPI:
         query_vector: List[float],
         limit: int = 10,
         score_threshold: Optional[float] = None,
-        filter_payload: Optional[Dict] = None
+        filter_payload: Optional[Dict] = None,
+        with_payload: Union[bool, List[str]] = True,
+        with_vectors: bool = False,
+        sparse_query: Optional[SparseVector] = None
     ) -> List[Dict]:
         """
         Tenant'a özel vector arama
         Sadece ilgili tenant'ın collection'ında arama yapar
+        
+        with_payload: True (tümü), False veya sadece döndürülecek alan listesi (transfer/JSON decode maliyeti için)
+        with_vectors: Sonuçlara vector'leri de ekle (varsayılan: hayır)
+        sparse_query: Verilirse (ve collection'da sparse vector varsa) hybrid arama: dense ve sparse prefetch'ler
+            Qdrant'ta RRF ile tek sorguda birleştirilir. score_threshold verilirse sadece dense eşiği geçen
+            point'ler döner (sparse tarafı eşiksizdir, tek token örtüşmesi yeterli olurdu); dönen score RRF skorudur
         """
         if not self._verify_tenant_collection(tenant_slug):
             raise ValueError(f"Tenant collection bulunamadı: {tenant_slug}")
         
         collection_name = self._get_collection_name(tenant_slug)
         
-        # Tenant filter'ı ekle (ekstra güvenlik)
-        tenant_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="_tenant",
-                    match=MatchValue(value=tenant_slug)
-                )
-            ]
+        # Tenant filter'ı ekle (shared collection'da zorunlu, dedicated'da ekstra güvenlik)
+        # Kullanıcı filter'ı varsa birleştir
+        tenant_filter = self._tenant_filter(
+            tenant_slug,
+            must=[FieldCondition(key=key, match=MatchValue(value=value)) for key, value in (filter_payload or {}).items()]
         )
         
-        # Kullanıcı filter'ı varsa birleştir
-        if filter_payload:
-            # Filter birleştirme logic'i buraya eklenebilir
-            pass
+        # Tenant double-check için _tenant her zaman çekilir
+        if isinstance(with_payload, list) and "_tenant" not in with_payload:
+            with_payload = ["_tenant", *with_payload]
+        
+        hybrid = sparse_query is not None and not is_empty(sparse_query) and self.has_sparse(collection_name)
         
         try:
-            # Qdrant query API - basit vector query
-            results = self.client.query_points(
-                collection_name=collection_name,
-                query=query_vector,  # Direkt vector geç
-                limit=limit,
-                score_threshold=score_threshold,
-                query_filter=tenant_filter
-            )
+            if hybrid:
+                # Dense + lexical adaylar tek istekte, birleştirme (RRF) Qdrant'ta
+                prefetch_limit = limit * max(HYBRID_PREFETCH_FACTOR, 1)
+                fused = QueryRequest(
+                    prefetch=[
+                        Prefetch(
+                            query=query_vector,
+                            filter=tenant_filter,
+                            limit=prefetch_limit,
+                            score_threshold=score_threshold
+                        ),
+                        Prefetch(
+                            query=sparse_query,
+                            using=SPARSE_VECTOR_NAME,
+                            filter=tenant_filter,
+                            limit=prefetch_limit
+                        ),
+                    ],
+                    query=FusionQuery(fusion=Fusion.RRF),
+                    limit=limit,
+                    filter=tenant_filter,
+                    with_payload=with_payload,
+                    with_vector=with_vectors
+                )
+                requests = [fused]
+                if score_threshold is not None:
+                    # Eşikli aramada dense prefetch'in id'leri aynı batch'te alınır; RRF sonucundan
+                    # sadece dense eşiğini geçenler tutulur
+                    requests.insert(0, QueryRequest(
+                        query=query_vector,
+                        filter=tenant_filter,
+                        limit=prefetch_limit,
+                        score_threshold=score_threshold,
+                        with_payload=False
+                    ))
+                with metrics.stage("qdrant_hybrid_search"):
+                    responses = self.client.query_batch_points(
+                        collection_name=collection_name,
+                        requests=requests,
+                        timeout=deadline.qdrant_timeout_seconds()
+                    )
+                results = responses[-1]
+                if score_threshold is not None:
+                    results.points = _within_threshold(results.points, responses[0].points)
+            else:
+                # Qdrant query API - basit vector query
+                with metrics.stage("qdrant_search"):
+                    results = self.client.query_points(
+                        collection_name=collection_name,
+                        query=query_vector,  # Direkt vector geç
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        query_filter=tenant_filter,
+                        with_payload=with_payload,
+                        with_vectors=with_vectors,
+                        timeout=deadline.qdrant_timeout_seconds()
+                    )
+            SEARCHES.inc(mode="hybrid" if hybrid else "dense")
             
-            return [
-                {
+            hits = []
+            for point in results.points:
+                hit = {
                     "id": point.id,
                     "score": point.score,
-                    "payload": point.payload
+                    "payload": _decode_text(point.payload),
+                    "search_mode": "hybrid" if hybrid else "dense"
                 }
-                for point in results.points
-            ]
+                if with_vectors:
+                    hit["vector"] = point.vector
+                hits.append(hit)
+            return hits
         except Exception as e:
             raise Exception(f"Arama hatası: {str(e)}")
     
@@ -183,20 +518,24 @@ class TenantIsolatedVectorAPI:
             # Sadece kendi tenant'ının collection'ında ara
             points = self.client.retrieve(
                 collection_name=collection_name,
-                ids=[vector_id]
+                ids=[vector_id],
+                timeout=deadline.qdrant_timeout_seconds()
             )
             
             if points:
                 point = points[0]
                 # Double-check: Payload'da tenant bilgisi var mı kontrol et
                 payload_tenant = point.payload.get("_tenant") if point.payload else None
+                if collection_name == SHARED_COLLECTION and payload_tenant != tenant_slug:
+                    # Ortak collection'da başka tenant'ın point'i: bu tenant için yok sayılır
+                    return None
                 if payload_tenant and payload_tenant != tenant_slug:
                     raise ValueError(f"GÜVENLİK İHLALİ: Vector başka tenant'a ait! (Beklenen: {tenant_slug}, Bulunan: {payload_tenant})")
                 
                 return {
                     "id": point.id,
                     "vector": point.vector,
-                    "payload": point.payload
+                    "payload": _decode_text(point.payload)
                 }
             # Vector bulunamadı - bu normal, çünkü farklı tenant'ın collection'ında
             return None
@@ -214,10 +553,17 @@ class TenantIsolatedVectorAPI:
         collection_name = self._get_collection_name(tenant_slug)
         
         try:
-            self.client.delete(
-                collection_name=collection_name,
-                points_selector=[vector_id]
-            )
+            # Point'in kendisi ve (chunk'lanmış analizlerde) diğer parçaları; sadece bu tenant'a ait olanlar
+            for condition in (
+                HasIdCondition(has_id=[vector_id]),
+                FieldCondition(key="parent_id", match=MatchValue(value=str(vector_id)))
+            ):
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=FilterSelector(filter=self._tenant_filter(tenant_slug, must=[condition])),
+                    timeout=deadline.qdrant_timeout_seconds()
+                )
+            query_cache.invalidate(tenant_slug)
             return True
         except Exception as e:
             raise Exception(f"Vector silme hatası: {str(e)}")
@@ -230,6 +576,22 @@ class TenantIsolatedVectorAPI:
         collection_name = self._get_collection_name(tenant_slug)
         
         try:
+            if collection_name == SHARED_COLLECTION:
+                points_count = self.client.count(
+                    collection_name=collection_name,
+                    count_filter=self._tenant_filter(tenant_slug),
+                    exact=True,
+                    timeout=deadline.qdrant_timeout_seconds()
+                ).count
+                return {
+                    "tenant": tenant_slug,
+                    "collection": collection_name,
+                    "shared": True,
+                    "points_count": points_count,
+                    "vectors_count": points_count,
+                    "indexed_vectors_count": None,
+                    "status": "shared"
+                }
             collection_info = self.client.get_collection(collection_name)
             return {
                 "tenant": tenant_slug,
@@ -242,12 +604,129 @@ class TenantIsolatedVectorAPI:
         except Exception as e:
             raise Exception(f"İstatistik hatası: {str(e)}")
     
+    def get_all_collection_stats(self, tenant_slugs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Tüm tenant'ların point sayıları tek seferde: bir collection listesi, dedicated
+        collection'lar için paralel get_collection, ortak collection için tek bir _tenant facet'i.
+        Collection oluşturmaz; verisi olmayan tenant'lar için points_count 0 döner.
+        """
+        names = self._collection_names(refresh=True)
+        dedicated = sorted(name for name in names if name.startswith("tenant_"))
+        stats: Dict[str, Dict] = {}
+
+        def collection_info(collection_name: str) -> Dict:
+            slug = collection_name[len("tenant_"):]
+            try:
+                info = self.client.get_collection(collection_name)
+                return {
+                    "tenant": slug,
+                    "collection": collection_name,
+                    "points_count": getattr(info, "points_count", 0) or 0,
+                    "indexed_vectors_count": getattr(info, "indexed_vectors_count", 0) or 0,
+                    "status": str(getattr(info, "status", "unknown"))
+                }
+            except Exception as e:
+                return {"tenant": slug, "collection": collection_name, "points_count": 0, "error": str(e)}
+
+        if dedicated:
+            with metrics.stage("qdrant_collection_stats"):
+                with ThreadPoolExecutor(
+                    max_workers=max(1, min(STATS_WORKERS, len(dedicated))),
+                    thread_name_prefix="vector-stats"
+                ) as executor:
+                    for item in executor.map(collection_info, dedicated):
+                        stats[item["tenant"]] = item
+
+        if VECTOR_STORAGE_MODE == "shared" and SHARED_COLLECTION in names:
+            with metrics.stage("qdrant_shared_facet"):
+                try:
+                    facet = self.client.facet(
+                        collection_name=SHARED_COLLECTION, key="_tenant", limit=100000, exact=True
+                    )
+                    counts = {str(hit.value): hit.count for hit in facet.hits}
+                except Exception:
+                    # facet desteklemeyen sunucu: istenen tenant'lar için tek tek count
+                    counts = {
+                        slug: self.client.count(
+                            collection_name=SHARED_COLLECTION,
+                            count_filter=self._tenant_filter(slug),
+                            exact=True,
+                            timeout=deadline.qdrant_timeout_seconds()
+                        ).count
+                        for slug in (tenant_slugs or [])
+                        if self.dedicated_collection_name(slug) not in names
+                    }
+            for slug, count in counts.items():
+                if slug in stats:
+                    # Promotion sırasında iki yerde de olabilir; dedicated collection esas alınır
+                    continue
+                stats[slug] = {
+                    "tenant": slug,
+                    "collection": SHARED_COLLECTION,
+                    "shared": True,
+                    "points_count": count,
+                    "status": "shared"
+                }
+
+        if tenant_slugs is not None:
+            wanted = set(tenant_slugs)
+            stats = {slug: item for slug, item in stats.items() if slug in wanted}
+            for slug in wanted - set(stats):
+                stats[slug] = {"tenant": slug, "collection": None, "points_count": 0, "status": "missing"}
+        return stats
+    
+    def _analysis_vector_id(self, tenant_slug: str, analysis_text: str, analysis_metadata: Optional[Dict]) -> str:
+        """
+        Deterministik point id: tenant + çağıranın tüm metadata'sı (ANALYSIS_NON_IDENTITY_FIELDS hariç).
+        Metadata analizi tek başına tanımlamıyorsa (ANALYSIS_DESCRIPTIVE_FIELD_SETS) normalize edilmiş
+        metnin hash'i de eklenir; aynı metnin tekrarı near-duplicate kontrolüne bırakılır.
+        """
+        identity = {
+            field: sorted(value, key=str) if isinstance(value, (list, tuple)) else value
+            for field, value in (analysis_metadata or {}).items()
+            if field not in ANALYSIS_NON_IDENTITY_FIELDS and value not in (None, "", [])
+        }
+        if not any(all(field in identity for field in fields) for fields in ANALYSIS_DESCRIPTIVE_FIELD_SETS):
+            normalized_text = " ".join((analysis_text or "").split())
+            identity["_text_sha1"] = hashlib.sha1(normalized_text.encode("utf-8")).hexdigest()
+        canonical = json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str)
+        return generate_vector_id(canonical, prefix=tenant_slug)
+    
+    def _find_near_duplicate(
+        self,
+        tenant_slug: str,
+        embedding: List[float],
+        threshold: float,
+        analysis_type: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Aynı tenant (ve analiz tipi) içinde threshold üzerindeki en benzer kaydı döndür"""
+        conditions = []
+        if analysis_type:
+            conditions.append(FieldCondition(key="analysis_type", match=MatchValue(value=analysis_type)))
+        # Sadece doküman başı chunk'larıyla karşılaştır (chunk_index alanı olmayan eski kayıtlar dahil)
+        head_only = [FieldCondition(key="chunk_index", range=Range(gte=1))]
+        with metrics.stage("qdrant_dedup_search"):
+            results = self.client.query_points(
+                collection_name=self._get_collection_name(tenant_slug),
+                query=embedding,
+                limit=1,
+                score_threshold=threshold,
+                query_filter=self._tenant_filter(tenant_slug, must=conditions, must_not=head_only),
+                with_payload=False,
+                timeout=deadline.qdrant_timeout_seconds()
+            )
+        if not results.points:
+            return None
+        point = results.points[0]
+        return {"id": point.id, "score": point.score}
+    
     def save_analysis(
         self,
         tenant_slug: str,
         analysis_text: str,
         analysis_metadata: Optional[Dict] = None,
-        vector_id: Optional[str] = None
+        vector_id: Optional[str] = None,
+        dedup_threshold: Optional[float] = None
     ) -> str:
         """
         Analiz sonuçlarını vector database'e kaydet (RAG için)
@@ -256,12 +735,19 @@ class TenantIsolatedVectorAPI:
             tenant_slug: Tenant slug
             analysis_text: Analiz metni (embedding oluşturulacak)
             analysis_metadata: Analiz metadata'sı (örn: tarih, tip, vb.)
-            vector_id: Vector ID (belirtilmezse otomatik oluşturulur)
+            vector_id: Vector ID (belirtilmezse tenant + analiz parametrelerinden deterministik üretilir,
+                aynı analiz tekrar kaydedilirse üzerine yazılır)
+            dedup_threshold: Near-duplicate eşiği (varsayılan: VECTOR_DEDUP_THRESHOLD, 0 = kapalı).
+                Eşik üzerinde benzer başka bir kayıt varsa yenisi eklenmez, mevcut kaydın ID'si döner.
             
         Returns:
             Vector ID
+        
+        Metin markdown bölümlerine (parametre / karşılaştırma blokları) ayrılır, chunk'lar tek batch'te
+        embed edilir. İlk chunk'ın id'si analizin id'sidir ve tam metni taşır; diğer chunk'lar
+        parent_id ile ona bağlanır.
         """
-        if generate_embedding is None or generate_vector_id is None:
+        if generate_embeddings is None or generate_vector_id is None:
             raise ImportError("embedding_utils modülü yüklenemedi. sentence-transformers yüklü mü?")
         
         if not self._verify_tenant_collection(tenant_slug):
@@ -269,29 +755,339 @@ class TenantIsolatedVectorAPI:
         
         # Vector ID oluştur
         if vector_id is None:
-            vector_id = uuid.uuid4().hex
+            vector_id = self._analysis_vector_id(tenant_slug, analysis_text, analysis_metadata)
+        
+        chunks, embed_inputs = self._chunk_analysis(analysis_text)
+        
+        # Embedding oluştur (tek batch)
+        deadline.check()
+        with metrics.stage("embedding"):
+            embeddings = generate_embeddings(embed_inputs)
+        
+        # Near-duplicate kontrolü (aynı id'ye denk gelirse normal overwrite)
+        threshold = VECTOR_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+        if threshold > 0:
+            duplicate = self._find_near_duplicate(
+                tenant_slug,
+                embeddings[0],
+                threshold,
+                (analysis_metadata or {}).get("analysis_type")
+            )
+            if duplicate is not None and not _same_point_id(duplicate["id"], vector_id):
+                DUPLICATES_SKIPPED.inc(tenant=tenant_slug)
+                return str(duplicate["id"])
+        
+        # Chunk'ları tek upsert ile kaydet
+        points = self._analysis_points(
+            tenant_slug, vector_id, analysis_text, analysis_metadata, chunks, embeddings, embed_inputs
+        )
+        self.insert_vectors(tenant_slug=tenant_slug, points=points)
+        self._delete_stale_chunks(tenant_slug, vector_id, len(chunks))
         
-        # Embedding oluştur
-        embedding = generate_embedding(analysis_text)
+        if self.is_shared(tenant_slug):
+            self._maybe_promote(tenant_slug)
         
-        # Payload hazırla
-        payload = {
+        return vector_id
+    
+    def _chunk_analysis(self, analysis_text: str):
+        """Bölümlere ayır; alt bölümler doküman başlığıyla embed edilir (bağlam kaybolmasın)"""
+        chunks = chunk_markdown_sections(analysis_text or "")
+        if not chunks:
+            raise ValueError("Analiz metni boş olamaz")
+        title = chunks[0]["section"]
+        embed_inputs = [
+            chunk["text"] if i == 0 or not title else f"{title}\n{chunk['text']}"
+            for i, chunk in enumerate(chunks)
+        ]
+        return chunks, embed_inputs
+    
+    def _analysis_points(
+        self,
+        tenant_slug: str,
+        vector_id: str,
+        analysis_text: str,
+        analysis_metadata: Optional[Dict],
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        embed_inputs: List[str]
+    ) -> List[Dict]:
+        """
+        İlk chunk'ın id'si analizin id'sidir ve tam metni taşır; diğerleri parent_id ile bağlanır.
+        Collection'da sparse vector tanımlıysa embedding girdisinden lexical vector de eklenir.
+        """
+        sparse = self.has_sparse(self._get_collection_name(tenant_slug))
+        base_payload = {
             "_tenant": tenant_slug,
-            "text": analysis_text,
             "type": "analysis",
             "created_at": datetime.now().isoformat(),
-            **(analysis_metadata or {})
+            "created_at_ts": int(time.time()),
+            **(analysis_metadata or {}),
+            "parent_id": str(vector_id),
+            "chunk_count": len(chunks),
         }
+        points = []
+        for i, (chunk, embedding, embed_input) in enumerate(zip(chunks, embeddings, embed_inputs)):
+            payload = {
+                **base_payload,
+                "chunk_index": i,
+                "section": chunk["section"],
+                "chunk_text": chunk["text"],
+            }
+            if i == 0:
+                payload.update(_compress_text(analysis_text))
+            points.append({
+                "id": vector_id if i == 0 else generate_vector_id(f"{vector_id}#{i}"),
+                "vector": point_vector(embedding, embed_input) if sparse else embedding,
+                "payload": payload
+            })
+        return points
+    
+    def _delete_stale_chunks(self, tenant_slug: str, vector_id: str, chunk_count: int):
+        """Aynı analiz daha önce daha fazla chunk ile kaydedildiyse artan chunk'ları temizle"""
+        try:
+            self.client.delete(
+                collection_name=self._get_collection_name(tenant_slug),
+                points_selector=FilterSelector(
+                    filter=self._tenant_filter(tenant_slug, must=[
+                        FieldCondition(key="parent_id", match=MatchValue(value=str(vector_id))),
+                        FieldCondition(key="chunk_index", range=Range(gte=chunk_count))
+                    ])
+                ),
+                timeout=deadline.qdrant_timeout_seconds()
+            )
+            query_cache.invalidate(tenant_slug)
+        except Exception:
+            pass
+    
+    def save_analyses(self, tenant_slug: str, analyses: List[Dict]) -> List[str]:
+        """
+        Birden fazla analizi tek embedding batch'i ve tek upsert ile kaydet (toplu işler için).
+        analyses: [{"text": ..., "metadata": {...}}]. Near-duplicate kontrolü yapılmaz;
+        id'ler deterministik olduğundan aynı analiz tekrar kaydedilirse üzerine yazılır.
+        """
+        if generate_embeddings is None or generate_vector_id is None:
+            raise ImportError("embedding_utils modülü yüklenemedi. sentence-transformers yüklü mü?")
+        if not analyses:
+            return []
+        if not self._verify_tenant_collection(tenant_slug):
+            raise ValueError(f"Tenant collection bulunamadı: {tenant_slug}")
+        
+        prepared = []
+        embed_inputs = []
+        for analysis in analyses:
+            vector_id = self._analysis_vector_id(tenant_slug, analysis["text"], analysis.get("metadata"))
+            chunks, inputs = self._chunk_analysis(analysis["text"])
+            prepared.append((vector_id, analysis, chunks, len(embed_inputs)))
+            embed_inputs.extend(inputs)
+        
+        deadline.check()
+        with metrics.stage("embedding"):
+            embeddings = generate_embeddings(embed_inputs)
+        
+        points = []
+        for vector_id, analysis, chunks, offset in prepared:
+            points.extend(self._analysis_points(
+                tenant_slug, vector_id, analysis["text"], analysis.get("metadata"),
+                chunks, embeddings[offset:offset + len(chunks)], embed_inputs[offset:offset + len(chunks)]
+            ))
+        self.insert_vectors(tenant_slug=tenant_slug, points=points)
+        for vector_id, _analysis, chunks, _offset in prepared:
+            self._delete_stale_chunks(tenant_slug, vector_id, len(chunks))
+        
+        if self.is_shared(tenant_slug):
+            self._maybe_promote(tenant_slug)
         
-        # Vector'ü kaydet
-        self.insert_vector(
-            tenant_slug=tenant_slug,
-            vector_id=vector_id,
-            vector=embedding,
-            payload=payload
+        return [vector_id for vector_id, _analysis, _chunks, _offset in prepared]
+    
+    def _maybe_promote(self, tenant_slug: str):
+        """Ortak collection'daki tenant eşiği geçtiyse arka planda kendi collection'ına taşı"""
+        if VECTOR_PROMOTION_THRESHOLD <= 0 or tenant_slug in self._promoting:
+            return
+        try:
+            count = self.client.count(
+                collection_name=SHARED_COLLECTION,
+                count_filter=self._tenant_filter(tenant_slug),
+                exact=True,
+                timeout=deadline.qdrant_timeout_seconds()
+            ).count
+        except Exception:
+            return
+        if count >= VECTOR_PROMOTION_THRESHOLD:
+            threading.Thread(
+                target=self.promote_tenant, args=(tenant_slug,), name=f"vector-promote-{tenant_slug}", daemon=True
+            ).start()
+    
+    def _copy_tenant_points(self, tenant_slug: str, target_collection: str) -> List:
+        """Tenant'ın ortak collection'daki point'lerini (vector + payload) hedef collection'a kopyala"""
+        copied = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=SHARED_COLLECTION,
+                scroll_filter=self._tenant_filter(tenant_slug),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                self.client.upsert(
+                    collection_name=target_collection,
+                    points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points]
+                )
+                copied.extend(p.id for p in points)
+            if offset is None:
+                return copied
+    
+    def promote_tenant(self, tenant_slug: str) -> int:
+        """
+        Tenant'ı ortak collection'dan tenant_{slug} collection'ına taşı.
+        Kopyalama sürerken okuma/yazmalar ortak collection'a gider; ikinci bir tarama arada yazılanları
+        taşır ve ortak collection'dan sadece kopyalanan ID'ler silinir. Diğer process'ler yeni collection'ı
+        COLLECTION_CACHE_SECONDS sonra görür; o arada ortak collection'a yazılanları gecikmeli tarama taşır.
+        """
+        with self._promotion_lock:
+            if tenant_slug in self._promoting:
+                return 0
+            self._promoting.add(tenant_slug)
+        
+        dedicated = self.dedicated_collection_name(tenant_slug)
+        try:
+            try:
+                if dedicated not in self._collection_names(refresh=True):
+                    vector_size = 384
+                    if get_embedding_dimension is not None:
+                        try:
+                            vector_size = int(get_embedding_dimension())
+                        except Exception:
+                            vector_size = 384
+                    self.client.create_collection(
+                        collection_name=dedicated,
+                        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+                        sparse_vectors_config=sparse_vectors_config()
+                    )
+                    self.ensure_payload_indexes(dedicated)
+                # İkinci tarama kopyalama sırasında yazılanları da alır (aynı ID'ler tekrar upsert edilir)
+                moved = {str(point_id): point_id for point_id in self._copy_tenant_points(tenant_slug, dedicated)}
+                moved.update((str(point_id), point_id) for point_id in self._copy_tenant_points(tenant_slug, dedicated))
+            except Exception as e:
+                # Yarım kopyalanmış collection'ı bırakma (çözümleme ona dönmesin); veri hâlâ ortak collection'da
+                print(f"⚠️ Tenant taşınamadı ({tenant_slug}): {e}")
+                try:
+                    self.client.delete_collection(dedicated)
+                except Exception:
+                    pass
+                self._invalidate_collections()
+                return 0
+            
+            # Kopyalar tamam: dedicated collection artık kalır, silme yarıda kalırsa gecikmeli tarama tamamlar
+            try:
+                self._delete_shared_points(list(moved.values()))
+            except Exception as e:
+                print(f"⚠️ Ortak kopyalar silinemedi ({tenant_slug}), taramaya bırakıldı: {e}")
+            self._invalidate_collections()
+        finally:
+            with self._promotion_lock:
+                self._promoting.discard(tenant_slug)
+        
+        query_cache.invalidate(tenant_slug)
+        self._schedule_promotion_sweep(tenant_slug)
+        print(f"✓ Tenant kendi collection'ına taşındı: {tenant_slug} ({len(moved)} point)")
+        return len(moved)
+    
+    def _delete_shared_points(self, point_ids: List):
+        """Ortak collection'dan sadece verilen (kopyalanmış) point'leri sil"""
+        for start in range(0, len(point_ids), 1024):
+            self.client.delete(
+                collection_name=SHARED_COLLECTION,
+                points_selector=PointIdsList(points=point_ids[start:start + 1024])
+            )
+    
+    def _schedule_promotion_sweep(self, tenant_slug: str):
+        """Tüm process'ler dedicated collection'ı gördükten sonra ortak collection'da kalanları taşı"""
+        timer = threading.Timer(
+            COLLECTION_CACHE_SECONDS * 2 + 1, self.sweep_promoted_tenant, args=(tenant_slug,)
         )
+        timer.name = f"vector-promote-sweep-{tenant_slug}"
+        timer.daemon = True
+        timer.start()
+    
+    def sweep_promoted_tenant(self, tenant_slug: str) -> int:
+        """Taşınmış tenant'ın ortak collection'da kalan point'lerini (taşıma sırasında başka process'lerin
+        yazdıkları) dedicated collection'a kopyala ve kopyalananları ortak collection'dan sil"""
+        dedicated = self.dedicated_collection_name(tenant_slug)
+        try:
+            if dedicated not in self._collection_names(refresh=True):
+                return 0
+            moved = {str(point_id): point_id for point_id in self._copy_tenant_points(tenant_slug, dedicated)}
+            self._delete_shared_points(list(moved.values()))
+        except Exception as e:
+            print(f"⚠️ Taşıma sonrası tarama başarısız ({tenant_slug}): {e}")
+            return 0
+        if moved:
+            query_cache.invalidate(tenant_slug)
+            print(f"✓ Taşıma sonrası {len(moved)} point ortak collection'dan taşındı: {tenant_slug}")
+        return len(moved)
+    
+    def fetch_texts(self, tenant_slug: str, ids: List) -> Dict[str, str]:
+        """Sadece verilen point'lerin tam metnini (gerekirse açarak) tek retrieve ile getir"""
+        if not ids:
+            return {}
+        with metrics.stage("qdrant_text_fetch"):
+            points = self.client.retrieve(
+                collection_name=self._get_collection_name(tenant_slug),
+                ids=ids,
+                with_payload=TEXT_PAYLOAD_FIELDS,
+                with_vectors=False,
+                timeout=deadline.qdrant_timeout_seconds()
+            )
+        texts = {}
+        for point in points:
+            payload = _decode_text(point.payload) or {}
+            if payload.get("_tenant") == tenant_slug and "text" in payload:
+                texts[str(point.id)] = payload["text"]
+        return texts
+    
+    def _collapse_by_parent(
+        self,
+        tenant_slug: str,
+        results: List[Dict],
+        limit: int,
+        include_text: bool = True
+    ) -> List[Dict]:
+        """
+        Chunk sonuçlarını parent analizlere indir (her parent için en yüksek skorlu chunk).
+        Tam metin aramada çekilmez; include_text ise sadece döndürülen parent'lar için tek retrieve ile alınır.
+        """
+        collapsed: Dict[str, Dict] = {}
+        for hit in results:
+            payload = hit.get("payload") or {}
+            parent_id = str(payload.get("parent_id") or hit["id"])
+            if parent_id in collapsed:
+                collapsed[parent_id]["matched_chunks"] += 1
+                continue
+            if len(collapsed) >= limit:
+                continue
+            collapsed[parent_id] = {
+                "id": parent_id,
+                "score": hit["score"],
+                "payload": dict(payload),
+                "matched_section": payload.get("section"),
+                "matched_chunks": 1,
+                "search_mode": hit.get("search_mode", "dense"),
+            }
         
-        return vector_id
+        if include_text:
+            missing_text = [parent_id for parent_id, item in collapsed.items() if "text" not in item["payload"]]
+            texts = self.fetch_texts(tenant_slug, missing_text)
+            for point_id, text in texts.items():
+                item = collapsed.get(point_id) or next(
+                    (v for k, v in collapsed.items() if _same_point_id(k, point_id)), None
+                )
+                if item is not None:
+                    item["payload"]["text"] = text
+        
+        return list(collapsed.values())
     
     def search_analysis(
         self,
@@ -299,7 +1095,9 @@ class TenantIsolatedVectorAPI:
         query_text: str,
         limit: int = 5,
         score_threshold: Optional[float] = 0.5,
-        filter_metadata: Optional[Dict] = None
+        filter_metadata: Optional[Dict] = None,
+        include_text: bool = True,
+        mode: Optional[str] = None
     ) -> List[Dict]:
         """
         RAG ile analiz sonuçlarını ara
@@ -310,9 +1108,11 @@ class TenantIsolatedVectorAPI:
             limit: Maksimum sonuç sayısı
             score_threshold: Minimum similarity score (0-1 arası)
             filter_metadata: Ek metadata filter'ı (örn: {"type": "monthly_comparison"})
+            include_text: Döndürülen sonuçların tam metnini de getir (False ise sadece eşleşen chunk metni)
+            mode: "hybrid" (dense + lexical, RRF) veya "dense" (varsayılan: VECTOR_SEARCH_MODE)
             
         Returns:
-            Benzer analiz sonuçları listesi (score ve payload ile)
+            Benzer analiz sonuçları listesi (parent analiz bazında; score, payload, matched_section ile)
         """
         if generate_embedding is None:
             raise ImportError("embedding_utils modülü yüklenemedi. sentence-transformers yüklü mü?")
@@ -320,39 +1120,49 @@ class TenantIsolatedVectorAPI:
         if not self._verify_tenant_collection(tenant_slug):
             raise ValueError(f"Tenant collection bulunamadı: {tenant_slug}")
         
-        # Query embedding oluştur
-        query_embedding = generate_embedding(query_text)
+        mode = mode or VECTOR_SEARCH_MODE
+        if mode not in ("hybrid", "dense"):
+            raise ValueError(f"Geçersiz arama modu: {mode} (hybrid veya dense)")
         
-        # Filter hazırla
-        conditions = [
-            FieldCondition(
-                key="_tenant",
-                match=MatchValue(value=tenant_slug)
-            )
-        ]
+        # Aynı/benzer sorgu yakın zamanda yapıldıysa (ve tenant verisi değişmediyse) cache'ten dön
+        sparse_query = encode_query(query_text) if mode == "hybrid" else None
+        # Hybrid'de birebir token'lar (tarih, parametre, cihaz) sonucu belirler: cache sadece aynı lexical
+        # terimlere sahip sorgular arasında paylaşılır
+        cache_params = query_cache_params(
+            limit, score_threshold, filter_metadata, include_text,
+            mode, sparse_query.indices if sparse_query is not None else None
+        )
+        cache_version = query_cache.version(tenant_slug)
+        cached = query_cache.lookup_text(tenant_slug, query_text, cache_params)
+        if cached is not None:
+            return cached
         
-        # Metadata filter ekle (varsa)
-        if filter_metadata:
-            for key, value in filter_metadata.items():
-                conditions.append(
-                    FieldCondition(
-                        key=key,
-                        match=MatchValue(value=value)
-                    )
-                )
+        # Query embedding oluştur
+        deadline.check()
+        with metrics.stage("embedding"):
+            query_embedding = generate_embedding(query_text)
         
-        query_filter = Filter(must=conditions) if len(conditions) > 1 else None
+        def search() -> List[Dict]:
+            # Vector araması yap (chunk'lar parent'a indirgeneceği için fazladan çek)
+            results = self.search_vectors(
+                tenant_slug=tenant_slug,
+                query_vector=query_embedding,
+                limit=limit * max(CHUNK_OVERFETCH, 1),
+                score_threshold=score_threshold,
+                filter_payload=filter_metadata,
+                with_payload=SEARCH_PAYLOAD_FIELDS,
+                sparse_query=sparse_query
+            )
+            return self._collapse_by_parent(tenant_slug, results, limit, include_text)
         
-        # Vector araması yap
-        results = self.search_vectors(
-            tenant_slug=tenant_slug,
-            query_vector=query_embedding,
-            limit=limit,
-            score_threshold=score_threshold,
-            filter_payload=filter_metadata
-        )
+        with metrics.stage("query_cache_lookup"):
+            cached = query_cache.lookup_vector(tenant_slug, query_text, query_embedding, cache_params, search=search)
+        if cached is not None:
+            return cached
         
-        return results
+        collapsed = search()
+        query_cache.store(tenant_slug, query_text, query_embedding, cache_params, collapsed, cache_version)
+        return collapsed
 
 
 def require_tenant_context(func):
@@ -5,9 +5,12 @@ Her tenant için ayrı collection oluşturur ve tam izolasyon sağlar
 """
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, CollectionStatus
-from typing import List, Dict, Optional
+from vector_sparse import sparse_vectors_config
+from typing import List, Dict, Optional, Iterable, Set
 import sys
 
 # Embedding dimension için utility import
@@ -27,6 +30,16 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)  # Production'da kullanılaca
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 MONGO_DB = os.getenv("MONGO_DB", "airqoonBaseMapDB")
 
+# "shared" modda küçük tenant'lar ortak collection'da tutulur (bkz. vector_db_api); reconcile onlar için
+# dedicated collection oluşturmaz
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "dedicated")
+
+# Re-embed migration'ının model bazlı collection'ları "{ad}__{model}" (bkz. vector_reembed.py)
+COLLECTION_VERSION_SEPARATOR = "__"
+
+# Reconcile sırasında eşzamanlı create/verify sayısı
+RECONCILE_WORKERS = int(os.getenv("VECTOR_SETUP_WORKERS", "8"))
+
 class TenantIsolatedVectorDB:
     """
     Tenant bazlı izole vector database yönetimi
@@ -46,17 +59,24 @@ class TenantIsolatedVectorDB:
             )
         print(f"✓ Qdrant'a bağlandı: {QDRANT_HOST}:{QDRANT_PORT}")
     
-    def create_tenant_collection(self, tenant_slug: str, vector_size: Optional[int] = None) -> bool:
+    def create_tenant_collection(
+        self,
+        tenant_slug: str,
+        vector_size: Optional[int] = None,
+        existing_names: Optional[Set[str]] = None
+    ) -> bool:
         """
         Her tenant için ayrı collection oluştur
         Collection adı: tenant_slug ile prefix'lenir (örn: tenant_akcansa)
+        existing_names verilirse collection listesi tekrar çekilmez (toplu reconcile için)
         """
         collection_name = f"tenant_{tenant_slug}"
         
         try:
             # Collection zaten var mı kontrol et
-            collections = self.client.get_collections()
-            existing_names = [col.name for col in collections.collections]
+            if existing_names is None:
+                collections = self.client.get_collections()
+                existing_names = {col.name for col in collections.collections}
             
             if collection_name in existing_names:
                 print(f"⚠ Collection zaten mevcut: {collection_name}")
@@ -77,7 +97,9 @@ class TenantIsolatedVectorDB:
                 vectors_config=VectorParams(
                     size=vector_size,
                     distance=Distance.COSINE
-                )
+                ),
+                # Hybrid arama için lexical (BM25) sparse vector (bkz. vector_sparse.py)
+                sparse_vectors_config=sparse_vectors_config()
             )
             
             print(f"✓ Collection oluşturuldu: {collection_name} (tenant: {tenant_slug}, vector_size: {vector_size})")
@@ -116,14 +138,117 @@ class TenantIsolatedVectorDB:
             }
     
     def list_all_tenant_collections(self) -> List[str]:
-        """Tüm tenant collection'larını listele"""
+        """Tüm tenant collection'larını listele (alias'lar dahil, alias arkasındaki model collection'ları hariç)"""
         collections = self.client.get_collections()
         tenant_collections = [
             col.name for col in collections.collections 
-            if col.name.startswith("tenant_")
+            if col.name.startswith("tenant_") and COLLECTION_VERSION_SEPARATOR not in col.name
         ]
+        try:
+            aliases = [alias.alias_name for alias in self.client.get_aliases().aliases]
+        except Exception:
+            aliases = []
+        tenant_collections.extend(name for name in aliases if name.startswith("tenant_"))
         return tenant_collections
     
+    def reconcile_tenants(
+        self,
+        tenant_slugs: Iterable[str],
+        dry_run: bool = False,
+        workers: int = RECONCILE_WORKERS,
+        verify: bool = True
+    ) -> Dict:
+        """
+        Tenant listesini mevcut tenant_* collection'larıyla tek seferde karşılaştır,
+        eksikleri oluştur ve hepsini sınırlı paralellikle doğrula. Tekrar çalıştırmak güvenlidir.
+        
+        Returns:
+            {"missing": [...], "existing": [...], "orphaned": [...], "created": [...],
+             "failed": [...], "verified": [...], "dry_run": bool, "timings_ms": {...}}
+        """
+        started = time.perf_counter()
+        timings = {}
+        slugs = sorted({slug for slug in tenant_slugs if slug})
+        
+        # Tek listeleme + diff
+        phase = time.perf_counter()
+        existing_names = set(self.list_all_tenant_collections())
+        timings["list"] = round((time.perf_counter() - phase) * 1000, 1)
+        
+        wanted = {self.get_tenant_collection_name(slug): slug for slug in slugs}
+        missing = [slug for name, slug in wanted.items() if name not in existing_names]
+        existing = [slug for name, slug in wanted.items() if name in existing_names]
+        orphaned = sorted(name for name in existing_names if name not in wanted)
+        
+        shared_mode = VECTOR_STORAGE_MODE == "shared"
+        report = {
+            "tenants": len(slugs),
+            "shared_mode": shared_mode,
+            "missing": missing,
+            "existing": existing,
+            "orphaned": orphaned,
+            "created": [],
+            "failed": [],
+            "verified": [],
+            "dry_run": dry_run,
+            "timings_ms": timings,
+        }
+        if dry_run:
+            timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+            return report
+        
+        workers = max(1, workers)
+        
+        # Eksik collection'ları paralel oluştur (embedding dimension bir kez hesaplanır)
+        # Shared modda dedicated collection'ı olmayan tenant'lar ortak collection'dan servis edilir
+        phase = time.perf_counter()
+        if missing and not shared_mode:
+            try:
+                vector_size = get_embedding_dimension()
+            except Exception:
+                vector_size = 384
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-setup") as executor:
+                outcomes = executor.map(
+                    lambda slug: (slug, self._create_collection_idempotent(slug, vector_size)),
+                    missing
+                )
+                for slug, ok in outcomes:
+                    report["created" if ok else "failed"].append(slug)
+        timings["create"] = round((time.perf_counter() - phase) * 1000, 1)
+        
+        # İzolasyon doğrulaması (paralel get_collection)
+        if verify:
+            phase = time.perf_counter()
+            to_verify = existing + report["created"]
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-setup") as executor:
+                report["verified"] = list(executor.map(self.verify_tenant_isolation, to_verify))
+            timings["verify"] = round((time.perf_counter() - phase) * 1000, 1)
+        
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+    
+    def _create_collection_idempotent(self, tenant_slug: str, vector_size: int) -> bool:
+        """Collection'ı oluştur; başka bir süreç aynı anda oluşturduysa başarılı say"""
+        collection_name = self.get_tenant_collection_name(tenant_slug)
+        try:
+            self.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(
+                    size=vector_size,
+                    distance=Distance.COSINE
+                ),
+                # Hybrid arama için lexical (BM25) sparse vector (bkz. vector_sparse.py)
+                sparse_vectors_config=sparse_vectors_config()
+            )
+            return True
+        except Exception as e:
+            try:
+                self.client.get_collection(collection_name)
+                return True
+            except Exception:
+                print(f"✗ Collection oluşturma hatası ({tenant_slug}): {str(e)}")
+                return False
+    
     def delete_tenant_collection(self, tenant_slug: str) -> bool:
         """Tenant collection'ını sil (dikkatli kullan!)"""
         collection_name = self.get_tenant_collection_name(tenant_slug)
@@ -136,8 +261,28 @@ class TenantIsolatedVectorDB:
             return False
 
 
-def setup_all_tenants_from_mongodb():
-    """MongoDB'den tenant listesini al ve her biri için collection oluştur"""
+def print_reconcile_report(report: Dict):
+    """Reconcile sonucunu özetle"""
+    mode = " (dry-run)" if report["dry_run"] else ""
+    print(f"📋 Tenant: {report['tenants']}, mevcut: {len(report['existing'])}, eksik: {len(report['missing'])}{mode}")
+    if report.get("shared_mode"):
+        print("ℹ️ VECTOR_STORAGE_MODE=shared: eksik tenant'lar ortak collection'dan servis edilir, oluşturulmaz")
+    for slug in report["missing"]:
+        print(f"  + tenant_{slug}")
+    if report["orphaned"]:
+        print(f"⚠ MongoDB'de karşılığı olmayan collection'lar ({len(report['orphaned'])}): {', '.join(report['orphaned'])}")
+    if not report["dry_run"]:
+        print(f"\n✅ Oluşturulan: {len(report['created'])}, hatalı: {len(report['failed'])}")
+        if report["verified"]:
+            print("\n🔒 Tenant izolasyonu doğrulandı:\n")
+            for result in report["verified"]:
+                print(f"  {result['tenant']}: {result['status']} ({result.get('points_count', 0)} points)")
+    timings = ", ".join(f"{phase}={ms}ms" for phase, ms in report["timings_ms"].items())
+    print(f"\n⏱ Süreler: {timings}")
+
+
+def setup_all_tenants_from_mongodb(dry_run: bool = False, workers: int = RECONCILE_WORKERS) -> Optional[Dict]:
+    """MongoDB'den tenant listesini al, mevcut collection'larla karşılaştır ve eksikleri oluştur"""
     try:
         from pymongo import MongoClient
         
@@ -147,44 +292,37 @@ def setup_all_tenants_from_mongodb():
         tenants_collection = db["Tenants"]
         
         # Tüm tenant'ları al
-        tenants = list(tenants_collection.find({}, {"SlugName": 1, "Name": 1}))
+        tenants = list(tenants_collection.find({}, {"SlugName": 1}))
+        mongo_client.close()
         
         print(f"\n📋 MongoDB'den {len(tenants)} tenant bulundu\n")
         
-        # Vector DB setup
+        # Vector DB reconcile (tek listeleme + paralel create/verify)
         vector_db = TenantIsolatedVectorDB()
-        
-        success_count = 0
-        for tenant in tenants:
-            tenant_slug = tenant.get("SlugName")
-            tenant_name = tenant.get("Name", "Unknown")
-            
-            if tenant_slug:
-                print(f"🔧 Tenant işleniyor: {tenant_slug} ({tenant_name})")
-                if vector_db.create_tenant_collection(tenant_slug):
-                    success_count += 1
-                print()
-        
-        print(f"\n✅ Toplam {success_count}/{len(tenants)} tenant collection'ı oluşturuldu\n")
-        
-        # İzolasyon doğrulaması
-        print("🔒 Tenant izolasyonu doğrulanıyor...\n")
-        for tenant in tenants:
-            tenant_slug = tenant.get("SlugName")
-            if tenant_slug:
-                result = vector_db.verify_tenant_isolation(tenant_slug)
-                print(f"  {result['tenant']}: {result['status']} ({result.get('points_count', 0)} points)")
-        
-        mongo_client.close()
+        report = vector_db.reconcile_tenants(
+            (tenant.get("SlugName") for tenant in tenants),
+            dry_run=dry_run,
+            workers=workers
+        )
+        print_reconcile_report(report)
+        return report
         
     except ImportError:
         print("⚠ pymongo yüklü değil. MongoDB entegrasyonu atlanıyor.")
         print("   Yüklemek için: pip install pymongo")
     except Exception as e:
         print(f"✗ MongoDB bağlantı hatası: {str(e)}")
+    return None
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Airqoon Vector Database - Tenant Isolation Setup")
+    parser.add_argument("--dry-run", action="store_true", help="Sadece farkı raporla, collection oluşturma")
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS, help="Eşzamanlı create/verify sayısı")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Airqoon Vector Database - Tenant Isolation Setup")
     print("=" * 60)
@@ -209,7 +347,7 @@ if __name__ == "__main__":
         ]
         
         # MongoDB'den tenant'ları al (varsa)
-        setup_all_tenants_from_mongodb()
+        setup_all_tenants_from_mongodb(dry_run=args.dry_run, workers=args.workers)
         
         # Tüm collection'ları listele
         print("\n📊 Oluşturulan collection'lar:")
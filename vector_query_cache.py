@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Airqoon Semantic Query Cache - RAG Aramaları için Benzerlik Tabanlı Sorgu Cache'i
+Aynı soru farklı şekillerde sorulduğunda search_analysis her seferinde embedding + Qdrant
+araması yapar. Bu modül tenant bazında son sorguların (normalize embedding -> sonuç) çiftlerini
+bellekte tutar; yeni sorgu embedding'i cache'teki bir sorguya cosine eşiğinin üzerinde yakınsa
+ve tenant'ın vector verisi o sorgudan sonra değişmediyse cache'teki sonuç döndürülür.
+
+- Birebir aynı (normalize) metin embedding hesaplanmadan döner
+- Tenant'a yazma/silme olduğunda (aynı process) tenant versiyonu artar ve cache'i boşalır;
+  diğer process'lerin yazmaları için TTL üst sınırdır
+- Benzerlik hit'lerinin bir kısmı arka planda gerçek aramayla karşılaştırılır (false-hit denetimi)
+- Bellek, tenant başına kayıt sınırı ve global MB bütçesi ile (LRU) sınırlanır
+"""
+
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import mcp_metrics as metrics
+
+QUERY_CACHE_ENABLED = os.getenv("VECTOR_QUERY_CACHE", "1") == "1"
+# Cosine benzerlik eşiği (embedding'ler normalize; 1.0 = aynı sorgu)
+QUERY_CACHE_THRESHOLD = float(os.getenv("VECTOR_QUERY_CACHE_THRESHOLD", "0.95"))
+# Diğer process'lerin (CLI, başka replika) yazmaları görülmediği için bayatlık üst sınırı
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("VECTOR_QUERY_CACHE_TTL_SECONDS", "300"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("VECTOR_QUERY_CACHE_MAX_ENTRIES", "256"))
+QUERY_CACHE_MAX_MB = float(os.getenv("VECTOR_QUERY_CACHE_MAX_MB", "64"))
+# Benzerlik hit'lerinin ne kadarı gerçek aramayla denetlenir (0 = kapalı)
+QUERY_CACHE_AUDIT_RATE = float(os.getenv("VECTOR_QUERY_CACHE_AUDIT_RATE", "0.05"))
+QUERY_CACHE_AUDIT_HISTORY = 50
+
+REQUESTS = metrics.registry.counter(
+    "mcp_vector_query_cache_requests_total", "Semantic query cache sorguları (result=exact_hit|hit|miss)"
+)
+EVICTIONS = metrics.registry.counter(
+    "mcp_vector_query_cache_evictions_total", "Cache'ten çıkarılan kayıtlar (reason=ttl|entries|memory|write|replaced)"
+)
+AUDITS = metrics.registry.counter("mcp_vector_query_cache_audits_total", "Gerçek aramayla denetlenen benzerlik hit'leri")
+FALSE_HITS = metrics.registry.counter(
+    "mcp_vector_query_cache_false_hits_total", "Denetimde gerçek aramadan farklı sonuç döndüğü görülen hit'ler"
+)
+HIT_SIMILARITY = metrics.registry.histogram(
+    "mcp_vector_query_cache_hit_similarity", "Benzerlik hit'lerinde cosine benzerlik",
+    buckets=(0.9, 0.92, 0.94, 0.95, 0.96, 0.97, 0.98, 0.99, 1.0)
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Birebir eşleşme anahtarı: trim, küçük harf, tek boşluk"""
+    return _WHITESPACE.sub(" ", (text or "").strip().casefold())
+
+
+def params_key(
+    limit: int,
+    score_threshold: Optional[float],
+    filter_metadata: Optional[Dict],
+    include_text: bool,
+    mode: str = "dense",
+    lexical_terms: Optional[List[int]] = None
+) -> str:
+    """Sonucu etkileyen arama parametreleri; yalnızca aynı parametrelerle yapılmış sorgular eşleşir"""
+    return json.dumps(
+        [limit, score_threshold, filter_metadata or {}, bool(include_text), mode, sorted(lexical_terms or [])],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+
+
+def _result_ids(results: List[Dict]) -> List[str]:
+    return [str(item.get("id")) for item in results]
+
+
+class _Entry:
+    __slots__ = ("query", "text_key", "params", "vector", "results", "created", "last_used", "size")
+
+    def __init__(self, query: str, params: str, vector: np.ndarray, results: List[Dict]):
+        self.query = query
+        self.text_key = normalize_query(query)
+        self.params = params
+        self.vector = vector
+        self.results = results
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.size = vector.nbytes + len(json.dumps(results, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class _TenantCache:
+    """Tenant'ın kayıtları; satırları kayıtlarla hizalı normalize embedding matrisi"""
+
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.exact: Dict[tuple, _Entry] = {}
+
+    def add(self, entry: _Entry):
+        self.entries.append(entry)
+        row = entry.vector[np.newaxis, :]
+        self.matrix = row if self.matrix is None else np.vstack([self.matrix, row])
+        self.exact[(entry.text_key, entry.params)] = entry
+
+    def remove(self, entry: _Entry):
+        index = self.entries.index(entry)
+        del self.entries[index]
+        self.matrix = np.delete(self.matrix, index, axis=0) if self.entries else None
+        if self.exact.get((entry.text_key, entry.params)) is entry:
+            del self.exact[(entry.text_key, entry.params)]
+
+
+class SemanticQueryCache:
+    def __init__(
+        self,
+        threshold: float = QUERY_CACHE_THRESHOLD,
+        ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        max_bytes: int = int(QUERY_CACHE_MAX_MB * 1024 * 1024),
+        audit_rate: float = QUERY_CACHE_AUDIT_RATE,
+        enabled: bool = QUERY_CACHE_ENABLED
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.audit_rate = audit_rate
+        self.enabled = enabled
+        self._tenants: Dict[str, _TenantCache] = {}
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._audits = deque(maxlen=QUERY_CACHE_AUDIT_HISTORY)
+        self._audit_executor: Optional[ThreadPoolExecutor] = None
+
+    # --- Versiyon / invalidation ---
+
+    def version(self, tenant_slug: str) -> int:
+        with self._lock:
+            return self._versions.get(tenant_slug, 0)
+
+    def invalidate(self, tenant_slug: str):
+        """Tenant'ın vector verisi değişti: versiyonu artır, kayıtlarını at"""
+        with self._lock:
+            self._versions[tenant_slug] = self._versions.get(tenant_slug, 0) + 1
+            tenant = self._tenants.pop(tenant_slug, None)
+            if tenant is not None:
+                self._bytes -= sum(entry.size for entry in tenant.entries)
+                EVICTIONS.inc(len(tenant.entries), reason="write")
+
+    # --- Okuma ---
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds
+
+    def _drop(self, tenant_slug: str, entry: _Entry, reason: str):
+        tenant = self._tenants.get(tenant_slug)
+        if tenant is None:
+            return
+        tenant.remove(entry)
+        self._bytes -= entry.size
+        if not tenant.entries:
+            del self._tenants[tenant_slug]
+        EVICTIONS.inc(reason=reason)
+
+    def _hit(self, entry: _Entry, now: float) -> List[Dict]:
+        entry.last_used = now
+        # Çağıran sonuçları (payload) değiştirebilir; cache'teki kopya korunur
+        return copy.deepcopy(entry.results)
+
+    def lookup_text(self, tenant_slug: str, query_text: str, params: str) -> Optional[List[Dict]]:
+        """Birebir aynı (normalize) sorgu: embedding hesaplamadan döner"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            tenant = self._tenants.get(tenant_slug)
+            entry = tenant.exact.get((normalize_query(query_text), params)) if tenant else None
+            if entry is not None and self._expired(entry, now):
+                self._drop(tenant_slug, entry, "ttl")
+                entry = None
+            if entry is None:
+                return None
+            REQUESTS.inc(result="exact_hit")
+            return self._hit(entry, now)
+
+    def lookup_vector(
+        self,
+        tenant_slug: str,
+        query_text: str,
+        query_vector: List[float],
+        params: str,
+        search: Optional[Callable[[], List[Dict]]] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Eşiğin üzerindeki en yakın (aynı parametreli, süresi dolmamış) sorgunun sonucu.
+        search verilirse hit'lerin audit_rate kadarı arka planda gerçek aramayla denetlenir.
+        """
+        if not self.enabled:
+            return None
+        vector = self._normalize(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            tenant = self._tenants.get(tenant_slug)
+            match = None
+            similarity = 0.0
+            if tenant is not None and tenant.matrix is not None and tenant.matrix.shape[1] == vector.shape[0]:
+                similarities = tenant.matrix @ vector
+                expired = []
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    entry = tenant.entries[index]
+                    if self._expired(entry, now):
+                        expired.append(entry)
+                        continue
+                    if entry.params == params:
+                        match, similarity = entry, float(similarities[index])
+                        break
+                for entry in expired:
+                    self._drop(tenant_slug, entry, "ttl")
+            if match is None:
+                REQUESTS.inc(result="miss")
+                return None
+            REQUESTS.inc(result="hit")
+            HIT_SIMILARITY.observe(similarity)
+            results = self._hit(match, now)
+            cached_query, cached_ids = match.query, _result_ids(match.results)
+
+        if search is not None and self.audit_rate > 0 and random.random() < self.audit_rate:
+            self._schedule_audit(tenant_slug, query_text, cached_query, similarity, cached_ids, search)
+        return results
+
+    # --- Yazma ---
+
+    @staticmethod
+    def _normalize(query_vector: List[float]) -> np.ndarray:
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def store(
+        self,
+        tenant_slug: str,
+        query_text: str,
+        query_vector: List[float],
+        params: str,
+        results: List[Dict],
+        version: int
+    ):
+        """
+        Arama sonucunu cache'e koy. version arama başlamadan önce alınmalı: arada tenant'a
+        yazıldıysa sonuç bayat olabileceğinden saklanmaz.
+        """
+        if not self.enabled:
+            return
+        entry = _Entry(query_text, params, self._normalize(query_vector), copy.deepcopy(results))
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if self._versions.get(tenant_slug, 0) != version:
+                return
+            tenant = self._tenants.get(tenant_slug)
+            if tenant is not None:
+                stale = [old for old in tenant.entries if old.vector.shape != entry.vector.shape]
+                previous = tenant.exact.get((entry.text_key, params))
+                if previous is not None and previous not in stale:
+                    stale.append(previous)
+                # Aynı sorgunun eski sonucu ve (model değişikliğinde) karşılaştırılamayan embedding'ler
+                for old in stale:
+                    self._drop(tenant_slug, old, "replaced")
+            self._tenants.setdefault(tenant_slug, _TenantCache()).add(entry)
+            self._bytes += entry.size
+            self._evict(tenant_slug)
+
+    def _evict(self, tenant_slug: str):
+        tenant = self._tenants.get(tenant_slug)
+        while tenant is not None and len(tenant.entries) > max(self.max_entries, 1):
+            self._drop(tenant_slug, min(tenant.entries, key=lambda entry: entry.last_used), "entries")
+            tenant = self._tenants.get(tenant_slug)
+        while self._bytes > self.max_bytes and self._tenants:
+            # Global LRU: tüm tenant'lar arasında en uzun süredir kullanılmayan kayıt
+            slug, oldest = min(
+                ((slug, min(cache.entries, key=lambda entry: entry.last_used)) for slug, cache in self._tenants.items()),
+                key=lambda pair: pair[1].last_used
+            )
+            self._drop(slug, oldest, "memory")
+
+    # --- False-hit denetimi ---
+
+    def _schedule_audit(
+        self,
+        tenant_slug: str,
+        query_text: str,
+        cached_query: str,
+        similarity: float,
+        cached_ids: List[str],
+        search: Callable[[], List[Dict]]
+    ):
+        with self._lock:
+            if self._audit_executor is None:
+                self._audit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-cache-audit")
+        self._audit_executor.submit(
+            self._audit, tenant_slug, query_text, cached_query, similarity, cached_ids, search
+        )
+
+    def _audit(
+        self,
+        tenant_slug: str,
+        query_text: str,
+        cached_query: str,
+        similarity: float,
+        cached_ids: List[str],
+        search: Callable[[], List[Dict]]
+    ):
+        try:
+            fresh_ids = _result_ids(search())
+        except Exception as e:
+            print(f"⚠️ Query cache denetimi başarısız ({tenant_slug}): {e}")
+            return
+        false_hit = fresh_ids != cached_ids
+        AUDITS.inc(tenant=tenant_slug)
+        if false_hit:
+            FALSE_HITS.inc(tenant=tenant_slug)
+        with self._lock:
+            self._audits.append({
+                "tenant": tenant_slug,
+                "query": query_text,
+                "cached_query": cached_query,
+                "similarity": round(similarity, 4),
+                "false_hit": false_hit,
+                "cached_ids": cached_ids,
+                "fresh_ids": fresh_ids,
+                "at": time.time(),
+            })
+
+    # --- İstatistik ---
+
+    def entry_count(self) -> int:
+        with self._lock:
+            return sum(len(tenant.entries) for tenant in self._tenants.values())
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def stats(self) -> Dict:
+        hits = REQUESTS.get(result="hit")
+        exact_hits = REQUESTS.get(result="exact_hit")
+        misses = REQUESTS.get(result="miss")
+        total = hits + exact_hits + misses
+        with self._lock:
+            tenants = {
+                slug: {
+                    "entries": len(tenant.entries),
+                    "bytes": sum(entry.size for entry in tenant.entries),
+                    "version": self._versions.get(slug, 0),
+                }
+                for slug, tenant in self._tenants.items()
+            }
+            recent_audits = list(self._audits)
+            memory = self._bytes
+        audited = len(recent_audits)
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries_per_tenant": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "memory_bytes": memory,
+            "requests": int(total),
+            "exact_hits": int(exact_hits),
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round((hits + exact_hits) / total, 4) if total else None,
+            "audit_rate": self.audit_rate,
+            "recent_false_hit_rate": (
+                round(sum(1 for audit in recent_audits if audit["false_hit"]) / audited, 4) if audited else None
+            ),
+            "recent_audits": recent_audits,
+            "tenants": tenants,
+        }
+
+
+query_cache = SemanticQueryCache()
+metrics.registry.gauge(
+    "mcp_vector_query_cache_entries", "Semantic query cache'teki kayıtlar", callback=query_cache.entry_count
+)
+metrics.registry.gauge(
+    "mcp_vector_query_cache_bytes", "Semantic query cache'in tahmini bellek kullanımı", callback=query_cache.memory_bytes
+)
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Airqoon Vector Re-embed Migration - Embedding Modeli Değişikliği
+Her tenant_* collection'ı (ve ortak collection) sayfa sayfa scroll edilir, saklanan metinler yeni
+modelle büyük batch'ler halinde yeniden embed edilir ve yeni boyutlu "gölge" collection'a
+({ad}__{model}) yazılır. Geçiş (cutover) alias ile yapılır: uygulama her zaman "{ad}" adını kullanır,
+alias tek işlemle yeni collection'a çevrilir. İlerleme her sayfadan sonra checkpoint dosyasına yazılır;
+yarıda kalan çalıştırma kaldığı yerden devam eder.
+
+Akış:
+    1. build   : gölge collection'ları doldur (eski model servis etmeye devam eder)
+    2. cutover : build başladıktan sonra yazılanları taşı, silinenleri temizle, alias'ı çevir
+    3. MCP server'ları EMBEDDING_MODEL_NAME=<yeni model> ile yeniden başlat
+    İlk geçişte (ad henüz alias değilken) eski collection silinir: MCP server'ları cutover süresince
+    durdurulmalı ve --drop-old verilmelidir.
+
+Kullanım:
+    python3 vector_reembed.py build --model intfloat/multilingual-e5-base [--tenant akcansa]
+    python3 vector_reembed.py cutover --model intfloat/multilingual-e5-base [--tenant akcansa] [--drop-old]
+    python3 vector_reembed.py status [--model intfloat/multilingual-e5-base]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, Distance, FieldCondition,
+    Filter, MatchAny, PointStruct, PointIdsList, Range, VectorParams
+)
+
+from embedding_utils import generate_embeddings, get_embedding_dimension, get_embedding_model_name
+from vector_db_api import (
+    COLLECTION_VERSION_SEPARATOR, SHARED_COLLECTION, TenantIsolatedVectorAPI, _decode_text, collection_aliases
+)
+from vector_sparse import point_vector, sparse_vectors_config
+
+PAGE_SIZE = int(os.getenv("VECTOR_REEMBED_PAGE_SIZE", "256"))  # Sayfa başına doküman başı
+EMBED_BATCH = int(os.getenv("VECTOR_REEMBED_BATCH", "128"))
+STATE_DIR = os.getenv("VECTOR_REEMBED_STATE_DIR", "reembed_state")
+# build başlangıcından bu kadar önce oluşturulanlar da cutover'da tekrar taşınır (saat farkları)
+CATCH_UP_MARGIN_SECONDS = 300
+PROGRESS_EVERY_SECONDS = 10.0
+
+HEAD_FILTER = Filter(must_not=[FieldCondition(key="chunk_index", range=Range(gte=1))])
+
+
+def model_tag(model_name: str) -> str:
+    """Collection adına uygun model etiketi (örn. intfloat/multilingual-e5-base -> multilingual_e5_base)"""
+    base = model_name.rstrip("/").split("/")[-1].lower()
+    tag = re.sub(r"[^a-z0-9]+", "_", base).strip("_")
+    if len(tag) > 40:
+        tag = f"{tag[:32]}_{hashlib.md5(model_name.encode('utf-8')).hexdigest()[:7]}"
+    return tag
+
+
+def shadow_name(logical_name: str, model_name: str) -> str:
+    return f"{logical_name}{COLLECTION_VERSION_SEPARATOR}{model_tag(model_name)}"
+
+
+class ReembedMigration:
+    def __init__(
+        self,
+        model_name: str,
+        api: Optional[TenantIsolatedVectorAPI] = None,
+        state_dir: str = STATE_DIR,
+        page_size: int = PAGE_SIZE,
+        embed_batch: int = EMBED_BATCH
+    ):
+        self.model_name = model_name
+        self.api = api or TenantIsolatedVectorAPI()
+        self.client = self.api.client
+        self.state_dir = state_dir
+        self.page_size = page_size
+        self.embed_batch = embed_batch
+
+    # --- hedefler ve checkpoint ---
+
+    def targets(self, tenant_slug: Optional[str] = None) -> List[str]:
+        """Taşınacak mantıksal collection adları (tenant_* + ortak collection)"""
+        names = self.api._collection_names(refresh=True)
+        if tenant_slug:
+            wanted = self.api.dedicated_collection_name(tenant_slug)
+            return [wanted] if wanted in names else []
+        logical = sorted(name for name in names if name.startswith("tenant_"))
+        if SHARED_COLLECTION in names:
+            logical.append(SHARED_COLLECTION)
+        return logical
+
+    def physical_name(self, logical_name: str) -> str:
+        return collection_aliases(self.client).get(logical_name, logical_name)
+
+    def _state_path(self, logical_name: str) -> str:
+        return os.path.join(self.state_dir, f"{logical_name}.json")
+
+    def load_state(self, logical_name: str) -> Optional[Dict]:
+        path = self._state_path(logical_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(state["logical"])
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    # --- kopyalama ---
+
+    def _children(self, collection_name: str, parent_ids: List[str]) -> Dict[str, List]:
+        """Doküman başlarının diğer chunk'ları (parent_id -> point listesi)"""
+        grouped: Dict[str, List] = defaultdict(list)
+        if not parent_ids:
+            return grouped
+        chunk_filter = Filter(must=[
+            FieldCondition(key="parent_id", match=MatchAny(any=parent_ids)),
+            FieldCondition(key="chunk_index", range=Range(gte=1)),
+        ])
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=chunk_filter,
+                limit=1024,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                grouped[str(point.payload.get("parent_id"))].append(point)
+            if offset is None:
+                return grouped
+
+    def copy_documents(self, source: str, target: str, heads: List) -> Tuple[int, int, int, float]:
+        """
+        Doküman başları + chunk'larını yeni modelle embed edip hedefe yaz.
+        Embed girdisi kayıttaki ile aynıdır: baş chunk kendi metni, diğerleri "{başlık}\\n{chunk}".
+        Returns: (doküman, point, atlanan, embedding_ms)
+        """
+        parent_ids = [str(h.payload["parent_id"]) for h in heads if h.payload and h.payload.get("parent_id")]
+        children = self._children(source, parent_ids)
+
+        points: List = []
+        inputs: List[str] = []
+        documents = 0
+        skipped = 0
+        for head in heads:
+            payload = head.payload or {}
+            head_text = payload.get("chunk_text") or (_decode_text(payload) or {}).get("text")
+            if not head_text:
+                skipped += 1
+                continue
+            documents += 1
+            points.append(head)
+            inputs.append(head_text)
+            title = payload.get("section") if "chunk_index" in payload else None
+            for child in sorted(children.get(str(payload.get("parent_id")), []),
+                                key=lambda p: p.payload.get("chunk_index", 0)):
+                chunk_text = child.payload.get("chunk_text")
+                if not chunk_text:
+                    skipped += 1
+                    continue
+                points.append(child)
+                inputs.append(f"{title}\n{chunk_text}" if title else chunk_text)
+
+        if not points:
+            return 0, 0, skipped, 0.0
+        started = time.perf_counter()
+        embeddings = generate_embeddings(inputs, batch_size=self.embed_batch, model_name=self.model_name)
+        embed_ms = (time.perf_counter() - started) * 1000
+        # Lexical vector'ler de aynı girdiden üretilir (hybrid arama; eski collection'larda yoksa burada eklenir)
+        sparse = self.api.has_sparse(target)
+        self.client.upsert(
+            collection_name=target,
+            points=[
+                PointStruct(id=point.id, vector=point_vector(vector, text) if sparse else vector, payload=point.payload)
+                for point, vector, text in zip(points, embeddings, inputs)
+            ]
+        )
+        return documents, len(points), skipped, embed_ms
+
+    def _ensure_target(self, target: str, shared: bool):
+        if target in {col.name for col in self.client.get_collections().collections}:
+            return
+        self.client.create_collection(
+            collection_name=target,
+            vectors_config=VectorParams(size=int(get_embedding_dimension(self.model_name)), distance=Distance.COSINE),
+            sparse_vectors_config=sparse_vectors_config()
+        )
+        self.api.ensure_payload_indexes(target, shared=shared)
+
+    def build(self, logical_name: str) -> Dict:
+        """Gölge collection'ı doldur (checkpoint'ten devam eder)"""
+        source = self.physical_name(logical_name)
+        target = shadow_name(logical_name, self.model_name)
+        if source == target:
+            return {"collection": logical_name, "skipped": "zaten bu modelde"}
+
+        state = self.load_state(logical_name)
+        if not state or state.get("target") != target or state.get("source") != source or state["status"] == "cutover":
+            state = {
+                "logical": logical_name,
+                "source": source,
+                "target": target,
+                "model": self.model_name,
+                "status": "building",
+                "offset": None,
+                "documents": 0,
+                "points": 0,
+                "skipped": 0,
+                "embed_ms": 0.0,
+                "elapsed_seconds": 0.0,
+                "started_ts": int(time.time()),
+            }
+        if state["status"] == "built":
+            return {"collection": logical_name, "resumed": True, **self._summary(state)}
+
+        self._ensure_target(target, shared=logical_name == SHARED_COLLECTION)
+        started = time.perf_counter()
+        elapsed_before = state["elapsed_seconds"]
+        last_progress = started
+        while True:
+            heads, next_offset = self.client.scroll(
+                collection_name=source,
+                scroll_filter=HEAD_FILTER,
+                limit=self.page_size,
+                offset=state["offset"],
+                with_payload=True,
+                with_vectors=False
+            )
+            documents, points, skipped, embed_ms = self.copy_documents(source, target, heads)
+            state["documents"] += documents
+            state["points"] += points
+            state["skipped"] += skipped
+            state["embed_ms"] += embed_ms
+            state["offset"] = next_offset
+            state["elapsed_seconds"] = elapsed_before + time.perf_counter() - started
+            if next_offset is None:
+                state["status"] = "built"
+            self.save_state(state)
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_EVERY_SECONDS:
+                summary = self._summary(state)
+                print(f"  ↳ {logical_name}: {state['documents']} doküman, {state['points']} point "
+                      f"({summary['points_per_second']} point/sn)")
+                last_progress = now
+            if next_offset is None:
+                return {"collection": logical_name, **self._summary(state)}
+
+    def _summary(self, state: Dict) -> Dict:
+        elapsed = state["elapsed_seconds"] or 0.0
+        return {
+            "source": state["source"],
+            "target": state["target"],
+            "status": state["status"],
+            "documents": state["documents"],
+            "points": state["points"],
+            "skipped": state["skipped"],
+            "seconds": round(elapsed, 1),
+            "points_per_second": round(state["points"] / elapsed, 1) if elapsed else None,
+            "embedding_share": round(state["embed_ms"] / 1000 / elapsed, 2) if elapsed else None,
+        }
+
+    # --- cutover ---
+
+    def catch_up(self, state: Dict) -> int:
+        """build başladıktan sonra kaynağa yazılan dokümanları tekrar taşı"""
+        since = state["started_ts"] - CATCH_UP_MARGIN_SECONDS
+        recent = Filter(
+            must=[FieldCondition(key="created_at_ts", range=Range(gte=since))],
+            must_not=HEAD_FILTER.must_not
+        )
+        copied = 0
+        offset = None
+        while True:
+            heads, offset = self.client.scroll(
+                collection_name=state["source"],
+                scroll_filter=recent,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            copied += self.copy_documents(state["source"], state["target"], heads)[1]
+            if offset is None:
+                return copied
+
+    def _point_ids(self, collection_name: str) -> set:
+        ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name, limit=2048, offset=offset, with_payload=False, with_vectors=False
+            )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                return ids
+
+    def prune(self, state: Dict) -> int:
+        """Kaynakta silinmiş (retention, tekrar kayıt) point'leri hedeften de sil"""
+        stale = list(self._point_ids(state["target"]) - self._point_ids(state["source"]))
+        for start in range(0, len(stale), 1024):
+            self.client.delete(
+                collection_name=state["target"],
+                points_selector=PointIdsList(points=stale[start:start + 1024])
+            )
+        return len(stale)
+
+    def cutover(self, logical_name: str, drop_old: bool = False, force: bool = False) -> Dict:
+        """Son farkları taşı ve "{ad}" alias'ını gölge collection'a çevir"""
+        state = self.load_state(logical_name)
+        if not state or state.get("model") != self.model_name:
+            raise ValueError(f"{logical_name}: bu model için build yapılmamış")
+        if state["status"] == "cutover":
+            return {"collection": logical_name, "skipped": "zaten geçildi"}
+        if state["status"] != "built":
+            raise ValueError(f"{logical_name}: build tamamlanmamış ({state['documents']} doküman)")
+
+        source, target = state["source"], state["target"]
+        report = {"collection": logical_name, "source": source, "target": target}
+        report["caught_up"] = self.catch_up(state)
+        report["pruned"] = self.prune(state)
+        source_count = self.client.count(collection_name=source, exact=True).count
+        target_count = self.client.count(collection_name=target, exact=True).count
+        report["source_points"], report["target_points"] = source_count, target_count
+        if source_count != target_count and not force:
+            raise ValueError(f"{logical_name}: point sayıları farklı ({source_count} -> {target_count}); --force ile geç")
+
+        aliases = collection_aliases(self.client)
+        if logical_name in aliases:
+            # Alias -> alias: tek atomik işlem
+            self.client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=logical_name)),
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=logical_name)),
+            ])
+            if drop_old:
+                self.client.delete_collection(source)
+                report["dropped"] = source
+        else:
+            # İlk geçiş: ad gerçek bir collection; alias aynı adı alabilmesi için silinmesi gerekir.
+            # Bu yüzden --drop-old şarttır ve MCP server'ları durdurulmuş olmalıdır: çalışan bir server
+            # silme ile alias oluşturma arasında aynı adla boş bir collection açabilir (_verify_tenant_collection).
+            if not drop_old:
+                raise ValueError(
+                    f"{logical_name}: ilk geçişte eski collection silinir; MCP server'larını durdurup --drop-old ile çalıştırın"
+                )
+            self.client.delete_collection(logical_name)
+            if logical_name in {col.name for col in self.client.get_collections().collections}:
+                raise RuntimeError(
+                    f"{logical_name}: silindikten sonra yeniden oluşturuldu (çalışan bir MCP server?); alias oluşturulmadı. "
+                    f"Server'ları durdurup cutover'ı tekrar çalıştırın, aradaki yazmalar catch-up ile taşınır"
+                )
+            self.client.update_collection_aliases(change_aliases_operations=[
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=logical_name)),
+            ])
+            report["dropped"] = logical_name
+
+        state["status"] = "cutover"
+        state["cutover_ts"] = int(time.time())
+        self.save_state(state)
+        self.api._invalidate_collections()
+        return report
+
+    def status(self) -> List[Dict]:
+        aliases = collection_aliases(self.client)
+        rows = []
+        for logical_name in self.targets():
+            state = self.load_state(logical_name)
+            physical = aliases.get(logical_name, logical_name)
+            row = {"collection": logical_name, "physical": physical, "alias": logical_name in aliases}
+            if state and state.get("model") == self.model_name:
+                row.update(self._summary(state))
+            rows.append(row)
+        return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Embedding modeli değişikliği için re-embed migration")
+    parser.add_argument("--model", default=get_embedding_model_name(), help="Hedef embedding modeli")
+    parser.add_argument("--tenant", help="Sadece bu tenant'ın collection'ı")
+    parser.add_argument("--state-dir", default=STATE_DIR, help="Checkpoint dizini")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="Gölge collection'ları oluştur / devam et")
+    build_parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    build_parser.add_argument("--batch-size", type=int, default=EMBED_BATCH, help="Embedding batch boyutu")
+
+    cutover_parser = sub.add_parser("cutover", help="Alias'ları yeni collection'lara çevir")
+    cutover_parser.add_argument("--drop-old", action="store_true", help="Eski model collection'ını sil")
+    cutover_parser.add_argument("--force", action="store_true", help="Point sayıları farklı olsa da geç")
+
+    sub.add_parser("status", help="Collection / checkpoint durumu")
+
+    args = parser.parse_args(argv)
+    migration = ReembedMigration(
+        args.model,
+        state_dir=args.state_dir,
+        page_size=getattr(args, "page_size", PAGE_SIZE),
+        embed_batch=getattr(args, "batch_size", EMBED_BATCH)
+    )
+
+    if args.command == "status":
+        for row in migration.status():
+            target = f" -> {row['target']} [{row['status']}, {row['points']} point]" if "target" in row else ""
+            kind = "alias" if row["alias"] else "collection"
+            print(f"  {row['collection']} ({kind}: {row['physical']}){target}")
+        return 0
+
+    failed = 0
+    targets = migration.targets(args.tenant)
+    if not targets:
+        print("⚠ Taşınacak collection bulunamadı")
+        return 1
+    print(f"🔄 {len(targets)} collection, model: {args.model} ({model_tag(args.model)})")
+    for logical_name in targets:
+        try:
+            if args.command == "build":
+                report = migration.build(logical_name)
+                if report.get("skipped"):
+                    print(f"  {logical_name}: atlandı ({report['skipped']})")
+                else:
+                    print(f"✓ {logical_name}: {report['documents']} doküman, {report['points']} point, "
+                          f"{report['seconds']} sn ({report['points_per_second']} point/sn, "
+                          f"embedding payı {report['embedding_share']})")
+            else:
+                report = migration.cutover(logical_name, args.drop_old, args.force)
+                if report.get("skipped"):
+                    print(f"  {logical_name}: atlandı ({report['skipped']})")
+                else:
+                    print(f"✓ {logical_name} -> {report['target']} (+{report['caught_up']} yeni, "
+                          f"-{report['pruned']} silinmiş, {report['target_points']} point)")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {logical_name}: {e}")
+    if args.command == "cutover" and not failed:
+        print(f"✅ MCP server'ları EMBEDDING_MODEL_NAME={args.model} ile yeniden başlatın")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Airqoon Vector Retention - Tenant Collection'ları için Retention / Compaction
+Tenant bazlı politikalar (maksimum yaş, maksimum point, analiz tipi başına son N analiz)
+doküman (parent analiz + chunk'ları) bazında uygulanır. Doküman başları indexli
+chunk_index filtresiyle scroll edilir, silme parent_id üzerinden batch'ler halinde yapılır.
+Opsiyonel olarak silmeden önce collection snapshot'ı alınır.
+
+Kullanım:
+    python vector_retention.py run [--tenant akcansa] [--dry-run] [--snapshot]
+    python vector_retention.py policies
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from qdrant_client.models import (
+    FieldCondition, MatchAny, Range, FilterSelector, HasIdCondition
+)
+
+import mcp_metrics as metrics
+from vector_db_api import TenantIsolatedVectorAPI, SHARED_COLLECTION
+from vector_query_cache import query_cache
+
+DEFAULT_POLICY = {
+    "max_age_days": int(os.getenv("VECTOR_RETENTION_MAX_AGE_DAYS", "0")),
+    "max_points": int(os.getenv("VECTOR_RETENTION_MAX_POINTS", "0")),
+    "keep_latest_per_type": int(os.getenv("VECTOR_RETENTION_KEEP_LATEST_PER_TYPE", "0")),
+    "snapshot": os.getenv("VECTOR_RETENTION_SNAPSHOT", "0") == "1",
+}
+# Tenant bazlı override: {"akcansa": {"max_age_days": 365}, "default": {...}} (JSON string veya dosya)
+POLICIES_JSON = os.getenv("VECTOR_RETENTION_POLICIES", "")
+POLICY_FILE = os.getenv("VECTOR_RETENTION_POLICY_FILE", "")
+RETENTION_INTERVAL_SECONDS = float(os.getenv("VECTOR_RETENTION_INTERVAL_SECONDS", "0"))
+DELETE_BATCH_SIZE = int(os.getenv("VECTOR_RETENTION_BATCH", "256"))
+SCROLL_PAGE_SIZE = 512
+
+HEAD_FIELDS = ["_tenant", "parent_id", "analysis_type", "created_at", "created_at_ts", "chunk_count"]
+
+DELETED_DOCUMENTS = metrics.registry.counter(
+    "mcp_vector_retention_deleted_total", "Retention ile silinen analiz dokümanları"
+)
+LAST_RUN = metrics.registry.gauge("mcp_vector_retention_last_run_timestamp", "Son retention çalışması (unix)")
+
+
+def load_policies() -> Dict[str, Dict]:
+    raw = {}
+    if POLICY_FILE and os.path.exists(POLICY_FILE):
+        with open(POLICY_FILE, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    elif POLICIES_JSON:
+        raw = json.loads(POLICIES_JSON)
+    return raw
+
+
+def policy_for(tenant_slug: str, policies: Optional[Dict[str, Dict]] = None) -> Dict:
+    policies = load_policies() if policies is None else policies
+    return {**DEFAULT_POLICY, **policies.get("default", {}), **policies.get(tenant_slug, {})}
+
+
+def _timestamp(payload: Dict) -> Optional[float]:
+    """created_at_ts yoksa (eski kayıtlar) ISO created_at'ten hesapla"""
+    if payload.get("created_at_ts") is not None:
+        return float(payload["created_at_ts"])
+    try:
+        return datetime.fromisoformat(payload["created_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def select_expired(heads: List[Dict], policy: Dict, now: Optional[float] = None) -> List[Dict]:
+    """
+    Doküman başlarından politikaya göre silinecekleri seç
+    heads: [{"id": ..., "payload": {...}}]
+    """
+    now = time.time() if now is None else now
+    doomed = {}
+
+    max_age_days = policy.get("max_age_days") or 0
+    if max_age_days > 0:
+        cutoff = now - max_age_days * 86400
+        for head in heads:
+            ts = _timestamp(head["payload"])
+            if ts is not None and ts < cutoff:
+                doomed[str(head["id"])] = head
+
+    newest_first = sorted(heads, key=lambda h: _timestamp(h["payload"]) or 0, reverse=True)
+
+    keep_latest = policy.get("keep_latest_per_type") or 0
+    if keep_latest > 0:
+        seen = defaultdict(int)
+        for head in newest_first:
+            analysis_type = head["payload"].get("analysis_type") or head["payload"].get("type") or "unknown"
+            seen[analysis_type] += 1
+            if seen[analysis_type] > keep_latest:
+                doomed[str(head["id"])] = head
+
+    max_points = policy.get("max_points") or 0
+    if max_points > 0:
+        used = 0
+        for head in newest_first:
+            if str(head["id"]) in doomed:
+                continue
+            used += int(head["payload"].get("chunk_count") or 1)
+            if used > max_points:
+                doomed[str(head["id"])] = head
+
+    return list(doomed.values())
+
+
+class VectorRetention:
+    def __init__(self, api: Optional[TenantIsolatedVectorAPI] = None):
+        self.api = api or TenantIsolatedVectorAPI()
+        self.client = self.api.client
+        self._run_lock = threading.Lock()
+
+    def tenant_slugs(self) -> List[str]:
+        names = self.api._collection_names(refresh=True)
+        slugs = {name[len("tenant_"):] for name in names if name.startswith("tenant_")}
+        if SHARED_COLLECTION in names:
+            # Ortak collection'daki tenant'lar (_tenant index'i üzerinden facet)
+            try:
+                facet = self.client.facet(collection_name=SHARED_COLLECTION, key="_tenant", limit=100000)
+                slugs.update(str(hit.value) for hit in facet.hits)
+            except Exception as e:
+                print(f"⚠️ Ortak collection tenant listesi alınamadı: {e}")
+        return sorted(slugs)
+
+    def scroll_heads(self, collection_name: str, tenant_slug: str) -> List[Dict]:
+        """Sadece doküman başlarını (chunk_index 0 veya chunk'sız eski kayıtlar) scroll et"""
+        heads = []
+        offset = None
+        head_filter = self.api._tenant_filter(
+            tenant_slug, must_not=[FieldCondition(key="chunk_index", range=Range(gte=1))]
+        )
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=head_filter,
+                limit=SCROLL_PAGE_SIZE,
+                offset=offset,
+                with_payload=HEAD_FIELDS,
+                with_vectors=False
+            )
+            heads.extend({"id": point.id, "payload": point.payload or {}} for point in points)
+            if offset is None:
+                return heads
+
+    def _delete_documents(self, collection_name: str, tenant_slug: str, doomed: List[Dict]):
+        for start in range(0, len(doomed), DELETE_BATCH_SIZE):
+            batch = doomed[start:start + DELETE_BATCH_SIZE]
+            # Doküman başları id ile, chunk'ları parent_id ile silinir (her zaman tenant filtresiyle)
+            conditions = [HasIdCondition(has_id=[head["id"] for head in batch])]
+            parent_ids = [head["payload"]["parent_id"] for head in batch if head["payload"].get("parent_id")]
+            if parent_ids:
+                conditions.append(FieldCondition(key="parent_id", match=MatchAny(any=parent_ids)))
+            for condition in conditions:
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=FilterSelector(filter=self.api._tenant_filter(tenant_slug, must=[condition]))
+                )
+        query_cache.invalidate(tenant_slug)
+
+    def run_tenant(
+        self,
+        tenant_slug: str,
+        policy: Optional[Dict] = None,
+        dry_run: bool = False,
+        snapshot: Optional[bool] = None
+    ) -> Dict:
+        started = time.perf_counter()
+        policy = policy or policy_for(tenant_slug)
+        collection_name = self.api._get_collection_name(tenant_slug)
+        report = {"tenant": tenant_slug, "documents": 0, "expired": 0, "snapshot": None, "dry_run": dry_run}
+
+        if not any(policy.get(key) for key in ("max_age_days", "max_points", "keep_latest_per_type")):
+            report["skipped"] = "politika yok"
+            return report
+
+        self.api.ensure_payload_indexes(collection_name)
+        heads = self.scroll_heads(collection_name, tenant_slug)
+        doomed = select_expired(heads, policy)
+        report["documents"] = len(heads)
+        report["expired"] = len(doomed)
+
+        if doomed and not dry_run:
+            if policy.get("snapshot") if snapshot is None else snapshot:
+                snapshot_info = self.client.create_snapshot(collection_name=collection_name)
+                report["snapshot"] = getattr(snapshot_info, "name", None)
+            self._delete_documents(collection_name, tenant_slug, doomed)
+            DELETED_DOCUMENTS.inc(len(doomed), tenant=tenant_slug)
+
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+    def run_all(
+        self,
+        tenant_slug: Optional[str] = None,
+        dry_run: bool = False,
+        snapshot: Optional[bool] = None
+    ) -> List[Dict]:
+        """Tüm tenant'lar (veya tek tenant) için politikaları uygula; aynı anda tek çalışma"""
+        if not self._run_lock.acquire(blocking=False):
+            return []
+        try:
+            policies = load_policies()
+            tenants = [tenant_slug] if tenant_slug else self.tenant_slugs()
+            reports = []
+            for slug in tenants:
+                try:
+                    reports.append(self.run_tenant(slug, policy_for(slug, policies), dry_run, snapshot))
+                except Exception as e:
+                    reports.append({"tenant": slug, "error": str(e)})
+            if not dry_run:
+                LAST_RUN.set(time.time())
+            return reports
+        finally:
+            self._run_lock.release()
+
+
+class RetentionWorker:
+    """Retention'ı periyodik çalıştıran arka plan thread'i"""
+
+    def __init__(self, interval_seconds: float = RETENTION_INTERVAL_SECONDS, retention: Optional[VectorRetention] = None):
+        self.interval = interval_seconds
+        self.retention = retention
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="vector-retention", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.retention is None:
+                    self.retention = VectorRetention()
+                for report in self.retention.run_all():
+                    if report.get("expired") or report.get("error"):
+                        print(f"🧹 Retention: {report}")
+            except Exception as e:
+                print(f"⚠️ Retention çalışması başarısız: {e}")
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Airqoon vector retention / compaction")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Politikaları uygula")
+    run_parser.add_argument("--tenant", help="Sadece bu tenant")
+    run_parser.add_argument("--dry-run", action="store_true", help="Silmeden raporla")
+    run_parser.add_argument("--snapshot", action="store_true", default=None, help="Silmeden önce snapshot al")
+
+    sub.add_parser("policies", help="Etkin politikaları göster")
+    args = parser.parse_args()
+
+    if args.command == "policies":
+        policies = load_policies()
+        print(json.dumps(
+            {"default": policy_for("default", policies), **{k: policy_for(k, policies) for k in policies if k != "default"}},
+            indent=2,
+            ensure_ascii=False
+        ))
+        return
+
+    retention = VectorRetention()
+    for report in retention.run_all(args.tenant, args.dry_run, args.snapshot):
+        if "error" in report:
+            print(f"❌ {report['tenant']}: {report['error']}")
+        elif report.get("skipped"):
+            print(f"  {report['tenant']}: atlandı ({report['skipped']})")
+        else:
+            action = "silinecek" if report["dry_run"] else "silindi"
+            snapshot = f", snapshot: {report['snapshot']}" if report.get("snapshot") else ""
+            print(f"✓ {report['tenant']}: {report['documents']} doküman, {report['expired']} {action}"
+                  f" ({report['elapsed_ms']} ms{snapshot})")
+
+
+if __name__ == "__main__":
+    main()
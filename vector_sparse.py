@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Airqoon Sparse (Lexical) Vectors - Hybrid RAG Araması için BM25 Tarzı Sparse Vector'ler
+Dense embedding'ler "PM2.5-24h", "Şubat 2025" veya cihaz etiketleri gibi birebir token'ları zayıf
+eşleştirir. Kayıt sırasında her chunk için (embedding girdisiyle aynı metinden) BM25 TF ağırlıklı
+sparse vector üretilir ve dense vector'le aynı point'te saklanır; IDF Qdrant tarafında
+(Modifier.IDF) collection istatistiklerinden hesaplanır. Arama, iki prefetch'in RRF ile
+birleştirildiği tek bir query_points çağrısıdır (bkz. vector_db_api.search_vectors).
+
+Türkçe normalizasyon: I/İ doğru küçültülür, diakritikler katlanır (ş->s, ğ->g, ı->i ...),
+kesme işaretinden sonraki ekler atılır (Şubat'ta -> subat), kelimeler ilk N harfe kırpılır
+(F5 kök bulma), "pm2.5-24h" gibi bileşik token'lar bütün, segment, noktasız ve parça halinde indekslenir.
+"""
+
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from qdrant_client.models import SparseVector, SparseVectorParams
+try:
+    from qdrant_client.models import Modifier
+    SPARSE_VECTOR_PARAMS = SparseVectorParams(modifier=Modifier.IDF)
+except ImportError:
+    # qdrant-client < 1.10: IDF yok, sadece TF ağırlıkları
+    SPARSE_VECTOR_PARAMS = SparseVectorParams()
+
+# Dense vector collection'ların isimsiz (varsayılan) vector'üdür; sparse vector isimlidir
+DENSE_VECTOR_NAME = ""
+SPARSE_VECTOR_NAME = os.getenv("VECTOR_SPARSE_NAME", "lexical")
+
+BM25_K1 = float(os.getenv("VECTOR_SPARSE_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("VECTOR_SPARSE_BM25_B", "0.75"))
+# Ortalama chunk uzunluğu (token); doküman uzunluk normalizasyonu için sabit tahmin
+BM25_AVG_DOC_TOKENS = float(os.getenv("VECTOR_SPARSE_AVG_DOC_TOKENS", "80"))
+STEM_PREFIX = int(os.getenv("VECTOR_SPARSE_STEM_PREFIX", "5"))
+
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+_FOLD = str.maketrans({
+    "ı": "i", "ğ": "g", "ü": "u", "ş": "s", "ö": "o", "ç": "c", "â": "a", "î": "i", "û": "u",
+})
+# Kesme işaretinden sonraki çekim eki (Şubat'ta, PM10'un)
+_APOSTROPHE_SUFFIX = re.compile(r"(?<=[a-z0-9])['’`][a-z]+")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_SEGMENT_SEPARATORS = re.compile(r"[_\-/]")
+
+STOPWORDS = frozenset({
+    "ve", "veya", "ile", "ya", "da", "de", "ki", "mi", "mu", "bu", "su", "o", "bir", "icin", "gibi",
+    "daha", "en", "cok", "az", "ne", "nasil", "neden", "hangi", "olan", "olarak", "ise", "ama", "hem",
+    "her", "tum", "arasi", "arasinda", "kadar", "sonra", "once", "the", "and", "of", "in", "for",
+})
+
+
+def normalize(text: str) -> str:
+    """Türkçe küçük harf + diakritik katlama + kesme eki temizliği"""
+    text = (text or "").translate(_TR_LOWER).lower().translate(_FOLD)
+    return _APOSTROPHE_SUFFIX.sub("", text)
+
+
+def _word_term(word: str) -> str:
+    if word.isalpha() and STEM_PREFIX > 0:
+        return word[:STEM_PREFIX]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalize edilmiş terimler (tekrarlar korunur; TF için)"""
+    terms: List[str] = []
+    for token in _TOKEN.findall(normalize(text)):
+        if token.isalnum():
+            if token not in STOPWORDS:
+                terms.append(_word_term(token))
+            continue
+        # Bileşik token (pm2.5-24h): bütün hali, segmentleri (pm2.5, 24h), noktasız hali (pm25) ve parçaları
+        segments = _SEGMENT_SEPARATORS.split(token)
+        if len(segments) > 1:
+            terms.append(token)
+        for segment in segments:
+            if "." in segment:
+                terms.append(segment)
+                terms.append(segment.replace(".", ""))
+                terms.extend(_word_term(part) for part in segment.split(".") if len(part) > 1 and part not in STOPWORDS)
+            elif len(segment) > 1 and segment not in STOPWORDS:
+                terms.append(_word_term(segment))
+    return terms
+
+
+def _term_index(term: str) -> int:
+    # Qdrant sparse index'leri uint32; crc32 deterministik ve process'ler arası aynı
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _sparse(weights: Dict[int, float]) -> SparseVector:
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[float(weights[i]) for i in indices])
+
+
+def encode_document(text: str) -> SparseVector:
+    """BM25 TF bileşeni (k1 doygunluk + uzunluk normalizasyonu); IDF sorgu anında Qdrant'ta"""
+    terms = tokenize(text)
+    if not terms:
+        return SparseVector(indices=[], values=[])
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / max(BM25_AVG_DOC_TOKENS, 1.0))
+    counts: Dict[int, float] = {}
+    for term, tf in Counter(terms).items():
+        index = _term_index(term)
+        counts[index] = counts.get(index, 0.0) + tf
+    return _sparse({index: tf * (BM25_K1 + 1) / (tf + length_norm) for index, tf in counts.items()})
+
+
+def encode_query(text: str) -> SparseVector:
+    """Sorgu tarafı: her terim 1 (tekrar eden terim tekrar sayısı kadar)"""
+    weights: Dict[int, float] = {}
+    for term in tokenize(text):
+        index = _term_index(term)
+        weights[index] = weights.get(index, 0.0) + 1.0
+    return _sparse(weights)
+
+
+def is_empty(vector: SparseVector) -> bool:
+    return not vector.indices
+
+
+def sparse_vectors_config() -> Dict[str, SparseVectorParams]:
+    """create_collection(sparse_vectors_config=...) için"""
+    return {SPARSE_VECTOR_NAME: SPARSE_VECTOR_PARAMS}
+
+
+def point_vector(dense: List[float], text: str) -> Dict:
+    """Dense + sparse vector'ü tek point vector'ü olarak birleştir"""
+    return {DENSE_VECTOR_NAME: dense, SPARSE_VECTOR_NAME: encode_document(text)}
+